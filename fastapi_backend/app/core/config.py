@@ -10,11 +10,51 @@ class Settings(BaseSettings):
     # Azure Storage Configuration
     azure_storage_connection_string: str
     container_name: str
+    sas_read_expire_minutes: int = 60
+    sas_upload_expire_minutes: int = 15
+    sas_cache_margin_seconds: int = 300  # stop serving cached read URLs this long before expiry
+    
+    # Image Processing Configuration
+    image_worker_processes: int = 2
+    
+    # Search Configuration
+    search_index_refresh_seconds: int = 300
+    
+    # Cart Configuration
+    cart_update_max_retries: int = 5  # compare-and-swap attempts before reporting a conflict
+    
+    # Inventory Configuration
+    low_stock_threshold: int = 10  # stock at or below this is flagged as low
+    
+    # Analytics Configuration
+    analytics_cache_seconds: int = 60  # admin dashboard snapshot lifetime
+    export_batch_size: int = 5000  # documents per cursor batch when streaming exports
+    
+    # Emergency Dispatch Configuration
+    ambulance_average_speed_kmh: float = 40.0
+    ambulance_dispatch_overhead_minutes: float = 2.0  # crew turnout before driving
+    ambulance_max_dispatch_km: float = 50.0
+    ambulance_location_retention_days: int = 7
+    ambulance_position_cache_seconds: int = 5  # cached positions older than this are re-read from the ambulance
+    ambulance_push_fallback_seconds: int = 10  # tracking sockets re-check position and request status this often
+    dispatch_retry_seconds: int = 15  # scheduler re-scan interval when nothing wakes it
+    
+    # Doctor Dashboard Configuration
+    doctor_stats_reconcile_hours: int = 24  # how often counters are recomputed from appointments
+    
+    # Password Hashing Configuration
+    bcrypt_rounds: int = 12  # changing it rehashes passwords on their next login
+    password_hash_workers: int = 4  # max concurrent hashes; each holds a core for the hash duration
     
     # JWT Configuration
     jwt_secret_key: str
     jwt_algorithm: str = "HS256"
-    access_token_expire_minutes: int = 43200  # 30 days (1 month)
+    # Keep 30 days until the web client renews through /api/auth/refresh; then lower to 15
+    access_token_expire_minutes: int = 43200
+    refresh_token_expire_days: int = 60
+    revocation_bloom_capacity: int = 100000  # revocations the filter holds at the target error rate
+    revocation_bloom_error_rate: float = 0.001  # share of unrevoked tokens that fall through to the database
+    revocation_sync_seconds: int = 10  # how soon revocations made by other workers take effect
     
     # Email Configuration
     email_user: str
@@ -25,6 +65,11 @@ class Settings(BaseSettings):
     gemini_api_key_1: str
     gemini_api_key_2: str
     
+    # Rate Limiting Configuration
+    rate_limit_enabled: bool = True  # turn off for load and concurrency test runs
+    rate_limit_calls: int = 100  # requests allowed per client IP in each period
+    rate_limit_period_seconds: int = 60
+    
     # Application Configuration
     debug: bool = True
     host: str = "0.0.0.0"
@@ -20,10 +20,63 @@ async def connect_to_mongo():
         await db.client.admin.command('ping')
         logger.info(f"Connected to MongoDB database: {settings.database_name}")
         
+        await ensure_indexes()
+        
     except Exception as e:
         logger.error(f"Could not connect to MongoDB: {e}")
         raise
 
+async def ensure_indexes():
+    """Create indexes the application relies on for correctness"""
+    try:
+        # One cart per user, so concurrent get-or-create upserts cannot duplicate carts
+        await db.database.carts.create_index("user_id", unique=True)
+        await db.database.food_carts.create_index("user_id", unique=True)
+        
+        # Inventory history per medicine and the low-stock watchlist
+        await db.database.inventory_events.create_index([("medicine_id", 1), ("created_at", -1)])
+        await db.database.inventory_counters.create_index([("status", 1), ("stock_quantity", 1)])
+        
+        # Exact distinct-patient set behind the doctor dashboard counters
+        await db.database.doctor_patients.create_index([("doctor_id", 1), ("patient_id", 1)], unique=True)
+        
+        # Nearby restaurant discovery ($geoNear)
+        await db.database.restaurants.create_index([("location", "2dsphere"), ("is_active", 1), ("rating", -1)])
+        
+        # Nearest-ambulance dispatch ($near)
+        await db.database.ambulances.create_index([("geo_location", "2dsphere"), ("is_available", 1)])
+        
+        # Refresh token families and access token revocations; TTL purges expired entries
+        await db.database.refresh_tokens.create_index("family_id")
+        await db.database.refresh_tokens.create_index("subject_id")
+        await db.database.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+        await db.database.token_revocations.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Blobs issued through signed upload URLs, until registered or expired
+        await db.database.upload_grants.create_index("expires_at", expireAfterSeconds=0)
+    except Exception as e:
+        logger.error(f"Could not create indexes: {e}")
+    
+    # Admin search: prefix keys plus exact identifiers. Unique indexes fail on
+    # existing duplicates, so each is created on its own.
+    search_indexes = [
+        ("users", [("search_keys", 1)], {}),
+        ("doctors", [("search_keys", 1)], {}),
+        ("orders", [("search_keys", 1)], {}),
+        ("users", [("email", 1)], {"unique": True}),
+        ("doctors", [("email", 1)], {"unique": True}),
+        ("doctors", [("license_number", 1)], {
+            "unique": True,
+            "partialFilterExpression": {"license_number": {"$type": "string"}}
+        }),
+        ("orders", [("order_number", 1)], {"unique": True})
+    ]
+    for collection, keys, options in search_indexes:
+        try:
+            await db.database[collection].create_index(keys, **options)
+        except Exception as e:
+            logger.error(f"Could not create index {keys} on {collection}: {e}")
+
 async def close_mongo_connection():
     """Close database connection"""
     if db.client:
@@ -0,0 +1,41 @@
+"""
+Fast JSON responses
+orjson rendering with native handling of Mongo and pydantic types, so routes can
+return already-built models without FastAPI validating and encoding them again
+"""
+
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def orjson_default(value: Any) -> Any:
+    """Types orjson does not serialize natively; datetimes are handled by orjson itself"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        # Python mode keeps datetimes and ObjectIds for orjson; aliases give "_id" like the routes' models
+        return value.model_dump(by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    Default response class of the app.
+
+    Returning it directly from a route (with models or plain documents as content)
+    skips FastAPI's response_model validation and jsonable_encoder pass; the
+    declared response_model then only documents the endpoint.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=orjson_default,
+            option=orjson.OPT_NON_STR_KEYS
+        )
@@ -1,24 +1,56 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Dict, Union, Optional, Tuple
+import uuid
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from .config import settings
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; hashes made with any other cost are flagged for rehash
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds
+)
+
+# bcrypt releases the GIL, so a thread pool hashes in parallel while its size
+# bounds how many CPU-heavy hashes run at once
+_password_executor: Optional[ThreadPoolExecutor] = None
 
 def create_access_token(
-    subject: Union[str, Any], expires_delta: timedelta = None
+    subject: Union[str, Any],
+    expires_delta: timedelta = None,
+    claims: Optional[Dict[str, Any]] = None
 ) -> str:
+    """
+    Create a short-lived access token
+
+    Args:
+        subject: User or doctor ID
+        expires_delta: Lifetime; defaults to access_token_expire_minutes
+        claims: Extra claims (role, active and admin flags, session ID) that let
+            requests authorize without loading the account
+    """
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(
+        expire = now + timedelta(
             minutes=settings.access_token_expire_minutes
         )
     
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {
+        **(claims or {}),
+        "exp": expire,
+        "iat": now,
+        "sub": str(subject),
+        "type": "access",
+        "jti": uuid.uuid4().hex
+    }
     encoded_jwt = jwt.encode(
         to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm
     )
@@ -30,47 +62,96 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def decode_token(token: str) -> Optional[str]:
+def _get_password_executor() -> ThreadPoolExecutor:
+    """Create the hashing pool on first use"""
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ThreadPoolExecutor(
+            max_workers=settings.password_hash_workers,
+            thread_name_prefix="password-hash"
+        )
+    return _password_executor
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_password_executor(), pwd_context.verify, plain_password, hashed_password
+    )
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_executor(), pwd_context.hash, password)
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password off the event loop and rehash it if its cost is outdated
+
+    Returns:
+        (valid, new hash to store or None)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_password_executor(), pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+def shutdown_password_executor():
+    """Stop the hashing pool"""
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False, cancel_futures=True)
+        _password_executor = None
+
+def _decode(token: str, token_type: str) -> Optional[Dict[str, Any]]:
+    """Claims of a validly signed, unexpired token of the given type"""
     try:
         payload = jwt.decode(
             token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
         )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        return user_id
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    if "type" not in payload and token_type == "access":
+        # Issued before claims were added; the token service resolves its claims
+        return payload
+    if payload.get("type") != token_type or not payload.get("jti"):
+        return None
+    return payload
+
+def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """Access token claims; revocation is checked by the token service"""
+    return _decode(token, "access")
+
+def create_refresh_token(
+    subject: Union[str, Any],
+    jti: Optional[str] = None,
+    family_id: Optional[str] = None
+) -> str:
+    """
+    Create a refresh token
 
-def create_refresh_token(subject: Union[str, Any]) -> str:
-    expire = datetime.utcnow() + timedelta(days=60)  # Refresh token valid for 60 days
-    to_encode = {"exp": expire, "sub": str(subject), "type": "refresh"}
+    Args:
+        subject: User or doctor ID
+        jti: Token ID, the key of its refresh_tokens record
+        family_id: Login session the token belongs to; rotation keeps it
+    """
+    expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
+    to_encode = {
+        "exp": expire,
+        "sub": str(subject),
+        "type": "refresh",
+        "jti": jti or uuid.uuid4().hex,
+        "fam": family_id or uuid.uuid4().hex
+    }
     encoded_jwt = jwt.encode(
         to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm
     )
     return encoded_jwt
 
-def verify_refresh_token(token: str) -> Optional[str]:
-    """Verify refresh token and return user ID"""
-    try:
-        payload = jwt.decode(
-            token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
-        )
-        user_id: str = payload.get("sub")
-        token_type: str = payload.get("type")
-        if user_id is None or token_type != "refresh":
-            return None
-        return user_id
-    except JWTError:
-        return None
-
-def create_token_pair(subject: Union[str, Any]) -> dict:
-    """Create both access and refresh tokens"""
-    access_token = create_access_token(subject)
-    refresh_token = create_refresh_token(subject)
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-        "expires_in": settings.access_token_expire_minutes * 60  # Convert to seconds
-    }
\ No newline at end of file
+def decode_refresh_token(token: str) -> Optional[Dict[str, Any]]:
+    """Refresh token claims; reuse is checked by the token service"""
+    return _decode(token, "refresh")
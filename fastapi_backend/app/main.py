@@ -2,12 +2,26 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 from .core.config import settings
-from .core.database import connect_to_mongo, close_mongo_connection
-from .routes import auth, medicine, food_delivery, appointments, chat, emergency, admin, services, contact, doctors
+from .core.database import connect_to_mongo, close_mongo_connection, get_database
+from .core.responses import FastJSONResponse
+from .core.security import shutdown_password_executor
+from .routes import auth, medicine, food_delivery, appointments, chat, emergency, admin, services, contact, doctors, search
 from .middleware.logging import LoggingMiddleware
 from .middleware.rate_limiting import RateLimitMiddleware
+from .services.image_service import image_service
+from .services.search_service import medicine_search_index
+from .services.suggest_service import suggestion_index
+from .services.inventory_service import inventory_service
+from .services.dispatch_service import dispatch_service, dispatch_queue
+from .services.rollup_service import rollup_service
+from .services.doctor_stats_service import doctor_stats_service
+from .services.admin_search_service import admin_search_service
+from .services.migration_service import migration_service
+from .services.token_service import token_service
+from .services.tracking_service import ambulance_tracker
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,9 +31,32 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    # Warm the search indexes in the background so the first search is fast
+    asyncio.create_task(medicine_search_index.ensure_fresh(await get_database()))
+    asyncio.create_task(suggestion_index.ensure_fresh(await get_database()))
+    # Build inventory counters once for catalogs that predate the event log
+    asyncio.create_task(inventory_service.ensure_summary(await get_database()))
+    asyncio.create_task(dispatch_service.backfill_geo_locations(await get_database()))
+    asyncio.create_task(rollup_service.ensure_backfill(await get_database()))
+    asyncio.create_task(admin_search_service.backfill(await get_database()))
+    # Normalize legacy documents once so reads can skip the field remapping
+    asyncio.create_task(migration_service.migrate(await get_database()))
+    await ambulance_tracker.ensure_collection(await get_database())
+    # Load token revocations before serving, then keep them in sync across workers
+    await token_service.load(await get_database())
+    token_service.start(await get_database())
+    # Assign queued emergencies as ambulances free up
+    dispatch_queue.start(await get_database())
+    # Periodically correct any drift in the doctor dashboard counters
+    doctor_stats_service.start(await get_database())
     logger.info("🚀 FastAPI WeCure server started successfully")
     yield
     # Shutdown
+    await dispatch_queue.stop()
+    await doctor_stats_service.stop()
+    await token_service.stop()
+    image_service.shutdown()
+    shutdown_password_executor()
     await close_mongo_connection()
     logger.info("📡 Database connection closed")
 
@@ -28,6 +65,7 @@ app = FastAPI(
     description="Comprehensive healthcare platform API with medicine store, food delivery, doctor consultations, emergency services, and AI-powered health assistance",
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc"
 )
@@ -43,7 +81,12 @@ app.add_middleware(
 
 # Add custom middleware
 app.add_middleware(LoggingMiddleware)
-app.add_middleware(RateLimitMiddleware, calls=100, period=60)  # 100 requests per minute
+if settings.rate_limit_enabled:
+    app.add_middleware(
+        RateLimitMiddleware,
+        calls=settings.rate_limit_calls,
+        period=settings.rate_limit_period_seconds
+    )
 
 # Include routers with proper prefixes and tags
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -56,6 +99,7 @@ app.include_router(emergency.router, prefix="/api/emergency", tags=["Emergency S
 app.include_router(admin.router, prefix="/api/admin", tags=["Administration"])
 app.include_router(services.router, prefix="/api/services", tags=["Services"])
 app.include_router(contact.router, prefix="/api/contact", tags=["Contact & Support"])
+app.include_router(search.router, prefix="/api/search", tags=["Search"])
 
 @app.get("/")
 async def root():
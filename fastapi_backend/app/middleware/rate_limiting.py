@@ -1,5 +1,6 @@
 import time
-from fastapi import Request, HTTPException, status
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from typing import Dict, Callable
 import asyncio
@@ -32,10 +33,11 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             self.clients[client_ip] = []
         
         # Check rate limit
+        # Exceptions raised in middleware bypass FastAPI's handlers, so respond directly
         if len(self.clients[client_ip]) >= self.calls:
-            raise HTTPException(
+            return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded. Maximum {self.calls} requests per {self.period} seconds."
+                content={"detail": f"Rate limit exceeded. Maximum {self.calls} requests per {self.period} seconds."}
             )
         
         # Add current request
@@ -1,18 +1,18 @@
-from .user import User, UserCreate, UserUpdate, UserInDB, PyObjectId
-from .doctor import Doctor, DoctorCreate, DoctorUpdate, DoctorInDB
-from .medicine import Medicine, MedicineCreate, MedicineUpdate, MedicineInDB, Cart, CartItem, CartItemBase
+from .user import User, UserCreate, UserUpdate, UserInDB, Principal, PyObjectId
+from .doctor import Doctor, DoctorCreate, DoctorUpdate, DoctorInDB, DoctorSummary
+from .medicine import Medicine, MedicineCreate, MedicineUpdate, MedicineInDB, MedicineSummary, Cart, CartItem, CartItemBase
 from .food_delivery import (
-    Restaurant, RestaurantCreate, RestaurantUpdate,
+    Restaurant, RestaurantCreate, RestaurantUpdate, RestaurantSummary,
     FoodCategory, MenuItem, MenuItemCreate, MenuItemUpdate,
     FoodCart, FoodCartItem, FoodCartItemBase,
-    FoodOrder, FoodOrderCreate, FoodOrderStatus
+    FoodOrder, FoodOrderCreate, FoodOrderStatus, FoodCheckoutRequest
 )
 from .appointment import (
     Appointment, AppointmentCreate, AppointmentUpdate, AppointmentStatus,
     DoctorAvailability, DoctorAvailabilityCreate
 )
 from .chat import (
-    ChatSession, ChatSessionCreate, ChatSessionStatus,
+    ChatSession, ChatSessionCreate, ChatSessionStatus, ChatSessionSummary,
     Message, MessageCreate,
     DoctorMessage, DoctorMessageCreate,
     Escalation, EscalationCreate,
@@ -21,9 +21,12 @@ from .chat import (
 from .emergency import (
     Ambulance, AmbulanceCreate, AmbulanceUpdate,
     EmergencyRequest, EmergencyRequestCreate, EmergencyRequestUpdate, EmergencyStatus,
-    EmergencyContact, EmergencyContactCreate, EmergencyContactUpdate
+    TERMINAL_EMERGENCY_STATUSES,
+    EmergencyContact, EmergencyContactCreate, EmergencyContactUpdate,
+    LocationPoint, LocationBatch
 )
 from .general import (
+    GeoPoint,
     Address, AddressCreate, AddressUpdate,
     Newsletter, NewsletterCreate,
     Contact, ContactCreate, ContactUpdate,
@@ -33,7 +36,7 @@ from .general import (
 )
 from .orders import (
     Cart as MedicineCart, CartCreate as MedicineCartCreate, CartUpdate as MedicineCartUpdate,
-    Order, OrderCreate, OrderUpdate, OrderStatus, PaymentStatus,
+    Order, OrderCreate, OrderUpdate, OrderStatus, PaymentStatus, MedicineCheckoutRequest,
     OrderItem, OrderItemCreate,
     FoodOrderItem, FoodOrderItemCreate,
     Payment, PaymentCreate, PaymentUpdate
@@ -44,27 +47,27 @@ __all__ = [
     "PyObjectId",
     
     # User models
-    "User", "UserCreate", "UserUpdate", "UserInDB",
+    "User", "UserCreate", "UserUpdate", "UserInDB", "Principal",
     
     # Doctor models
-    "Doctor", "DoctorCreate", "DoctorUpdate", "DoctorInDB",
+    "Doctor", "DoctorCreate", "DoctorUpdate", "DoctorInDB", "DoctorSummary",
     
     # Medicine models
-    "Medicine", "MedicineCreate", "MedicineUpdate", "MedicineInDB",
+    "Medicine", "MedicineCreate", "MedicineUpdate", "MedicineInDB", "MedicineSummary",
     "Cart", "CartItem", "CartItemBase",
     
     # Food delivery models
-    "Restaurant", "RestaurantCreate", "RestaurantUpdate",
+    "Restaurant", "RestaurantCreate", "RestaurantUpdate", "RestaurantSummary",
     "FoodCategory", "MenuItem", "MenuItemCreate", "MenuItemUpdate",
     "FoodCart", "FoodCartItem", "FoodCartItemBase",
-    "FoodOrder", "FoodOrderCreate", "FoodOrderStatus",
+    "FoodOrder", "FoodOrderCreate", "FoodOrderStatus", "FoodCheckoutRequest",
     
     # Appointment models
     "Appointment", "AppointmentCreate", "AppointmentUpdate", "AppointmentStatus",
     "DoctorAvailability", "DoctorAvailabilityCreate",
     
     # Chat models
-    "ChatSession", "ChatSessionCreate", "ChatSessionStatus",
+    "ChatSession", "ChatSessionCreate", "ChatSessionStatus", "ChatSessionSummary",
     "Message", "MessageCreate",
     "DoctorMessage", "DoctorMessageCreate",
     "Escalation", "EscalationCreate",
@@ -73,9 +76,12 @@ __all__ = [
     # Emergency models
     "Ambulance", "AmbulanceCreate", "AmbulanceUpdate",
     "EmergencyRequest", "EmergencyRequestCreate", "EmergencyRequestUpdate", "EmergencyStatus",
+    "TERMINAL_EMERGENCY_STATUSES",
     "EmergencyContact", "EmergencyContactCreate", "EmergencyContactUpdate",
+    "LocationPoint", "LocationBatch",
     
     # General models
+    "GeoPoint",
     "Address", "AddressCreate", "AddressUpdate",
     "Newsletter", "NewsletterCreate",
     "Contact", "ContactCreate", "ContactUpdate",
@@ -85,7 +91,7 @@ __all__ = [
     
     # Order models
     "MedicineCart", "MedicineCartCreate", "MedicineCartUpdate",
-    "Order", "OrderCreate", "OrderUpdate", "OrderStatus", "PaymentStatus",
+    "Order", "OrderCreate", "OrderUpdate", "OrderStatus", "PaymentStatus", "MedicineCheckoutRequest",
     "OrderItem", "OrderItemCreate",
     "FoodOrderItem", "FoodOrderItemCreate",
     "Payment", "PaymentCreate", "PaymentUpdate"
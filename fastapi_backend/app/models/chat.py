@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 from bson import ObjectId
 from .user import PyObjectId
@@ -33,6 +33,20 @@ class ChatSession(ChatSessionBase):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+# Session list entry without the conversation context
+class ChatSessionSummary(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    session_type: str = "general"
+    status: str = ChatSessionStatus.ACTIVE
+    title: Optional[str] = None
+    priority: str = "normal"
+    last_activity: Optional[datetime] = None
+    
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
 # Message Models
 class MessageBase(BaseModel):
     session_id: PyObjectId
@@ -104,6 +118,8 @@ class Escalation(EscalationBase):
         json_encoders = {ObjectId: str}
 
 # File Upload Models
+UploadPurpose = Literal["profile_picture", "prescription", "report", "chat_attachment"]
+
 class FileUploadBase(BaseModel):
     user_id: PyObjectId
     session_id: Optional[PyObjectId] = None
@@ -125,4 +141,9 @@ class FileUpload(FileUploadBase):
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
\ No newline at end of file
+        json_encoders = {ObjectId: str}
+
+class FileUploadUrlRequest(BaseModel):
+    file_name: str
+    content_type: Optional[str] = None
+    upload_purpose: UploadPurpose = "chat_attachment"
@@ -73,6 +73,23 @@ class Doctor(DoctorBase):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+# Compact doctor card for list pages; the full profile comes from the detail endpoint
+class DoctorSummary(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    full_name: str
+    specialization: Optional[str] = None
+    experience_years: int = 0
+    consultation_fee: float = 0.0
+    qualification: Optional[List[str]] = []
+    clinic_address: Optional[str] = None
+    profile_picture: Optional[str] = None
+    is_verified: bool = True
+    
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
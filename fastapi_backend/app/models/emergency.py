@@ -12,6 +12,9 @@ class EmergencyStatus(str):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+# Statuses after which a request no longer holds its ambulance
+TERMINAL_EMERGENCY_STATUSES = (EmergencyStatus.COMPLETED, EmergencyStatus.CANCELLED)
+
 class AmbulanceBase(BaseModel):
     driver_name: str
     driver_phone: str
@@ -43,6 +46,17 @@ class Ambulance(AmbulanceBase):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+# Ambulance Location Models
+class LocationPoint(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    recorded_at: Optional[datetime] = None  # device time; defaults to receipt time
+    speed_kmh: Optional[float] = Field(default=None, ge=0)
+    heading: Optional[float] = Field(default=None, ge=0, lt=360)
+
+class LocationBatch(BaseModel):
+    points: List[LocationPoint] = Field(min_length=1, max_length=500)
+
 # Emergency Request Models
 class EmergencyRequestBase(BaseModel):
     user_id: PyObjectId
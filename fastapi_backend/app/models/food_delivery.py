@@ -3,6 +3,7 @@ from typing import Optional, List, Dict
 from datetime import datetime, time
 from bson import ObjectId
 from .user import PyObjectId
+from .general import GeoPoint
 
 class RestaurantBase(BaseModel):
     name: str
@@ -14,6 +15,7 @@ class RestaurantBase(BaseModel):
     image_url: Optional[str] = None
     address: Optional[str] = None
     city: Optional[str] = None
+    location: Optional[GeoPoint] = None
     phone: Optional[str] = None
     is_open: bool = True
     is_active: bool = True
@@ -32,6 +34,7 @@ class RestaurantUpdate(BaseModel):
     image_url: Optional[str] = None
     address: Optional[str] = None
     city: Optional[str] = None
+    location: Optional[GeoPoint] = None
     phone: Optional[str] = None
     is_open: Optional[bool] = None
     is_active: Optional[bool] = None
@@ -39,6 +42,7 @@ class RestaurantUpdate(BaseModel):
 
 class Restaurant(RestaurantBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    distance_km: Optional[float] = None  # set when searching near a location
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -47,6 +51,24 @@ class Restaurant(RestaurantBase):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+# Compact restaurant card for list pages
+class RestaurantSummary(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    name: str
+    cuisine_type: List[str] = []
+    rating: float = 0.0
+    delivery_time: str = "30-45 mins"
+    price_range: str = "$$"
+    image_url: Optional[str] = None
+    city: Optional[str] = None
+    is_open: bool = True
+    distance_km: Optional[float] = None
+    
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
 # Food Category Models
 class FoodCategoryBase(BaseModel):
     name: str
@@ -158,6 +180,13 @@ class FoodOrderBase(BaseModel):
 class FoodOrderCreate(FoodOrderBase):
     pass
 
+class FoodCheckoutRequest(BaseModel):
+    """Client-supplied checkout details; items and prices come from the cart"""
+    delivery_address: str
+    phone: str
+    payment_method: str = "cash_on_delivery"
+    special_instructions: Optional[str] = None
+
 class FoodOrder(FoodOrderBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     order_number: str
@@ -1,9 +1,24 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from bson import ObjectId
 from .user import PyObjectId
 
+# Geo Models
+class GeoPoint(BaseModel):
+    """GeoJSON point; coordinates are [longitude, latitude]"""
+    type: str = Field("Point", pattern="^Point$")
+    coordinates: List[float]
+    
+    @validator('coordinates')
+    def validate_coordinates(cls, v):
+        if len(v) != 2:
+            raise ValueError('Coordinates must be [longitude, latitude]')
+        lng, lat = v
+        if not -180 <= lng <= 180 or not -90 <= lat <= 90:
+            raise ValueError('Coordinates out of range')
+        return v
+
 # Address Models
 class AddressBase(BaseModel):
     user_id: PyObjectId
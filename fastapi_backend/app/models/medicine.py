@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from bson import ObjectId
 from .user import PyObjectId
@@ -19,6 +19,7 @@ class MedicineBase(BaseModel):
     in_stock: bool = True
     stock_quantity: int = Field(ge=0, default=0)
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None  # {"thumbnail_webp": url, "small_avif": url, ...}
     side_effects: Optional[List[str]] = []
     contraindications: Optional[List[str]] = []
     storage_conditions: Optional[str] = None
@@ -49,6 +50,9 @@ class MedicineUpdate(BaseModel):
     expiry_date: Optional[datetime] = None
     is_active: Optional[bool] = None
 
+class RestockRequest(BaseModel):
+    quantity: int = Field(ge=1)
+
 class MedicineInDB(MedicineBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -69,6 +73,25 @@ class Medicine(MedicineBase):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+# Compact product card for list pages; the full monograph comes from the detail endpoint
+class MedicineSummary(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    name: str
+    price: float
+    category: str
+    brand: Optional[str] = None
+    dosage_form: Optional[str] = None
+    strength: Optional[str] = None
+    package_size: Optional[str] = None
+    prescription_required: bool = False
+    in_stock: bool = True
+    image_url: Optional[str] = None
+    
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
 # Cart Models
 class CartItemBase(BaseModel):
     medicine_id: PyObjectId
@@ -65,6 +65,13 @@ class OrderBase(BaseModel):
 class OrderCreate(OrderBase):
     pass
 
+class MedicineCheckoutRequest(BaseModel):
+    """Client-supplied checkout details; items and prices come from the cart"""
+    shipping_address: Dict[str, str]
+    billing_address: Optional[Dict[str, str]] = None
+    payment_method: str = "cod"  # cod, card, upi, wallet
+    notes: Optional[str] = None
+
 class OrderUpdate(BaseModel):
     status: Optional[str] = None
     payment_status: Optional[str] = None
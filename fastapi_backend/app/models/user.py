@@ -78,6 +78,7 @@ class UserUpdate(BaseModel):
 class UserInDB(UserBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     hashed_password: str
+    is_admin: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -91,6 +92,19 @@ class User(UserBase):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class Principal(BaseModel):
+    """Authenticated caller as described by access token claims, without loading the account"""
+    id: PyObjectId
+    user_type: str
+    is_active: bool = True
+    is_admin: bool = False
+    session_id: Optional[str] = None
+    
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
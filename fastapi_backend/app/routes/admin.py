@@ -1,18 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional, Dict, Any
 from bson import ObjectId
 from datetime import datetime, timedelta
 import uuid
 from ..core.database import get_database
-from ..models.user import UserInDB, User
+from ..models.user import User, Principal
 from ..models.doctor import Doctor, DoctorInDB
 from ..models.medicine import Medicine
 from ..models.orders import Order, OrderStatus
 from ..models.appointment import Appointment
 from ..models.emergency import EmergencyRequest
 from ..models.general import Contact, Service, FooterContent
-from ..utils.auth import get_current_admin_user
+from ..utils.auth import get_current_admin_principal
+from ..core.responses import FastJSONResponse
+from ..services.inventory_service import inventory_service
+from ..services.analytics_service import analytics_service
+from ..services.rollup_service import rollup_service
+from ..services.export_service import export_service, EXPORTS, EXPORT_FORMATS
+from ..services.admin_search_service import admin_search_service
+from ..services.token_service import token_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,124 +29,80 @@ router = APIRouter()
 # Dashboard Analytics
 @router.get("/dashboard/analytics")
 async def get_admin_analytics(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    refresh: bool = False,
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get admin dashboard analytics"""
     try:
-        # Get current date for time-based analytics
-        now = datetime.utcnow()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = today_start - timedelta(days=7)
-        month_start = today_start - timedelta(days=30)
-        
-        # User analytics
-        total_users = await db.users.count_documents({"is_active": True})
-        new_users_today = await db.users.count_documents({
-            "created_at": {"$gte": today_start}
-        })
-        new_users_week = await db.users.count_documents({
-            "created_at": {"$gte": week_start}
-        })
-        
-        # Doctor analytics
-        total_doctors = await db.doctors.count_documents({"is_active": True})
-        verified_doctors = await db.doctors.count_documents({
-            "is_active": True, 
-            "is_verified": True
-        })
-        pending_verifications = await db.doctors.count_documents({
-            "is_active": True,
-            "is_verified": False
-        })
-        
-        # Appointment analytics
-        total_appointments = await db.appointments.count_documents({})
-        today_appointments = await db.appointments.count_documents({
-            "appointment_date": {"$gte": today_start, "$lt": today_start + timedelta(days=1)}
-        })
-        pending_appointments = await db.appointments.count_documents({
-            "status": "pending"
-        })
-        
-        # Order analytics
-        total_orders = await db.orders.count_documents({})
-        pending_orders = await db.orders.count_documents({
-            "status": {"$in": ["pending", "confirmed", "processing"]}
-        })
-        completed_orders = await db.orders.count_documents({
-            "status": "delivered"
-        })
-        
-        # Revenue analytics (sum of completed orders)
-        revenue_pipeline = [
-            {"$match": {"status": "delivered"}},
-            {"$group": {"_id": None, "total": {"$sum": "$final_amount"}}}
-        ]
-        revenue_result = await db.orders.aggregate(revenue_pipeline).to_list(1)
-        total_revenue = revenue_result[0]["total"] if revenue_result else 0
-        
-        # Emergency analytics
-        total_emergencies = await db.emergency_requests.count_documents({})
-        active_emergencies = await db.emergency_requests.count_documents({
-            "status": {"$in": ["pending", "dispatched", "en_route"]}
-        })
-        
-        # Medicine analytics
-        total_medicines = await db.medicines.count_documents({"is_active": True})
-        out_of_stock = await db.medicines.count_documents({
-            "is_active": True,
-            "in_stock": False
-        })
-        
-        # Contact/Support analytics
-        pending_contacts = await db.contacts.count_documents({
-            "status": "pending"
-        })
-        
-        return {
-            "users": {
-                "total": total_users,
-                "new_today": new_users_today,
-                "new_this_week": new_users_week
-            },
-            "doctors": {
-                "total": total_doctors,
-                "verified": verified_doctors,
-                "pending_verification": pending_verifications
-            },
-            "appointments": {
-                "total": total_appointments,
-                "today": today_appointments,
-                "pending": pending_appointments
-            },
-            "orders": {
-                "total": total_orders,
-                "pending": pending_orders,
-                "completed": completed_orders,
-                "total_revenue": total_revenue
-            },
-            "emergency": {
-                "total": total_emergencies,
-                "active": active_emergencies
-            },
-            "medicine": {
-                "total": total_medicines,
-                "out_of_stock": out_of_stock
-            },
-            "support": {
-                "pending_contacts": pending_contacts
-            }
-        }
+        # Served from a short-lived snapshot refreshed in the background
+        return await analytics_service.get_snapshot(db, force=refresh)
         
     except Exception as e:
         logger.error(f"Error fetching admin analytics: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch analytics")
 
+@router.get("/dashboard/trends")
+async def get_admin_trends(
+    days: int = Query(30, ge=1, le=90),
+    current_admin: Principal = Depends(get_current_admin_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get daily signups, bookings, orders, revenue and emergencies for the last N days"""
+    return {
+        "days": days,
+        "trends": await rollup_service.get_trends(db, days)
+    }
+
+@router.post("/dashboard/trends/backfill")
+async def backfill_admin_trends(
+    days: int = Query(90, ge=1, le=365),
+    current_admin: Principal = Depends(get_current_admin_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Rebuild the daily rollups from the source collections"""
+    try:
+        written = await rollup_service.backfill(db, days=days)
+    except Exception as e:
+        logger.error(f"Error backfilling daily stats: {e}")
+        raise HTTPException(status_code=500, detail="Failed to backfill daily stats")
+    
+    return {"message": f"Daily stats rebuilt for {written} days"}
+
+# Bulk Export
+@router.get("/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    current_admin: Principal = Depends(get_current_admin_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Stream a whole collection as gzip-compressed CSV or NDJSON"""
+    if collection not in EXPORTS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown export. Available: {', '.join(EXPORTS)}"
+        )
+    
+    query = export_service.build_query(status=status, created_from=created_from, created_to=created_to)
+    filename = f"{collection}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{format}"
+    
+    return StreamingResponse(
+        export_service.stream(db, collection, format, query),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Encoding": "gzip",
+            "Content-Disposition": f'attachment; filename="{filename}"'
+        }
+    )
+
 # User Management
 @router.get("/users", response_model=List[User])
 async def get_all_users(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -152,10 +116,7 @@ async def get_all_users(
         query["is_active"] = is_active
     
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}}
-        ]
+        query.update(admin_search_service.build_filter("users", search) or {})
     
     cursor = db.users.find(query).skip(skip).limit(limit).sort("created_at", -1)
     users = []
@@ -164,13 +125,13 @@ async def get_all_users(
         user_data.pop("hashed_password", None)
         users.append(User(**user_data))
     
-    return users
+    return FastJSONResponse(users)
 
 @router.put("/users/{user_id}/status")
 async def update_user_status(
     user_id: str,
     is_active: bool,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Update user active status"""
@@ -185,12 +146,16 @@ async def update_user_status(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    if not is_active:
+        # Access tokens carry the active flag; revoke them instead of checking the account per request
+        await token_service.revoke_subject(db, user_id)
+    
     return {"message": f"User {'activated' if is_active else 'deactivated'} successfully"}
 
 # Doctor Management
 @router.get("/doctors", response_model=List[Doctor])
 async def get_all_doctors(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -208,11 +173,7 @@ async def get_all_doctors(
         query["is_active"] = is_active
     
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}},
-            {"license_number": {"$regex": search, "$options": "i"}}
-        ]
+        query.update(admin_search_service.build_filter("doctors", search) or {})
     
     cursor = db.doctors.find(query).skip(skip).limit(limit).sort("created_at", -1)
     doctors = []
@@ -221,13 +182,13 @@ async def get_all_doctors(
         doctor_data.pop("hashed_password", None)
         doctors.append(Doctor(**doctor_data))
     
-    return doctors
+    return FastJSONResponse(doctors)
 
 @router.put("/doctors/{doctor_id}/verify")
 async def verify_doctor(
     doctor_id: str,
     is_verified: bool,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Verify or unverify a doctor"""
@@ -247,7 +208,7 @@ async def verify_doctor(
 # Order Management
 @router.get("/orders", response_model=List[Order])
 async def get_all_orders(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -261,21 +222,21 @@ async def get_all_orders(
         query["status"] = status
     
     if order_number:
-        query["order_number"] = {"$regex": order_number, "$options": "i"}
+        query.update(admin_search_service.build_filter("orders", order_number) or {})
     
     cursor = db.orders.find(query).skip(skip).limit(limit).sort("created_at", -1)
     orders = []
     async for order in cursor:
         orders.append(Order(**order))
     
-    return orders
+    return FastJSONResponse(orders)
 
 @router.put("/orders/{order_id}/status")
 async def update_order_status(
     order_id: str,
     status: str,
     tracking_number: Optional[str] = None,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Update order status"""
@@ -311,7 +272,7 @@ async def update_order_status(
 # Appointment Management
 @router.get("/appointments", response_model=List[Appointment])
 async def get_all_appointments(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -337,12 +298,12 @@ async def get_all_appointments(
     async for appointment in cursor:
         appointments.append(Appointment(**appointment))
     
-    return appointments
+    return FastJSONResponse(appointments)
 
 # Emergency Management
 @router.get("/emergency-requests", response_model=List[EmergencyRequest])
 async def get_all_emergency_requests(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -363,12 +324,12 @@ async def get_all_emergency_requests(
     async for request in cursor:
         requests.append(EmergencyRequest(**request))
     
-    return requests
+    return FastJSONResponse(requests)
 
 # Contact/Support Management
 @router.get("/contacts", response_model=List[Contact])
 async def get_all_contacts(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -389,13 +350,13 @@ async def get_all_contacts(
     async for contact in cursor:
         contacts.append(Contact(**contact))
     
-    return contacts
+    return FastJSONResponse(contacts)
 
 @router.put("/contacts/{contact_id}/assign")
 async def assign_contact(
     contact_id: str,
     assigned_to: str,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Assign contact to admin/doctor"""
@@ -424,7 +385,7 @@ async def assign_contact(
 # System Configuration
 @router.get("/config/services", response_model=List[Service])
 async def get_services_config(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get system services configuration"""
@@ -437,7 +398,7 @@ async def get_services_config(
 
 @router.get("/config/footer", response_model=List[FooterContent])
 async def get_footer_config(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get footer content configuration"""
@@ -448,10 +409,64 @@ async def get_footer_config(
     
     return footer_content
 
+# Inventory
+@router.get("/inventory/low-stock")
+async def get_low_stock_medicines(
+    status: Optional[str] = Query(None, pattern="^(low_stock|out_of_stock)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    current_admin: Principal = Depends(get_current_admin_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get the low-stock watchlist"""
+    summary = await inventory_service.get_summary(db)
+    watchlist = await inventory_service.get_watchlist(db, status=status, skip=skip, limit=limit)
+    
+    return {
+        "threshold": inventory_service.low_stock_threshold,
+        "summary": summary,
+        "medicines": [
+            {
+                "medicine_id": str(counter["_id"]),
+                "name": counter.get("name"),
+                "stock_quantity": counter.get("stock_quantity", 0),
+                "status": counter.get("status"),
+                "status_since": counter.get("status_since"),
+                "units_sold": counter.get("units_sold", 0)
+            }
+            for counter in watchlist
+        ]
+    }
+
+@router.get("/inventory/events")
+async def get_inventory_events(
+    medicine_id: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    current_admin: Principal = Depends(get_current_admin_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get stock movement history, newest first"""
+    query = {}
+    if medicine_id:
+        if not ObjectId.is_valid(medicine_id):
+            raise HTTPException(status_code=400, detail="Invalid medicine ID")
+        query["medicine_id"] = ObjectId(medicine_id)
+    
+    cursor = db.inventory_events.find(query).sort("created_at", -1).skip(skip).limit(limit)
+    events = []
+    async for event in cursor:
+        for field in ("_id", "medicine_id", "order_id", "actor_id"):
+            if event.get(field) is not None:
+                event[field] = str(event[field])
+        events.append(event)
+    
+    return events
+
 # System Health
 @router.get("/system/health")
 async def get_system_health(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get system health status"""
@@ -462,15 +477,8 @@ async def get_system_health(
     except Exception as e:
         db_status = f"error: {str(e)}"
     
-    # Get collection counts for health check
-    collections_health = {}
-    try:
-        collections = ["users", "doctors", "appointments", "orders", "medicines"]
-        for collection in collections:
-            count = await db[collection].count_documents({})
-            collections_health[collection] = {"count": count, "status": "healthy"}
-    except Exception as e:
-        collections_health["error"] = str(e)
+    # Get collection counts for health check (from collection metadata, not scans)
+    collections_health = await analytics_service.collection_counts(db)
     
     return {
         "database": db_status,
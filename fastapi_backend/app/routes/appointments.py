@@ -15,6 +15,8 @@ from ..utils.auth import get_current_active_user, get_current_active_doctor, get
 from ..services.calendar_service import calendar_service
 from ..services.email_service import email_service
 from ..services.availability_service import availability_service
+from ..services.rollup_service import rollup_service
+from ..services.doctor_stats_service import doctor_stats_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -192,8 +194,8 @@ async def quick_book_appointment(
     appointment_dict["created_at"] = datetime.utcnow()
     appointment_dict["updated_at"] = datetime.utcnow()
     
-    result = await db.appointments.insert_one(appointment_dict)
-    appointment_dict["_id"] = result.inserted_id
+    await doctor_stats_service.create_appointment(db, appointment_dict)
+    await rollup_service.record_booking(db, appointment_dict)
     
     return Appointment(**appointment_dict)
 
@@ -362,8 +364,9 @@ async def book_appointment(
     appointment_dict["appointment_date"] = appointment_date_str
     
     # Insert appointment into database
-    result = await db.appointments.insert_one(appointment_dict)
-    created_appointment = await db.appointments.find_one({"_id": result.inserted_id})
+    appointment_id = await doctor_stats_service.create_appointment(db, appointment_dict)
+    await rollup_service.record_booking(db, appointment_dict)
+    created_appointment = await db.appointments.find_one({"_id": appointment_id})
     
     # Add timestamps for Pydantic model compatibility
     created_appointment["created_at"] = appointment_dict["created_at"]
@@ -373,7 +376,7 @@ async def book_appointment(
     
     # Prepare data for calendar and email
     calendar_data = {
-        'appointment_id': str(result.inserted_id),
+        'appointment_id': str(appointment_id),
         'appointment_date': appointment_data.appointment_date,
         'appointment_time': appointment_data.appointment_time,
         'symptoms': appointment_data.symptoms,
@@ -394,7 +397,7 @@ async def book_appointment(
         # Update appointment with calendar event ID
         if calendar_event:
             await db.appointments.update_one(
-                {"_id": result.inserted_id},
+                {"_id": appointment_id},
                 {"$set": {
                     "calendar_event_id": calendar_event.get('event_id'),
                     "meet_link": calendar_event.get('meet_link')
@@ -451,12 +454,10 @@ async def update_appointment(
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
     
-    await db.appointments.update_one(
-        {"_id": ObjectId(appointment_id)},
-        {"$set": update_data}
-    )
+    updated_appointment = await doctor_stats_service.update_appointment(db, ObjectId(appointment_id), update_data)
+    if "status" in update_data:
+        await rollup_service.record_booking_status(db, appointment, update_data["status"])
     
-    updated_appointment = await db.appointments.find_one({"_id": ObjectId(appointment_id)})
     return Appointment(**updated_appointment)
 
 @router.delete("/{appointment_id}")
@@ -486,13 +487,11 @@ async def cancel_appointment(
             detail="Cannot cancel completed or already cancelled appointment"
         )
     
-    await db.appointments.update_one(
-        {"_id": ObjectId(appointment_id)},
-        {"$set": {
-            "status": AppointmentStatus.CANCELLED,
-            "updated_at": datetime.utcnow()
-        }}
-    )
+    await doctor_stats_service.update_appointment(db, ObjectId(appointment_id), {
+        "status": AppointmentStatus.CANCELLED,
+        "updated_at": datetime.utcnow()
+    })
+    await rollup_service.record_booking_status(db, appointment, AppointmentStatus.CANCELLED)
     
     return {"message": "Appointment cancelled successfully"}
 
@@ -547,16 +546,14 @@ async def reschedule_appointment(
         )
     
     # Update appointment
-    await db.appointments.update_one(
-        {"_id": ObjectId(appointment_id)},
-        {"$set": {
-            "appointment_date": new_date,
-            "appointment_time": new_time,
-            "status": AppointmentStatus.RESCHEDULED,
-            "updated_at": datetime.utcnow(),
-            "notes": reschedule_data.get("notes", appointment.get("notes"))
-        }}
-    )
+    await doctor_stats_service.update_appointment(db, ObjectId(appointment_id), {
+        "appointment_date": new_date,
+        "appointment_time": new_time,
+        "status": AppointmentStatus.RESCHEDULED,
+        "updated_at": datetime.utcnow(),
+        "notes": reschedule_data.get("notes", appointment.get("notes"))
+    })
+    await rollup_service.record_booking_status(db, appointment, AppointmentStatus.RESCHEDULED)
     
     return {"message": "Appointment rescheduled successfully"}
 
@@ -609,18 +606,10 @@ async def get_doctor_available_slots(
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     
-    # Get doctor's availability settings
-    availability = doctor.get('availability', {})
-    weekday = datetime.strptime(date, "%Y-%m-%d").strftime("%A").lower()
-    
-    day_availability = availability.get(weekday, {
-        'is_available': True,
-        'start_time': '09:00',
-        'end_time': '17:00'
-    })
+    day = (await availability_service.get_range_availability(db, doctor_id, date, 1, doctor=doctor))[date]
     
     # If doctor is not available on this day, return empty slots
-    if not day_availability.get('is_available', True):
+    if not day["is_available"]:
         return {
             "doctor_id": doctor_id,
             "doctor_name": doctor.get('full_name', 'Doctor'),
@@ -632,59 +621,10 @@ async def get_doctor_available_slots(
             "available_count": 0
         }
     
-    # Generate ALL possible slots for the day
-    if 'time_blocks' in day_availability:
-        # Multiple time blocks with breaks
-        time_blocks = day_availability['time_blocks']
-        all_possible_slots = availability_service.generate_multiple_time_blocks_slots(time_blocks)
-    else:
-        # Single continuous time block
-        start_time = day_availability.get('start_time', '09:00')
-        end_time = day_availability.get('end_time', '17:00')
-        all_possible_slots = availability_service.generate_time_slots(start_time, end_time)
-    
-    # Get existing appointments for this doctor on this date
-    date_obj = datetime.strptime(date, "%Y-%m-%d")
-    next_day = date_obj + timedelta(days=1)
-    
-    existing_appointments = await db.appointments.find({
-        "doctor_id": ObjectId(doctor_id),
-        "appointment_date": {
-            "$gte": date_obj,
-            "$lt": next_day
-        },
-        "status": {"$in": ["pending", "confirmed"]}
-    }).to_list(None)
-    
-    # Get booked time slots
-    booked_slots = set(apt["appointment_time"] for apt in existing_appointments)
-    
     # Format ALL slots with availability status
-    formatted_slots = []
-    available_count = 0
-    current_time = datetime.now().strftime("%H:%M")
-    is_today = date == datetime.now().strftime("%Y-%m-%d")
-    
-    for slot in all_possible_slots:
-        end_time = availability_service.get_slot_duration_end(slot)
-        
-        # Check if slot is available
-        is_booked = slot in booked_slots
-        is_past = is_today and slot <= current_time
-        is_available = not is_booked and not is_past
-        
-        if is_available:
-            available_count += 1
-            
-        formatted_slots.append({
-            "time": slot,
-            "end_time": end_time,
-            "display_time": f"{availability_service.format_time_slot(slot)} - {availability_service.format_time_slot(end_time)}",
-            "display_range": f"{availability_service.format_time_slot(slot)} - {availability_service.format_time_slot(end_time)}",
-            "is_available": is_available,
-            "is_booked": is_booked,
-            "is_past": is_past
-        })
+    formatted_slots, available_count = availability_service.format_slots(
+        day["all_slots"], day["booked_slots"], date
+    )
     
     return {
         "doctor_id": doctor_id,
@@ -725,94 +665,18 @@ async def get_doctor_weekly_availability(
         raise HTTPException(status_code=404, detail="Doctor not found")
     
     # Get detailed weekly availability with same structure as daily endpoint
-    formatted_availability = {}
-    start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
+    weekly = await availability_service.get_range_availability(db, doctor_id, start_date, 7, doctor=doctor)
     
-    for i in range(7):
-        current_date_obj = start_date_obj + timedelta(days=i)
-        date_str = current_date_obj.strftime("%Y-%m-%d")
-        
-        # Get doctor's availability settings for this day
-        availability = doctor.get('availability', {})
-        weekday = current_date_obj.strftime("%A").lower()
-        
-        day_availability = availability.get(weekday, {
-            'is_available': True,
-            'start_time': '09:00',
-            'end_time': '17:00'
-        })
-        
-        # If doctor is not available on this day, return empty slots
-        if not day_availability.get('is_available', True):
-            formatted_availability[date_str] = {
-                "date": date_str,
-                "day_name": current_date_obj.strftime("%A"),
-                "formatted_date": current_date_obj.strftime("%B %d, %Y"),
-                "is_available": False,
-                "available_slots": [],
-                "total_slots": 0,
-                "available_count": 0
-            }
-            continue
-        
-        # Generate ALL possible slots for the day
-        if 'time_blocks' in day_availability:
-            # Multiple time blocks with breaks
-            time_blocks = day_availability['time_blocks']
-            all_possible_slots = availability_service.generate_multiple_time_blocks_slots(time_blocks)
-        else:
-            # Single continuous time block
-            start_time = day_availability.get('start_time', '09:00')
-            end_time = day_availability.get('end_time', '17:00')
-            all_possible_slots = availability_service.generate_time_slots(start_time, end_time)
-        
-        # Get existing appointments for this doctor on this date
-        next_day = current_date_obj + timedelta(days=1)
-        
-        existing_appointments = await db.appointments.find({
-            "doctor_id": ObjectId(doctor_id),
-            "appointment_date": {
-                "$gte": current_date_obj,
-                "$lt": next_day
-            },
-            "status": {"$in": ["pending", "confirmed"]}
-        }).to_list(None)
-        
-        # Get booked time slots
-        booked_slots = set(apt["appointment_time"] for apt in existing_appointments)
-        
-        # Format ALL slots with availability status
-        formatted_slots = []
-        available_count = 0
-        current_time = datetime.now().strftime("%H:%M")
-        is_today = date_str == datetime.now().strftime("%Y-%m-%d")
-        
-        for slot in all_possible_slots:
-            end_time = availability_service.get_slot_duration_end(slot)
-            
-            # Check if slot is available
-            is_booked = slot in booked_slots
-            is_past = is_today and slot <= current_time
-            is_available = not is_booked and not is_past
-            
-            if is_available:
-                available_count += 1
-                
-            formatted_slots.append({
-                "time": slot,
-                "end_time": end_time,
-                "display_time": f"{availability_service.format_time_slot(slot)} - {availability_service.format_time_slot(end_time)}",
-                "display_range": f"{availability_service.format_time_slot(slot)} - {availability_service.format_time_slot(end_time)}",
-                "is_available": is_available,
-                "is_booked": is_booked,
-                "is_past": is_past
-            })
-        
+    formatted_availability = {}
+    for date_str, day in weekly.items():
+        formatted_slots, available_count = availability_service.format_slots(
+            day["all_slots"], day["booked_slots"], date_str
+        )
         formatted_availability[date_str] = {
             "date": date_str,
-            "day_name": current_date_obj.strftime("%A"),
-            "formatted_date": current_date_obj.strftime("%B %d, %Y"),
-            "is_available": True,
+            "day_name": day["day_obj"].strftime("%A"),
+            "formatted_date": day["day_obj"].strftime("%B %d, %Y"),
+            "is_available": day["is_available"],
             "available_slots": formatted_slots,
             "total_slots": len(formatted_slots),
             "available_count": available_count
@@ -1166,35 +1030,20 @@ async def get_my_appointments_overview(
 ):
     """Get doctor's appointment overview for the next N days"""
     
-    start_date = datetime.now().date()
-    appointments_overview = {}
+    # One doctor read and one appointments query for the whole range
+    start_date = datetime.now().strftime("%Y-%m-%d")
+    availability = await availability_service.get_range_availability(
+        db, str(current_doctor.id), start_date, days
+    )
     
-    for i in range(days):
-        current_date = start_date + timedelta(days=i)
-        date_str = current_date.strftime("%Y-%m-%d")
-        
-        # Get appointments for this date
-        next_day = current_date + timedelta(days=1)
-        appointments_cursor = db.appointments.find({
-            "doctor_id": str(current_doctor.id),
-            "appointment_date": date_str,
-            "status": {"$in": ["pending", "confirmed"]}
-        })
-        
-        appointments = await appointments_cursor.to_list(None)
-        
-        # Get available slots
-        from ..services.availability_service import availability_service
-        available_slots = await availability_service.get_doctor_available_slots(
-            db, str(current_doctor.id), date_str
-        )
-        
+    appointments_overview = {}
+    for date_str, day in availability.items():
         appointments_overview[date_str] = {
             "date": date_str,
-            "day_name": current_date.strftime("%A"),
-            "formatted_date": current_date.strftime("%B %d, %Y"),
-            "total_appointments": len(appointments),
-            "available_slots": len(available_slots),
+            "day_name": day["day_obj"].strftime("%A"),
+            "formatted_date": day["day_obj"].strftime("%B %d, %Y"),
+            "total_appointments": len(day["appointments"]),
+            "available_slots": len(day["available_slots"]),
             "appointments": [
                 {
                     "id": str(apt["_id"]),
@@ -1203,7 +1052,7 @@ async def get_my_appointments_overview(
                     "symptoms": apt.get("symptoms", ""),
                     "status": apt.get("status", "pending")
                 }
-                for apt in appointments
+                for apt in day["appointments"]
             ]
         }
     
@@ -1219,79 +1068,13 @@ async def get_doctor_dashboard_stats(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get doctor dashboard statistics"""
-    from datetime import datetime, timedelta
-    
-    today = datetime.now().date()
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
-    
-    # Get total appointments for this doctor
-    total_appointments = await db.appointments.count_documents({
-        "doctor_id": current_doctor.id
-    })
-    
-    # Get today's appointments
-    today_appointments = await db.appointments.count_documents({
-        "doctor_id": current_doctor.id,
-        "appointment_date": {"$gte": today_start, "$lte": today_end}
-    })
-    
-    # Get upcoming appointments (future dates)
-    upcoming_appointments = await db.appointments.count_documents({
-        "doctor_id": current_doctor.id,
-        "appointment_date": {"$gt": today_end},
-        "status": {"$in": ["pending", "confirmed"]}
-    })
-    
-    # Get completed appointments
-    completed_appointments = await db.appointments.count_documents({
-        "doctor_id": current_doctor.id,
-        "status": "completed"
-    })
-    
-    # Get pending appointments
-    pending_appointments = await db.appointments.count_documents({
-        "doctor_id": current_doctor.id,
-        "status": "pending"
-    })
-    
-    # Calculate total earnings from completed appointments
-    completed_pipeline = [
-        {"$match": {
-            "doctor_id": current_doctor.id,
-            "status": "completed"
-        }},
-        {"$group": {
-            "_id": None,
-            "total_earnings": {"$sum": "$consultation_fee"}
-        }}
-    ]
-    
-    earnings_result = await db.appointments.aggregate(completed_pipeline).to_list(length=1)
-    total_earnings = earnings_result[0]["total_earnings"] if earnings_result else 0
-    
-    # Get unique patients count
-    unique_patients_pipeline = [
-        {"$match": {"doctor_id": current_doctor.id}},
-        {"$group": {"_id": "$patient_id"}},
-        {"$count": "unique_patients"}
-    ]
-    
-    patients_result = await db.appointments.aggregate(unique_patients_pipeline).to_list(length=1)
-    unique_patients = patients_result[0]["unique_patients"] if patients_result else 0
+    # Counters are maintained with every appointment write; one read serves the dashboard
+    stats = await doctor_stats_service.get_stats(db, current_doctor.id)
     
     return {
         "doctor_id": str(current_doctor.id),
         "doctor_name": current_doctor.full_name,
-        "stats": {
-            "total_appointments": total_appointments,
-            "today_appointments": today_appointments,
-            "upcoming_appointments": upcoming_appointments,
-            "completed_appointments": completed_appointments,
-            "pending_appointments": pending_appointments,
-            "total_patients": unique_patients,
-            "total_earnings": float(total_earnings)
-        },
+        "stats": stats,
         "generated_at": datetime.utcnow().isoformat()
     }
 
@@ -1322,12 +1105,11 @@ async def update_appointment_status_by_doctor(
     if new_status not in ["pending", "confirmed", "completed", "cancelled"]:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    await db.appointments.update_one(
-        {"_id": appointment_object_id},
-        {"$set": {"status": new_status, "updated_at": datetime.utcnow()}}
-    )
-    
-    updated_appointment = await db.appointments.find_one({"_id": appointment_object_id})
+    updated_appointment = await doctor_stats_service.update_appointment(db, appointment_object_id, {
+        "status": new_status,
+        "updated_at": datetime.utcnow()
+    })
+    await rollup_service.record_booking_status(db, appointment, new_status)
     
     # Convert ObjectId to string for response
     updated_appointment["_id"] = str(updated_appointment["_id"])
@@ -1364,16 +1146,12 @@ async def reschedule_appointment_by_doctor(
         raise HTTPException(status_code=400, detail="New date and time are required")
     
     # Update appointment
-    await db.appointments.update_one(
-        {"_id": appointment_object_id},
-        {
-            "$set": {
-                "appointment_date": new_date,
-                "appointment_time": new_time,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    # Moves the booking between days on the dashboard
+    await doctor_stats_service.update_appointment(db, appointment_object_id, {
+        "appointment_date": new_date,
+        "appointment_time": new_time,
+        "updated_at": datetime.utcnow()
+    })
     
     return {"message": "Appointment rescheduled successfully"}
 
@@ -1398,10 +1176,11 @@ async def cancel_appointment_by_doctor(
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     # Update appointment status to cancelled instead of deleting
-    await db.appointments.update_one(
-        {"_id": appointment_object_id},
-        {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}}
-    )
+    await doctor_stats_service.update_appointment(db, appointment_object_id, {
+        "status": "cancelled",
+        "updated_at": datetime.utcnow()
+    })
+    await rollup_service.record_booking_status(db, appointment, "cancelled")
     
     return {"message": "Appointment cancelled successfully"}
 
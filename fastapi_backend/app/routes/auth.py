@@ -3,15 +3,17 @@ from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import RedirectResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
-from datetime import timedelta, datetime
+from datetime import datetime
 from ..core.database import get_database
-from ..core.security import create_access_token, get_password_hash, create_token_pair, verify_refresh_token
+from ..core.security import get_password_hash_async
 from ..models.user import UserCreate, User
 from ..models.doctor import DoctorCreate, Doctor
 from ..utils.auth import authenticate_user, authenticate_doctor
-from ..core.config import settings
 from ..services.google_oauth_service import google_oauth_service
-from bson import ObjectId
+from ..services.rollup_service import rollup_service
+from ..services.admin_search_service import admin_search_service
+from ..services.migration_service import migration_service
+from ..services.token_service import token_service, TokenError
 import logging
 import secrets
 import urllib.parse
@@ -62,7 +64,7 @@ async def register_user(
         )
     
     # Hash password and create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     user_dict = user_data.dict()
     user_dict.pop("password")
     user_dict["hashed_password"] = hashed_password
@@ -72,7 +74,8 @@ async def register_user(
     user_dict["updated_at"] = datetime.utcnow()
     
     # Insert user into database
-    result = await db.users.insert_one(user_dict)
+    result = await db.users.insert_one(admin_search_service.with_search_keys("users", user_dict))
+    await rollup_service.record_signup(db)
     
     # Get created user and add the timestamp fields we just inserted
     created_user = await db.users.find_one({"_id": result.inserted_id})
@@ -81,17 +84,7 @@ async def register_user(
     created_user["updated_at"] = user_dict["updated_at"]
     user = User(**created_user)
     
-    # Create access token
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        subject=str(user.id), expires_delta=access_token_expires
-    )
-    
-    token = Token(
-        access_token=access_token,
-        token_type="bearer",
-        user_type="user"
-    )
+    token = Token(**await token_service.issue(db, user.id, "user", is_active=user.is_active))
     
     return UserResponse(user=user, token=token)
 
@@ -108,21 +101,12 @@ async def login_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        subject=str(user.id), expires_delta=access_token_expires
-    )
-    
     # Convert to User model (without hashed_password)
     user_dict = user.dict()
     user_dict.pop("hashed_password")
     user_response = User(**user_dict)
     
-    token = Token(
-        access_token=access_token,
-        token_type="bearer",
-        user_type="user"
-    )
+    token = Token(**await token_service.issue(db, user.id, "user", is_active=user.is_active, is_admin=user.is_admin))
     
     return UserResponse(user=user_response, token=token)
 
@@ -148,7 +132,7 @@ async def register_doctor(
         )
     
     # Hash password and create doctor
-    hashed_password = get_password_hash(doctor_data.password)
+    hashed_password = await get_password_hash_async(doctor_data.password)
     doctor_dict = doctor_data.dict()
     doctor_dict.pop("password")
     doctor_dict["hashed_password"] = hashed_password
@@ -158,7 +142,9 @@ async def register_doctor(
     doctor_dict["updated_at"] = datetime.utcnow()
     
     # Insert doctor into database
-    result = await db.doctors.insert_one(doctor_dict)
+    migration_service.with_schema_version("doctors", doctor_dict)
+    result = await db.doctors.insert_one(admin_search_service.with_search_keys("doctors", doctor_dict))
+    await rollup_service.record_signup(db, is_doctor=True)
     
     # Get created doctor and add the timestamp fields we just inserted
     created_doctor = await db.doctors.find_one({"_id": result.inserted_id})
@@ -167,17 +153,7 @@ async def register_doctor(
     created_doctor["updated_at"] = doctor_dict["updated_at"]
     doctor = Doctor(**created_doctor)
     
-    # Create access token
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        subject=str(doctor.id), expires_delta=access_token_expires
-    )
-    
-    token = Token(
-        access_token=access_token,
-        token_type="bearer",
-        user_type="doctor"
-    )
+    token = Token(**await token_service.issue(db, doctor.id, "doctor", is_active=doctor.is_active))
     
     return DoctorResponse(doctor=doctor, token=token)
 
@@ -194,21 +170,12 @@ async def login_doctor(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        subject=str(doctor.id), expires_delta=access_token_expires
-    )
-    
     # Convert to Doctor model (without hashed_password)
     doctor_dict = doctor.dict()
     doctor_dict.pop("hashed_password")
     doctor_response = Doctor(**doctor_dict)
     
-    token = Token(
-        access_token=access_token,
-        token_type="bearer",
-        user_type="doctor"
-    )
+    token = Token(**await token_service.issue(db, doctor.id, "doctor", is_active=doctor.is_active))
     
     return DoctorResponse(doctor=doctor_response, token=token)
 
@@ -306,17 +273,7 @@ async def _handle_google_user_auth(user_info: dict, db: AsyncIOMotorDatabase):
         # User exists, log them in
         user = User(**existing_user)
         
-        # Create access token
-        access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-        access_token = create_access_token(
-            subject=str(user.id), expires_delta=access_token_expires
-        )
-        
-        token = Token(
-            access_token=access_token,
-            token_type="bearer",
-            user_type="user"
-        )
+        token = Token(**await token_service.issue(db, user.id, "user", is_active=user.is_active, is_admin=existing_user.get("is_admin", False)))
         
         return UserResponse(user=user, token=token)
     
@@ -339,23 +296,14 @@ async def _handle_google_user_auth(user_info: dict, db: AsyncIOMotorDatabase):
         }
         
         # Insert user into database
-        result = await db.users.insert_one(user_dict)
+        result = await db.users.insert_one(admin_search_service.with_search_keys("users", user_dict))
+        await rollup_service.record_signup(db)
         
         # Get created user
         created_user = await db.users.find_one({"_id": result.inserted_id})
         user = User(**created_user)
         
-        # Create access token
-        access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-        access_token = create_access_token(
-            subject=str(user.id), expires_delta=access_token_expires
-        )
-        
-        token = Token(
-            access_token=access_token,
-            token_type="bearer",
-            user_type="user"
-        )
+        token = Token(**await token_service.issue(db, user.id, "user", is_active=user.is_active))
         
         return UserResponse(user=user, token=token)
 
@@ -371,17 +319,7 @@ async def _handle_google_doctor_auth(user_info: dict, db: AsyncIOMotorDatabase):
         # Doctor exists, log them in
         doctor = Doctor(**existing_doctor)
         
-        # Create access token
-        access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-        access_token = create_access_token(
-            subject=str(doctor.id), expires_delta=access_token_expires
-        )
-        
-        token = Token(
-            access_token=access_token,
-            token_type="bearer",
-            user_type="doctor"
-        )
+        token = Token(**await token_service.issue(db, doctor.id, "doctor", is_active=doctor.is_active))
         
         return DoctorResponse(doctor=doctor, token=token)
     
@@ -409,23 +347,15 @@ async def _handle_google_doctor_auth(user_info: dict, db: AsyncIOMotorDatabase):
         }
         
         # Insert doctor into database
-        result = await db.doctors.insert_one(doctor_dict)
+        migration_service.with_schema_version("doctors", doctor_dict)
+        result = await db.doctors.insert_one(admin_search_service.with_search_keys("doctors", doctor_dict))
+        await rollup_service.record_signup(db, is_doctor=True)
         
         # Get created doctor
         created_doctor = await db.doctors.find_one({"_id": result.inserted_id})
         doctor = Doctor(**created_doctor)
         
-        # Create access token
-        access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-        access_token = create_access_token(
-            subject=str(doctor.id), expires_delta=access_token_expires
-        )
-        
-        token = Token(
-            access_token=access_token,
-            token_type="bearer",
-            user_type="doctor"
-        )
+        token = Token(**await token_service.issue(db, doctor.id, "doctor", is_active=doctor.is_active))
         
         return DoctorResponse(doctor=doctor, token=token)
 
@@ -434,38 +364,23 @@ async def refresh_token(
     refresh_request: RefreshTokenRequest,
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Refresh access token using refresh token"""
-    user_id = verify_refresh_token(refresh_request.refresh_token)
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Check if user or doctor exists
-    user_data = await db.users.find_one({"_id": ObjectId(user_id)})
-    doctor_data = await db.doctors.find_one({"_id": ObjectId(user_id)})
-    
-    if not user_data and not doctor_data:
+    """Exchange a refresh token for a new access and refresh token pair"""
+    try:
+        tokens = await token_service.rotate(db, refresh_request.refresh_token)
+    except TokenError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail=str(e),
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create new access token
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        subject=user_id, expires_delta=access_token_expires
-    )
-    
-    # Determine user type
-    user_type = "doctor" if doctor_data else "user"
-    
-    return Token(
-        access_token=access_token,
-        token_type="bearer",
-        user_type=user_type,
-        expires_in=settings.access_token_expire_minutes * 60
-    )
+    return Token(**tokens)
+
+@router.post("/logout")
+async def logout(
+    refresh_request: RefreshTokenRequest,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """End the session of a refresh token, revoking its access tokens too"""
+    await token_service.logout(db, refresh_request.refresh_token)
+    return {"message": "Logged out successfully"}
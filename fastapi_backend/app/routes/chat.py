@@ -2,23 +2,47 @@ from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSoc
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional, Dict, Any
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 from ..core.database import get_database
 from ..models.chat import (
-    ChatSession, ChatSessionCreate, ChatSessionStatus,
+    ChatSession, ChatSessionCreate, ChatSessionStatus, ChatSessionSummary,
     Message, MessageCreate,
     Escalation, EscalationCreate,
-    FileUpload, FileUploadCreate
+    FileUpload, FileUploadCreate, FileUploadUrlRequest
 )
-from ..models.user import UserInDB
-from ..utils.auth import get_current_active_user
+from ..models.user import Principal
+from ..utils.auth import get_current_active_principal
+from ..utils.projection import select_fields
+from ..core.responses import FastJSONResponse
 from ..services.ai_service import ai_service
+from ..services.azure_storage import azure_storage
+from ..core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Storage folder per upload purpose; signed upload URLs are only issued under these
+UPLOAD_FOLDERS = {
+    "profile_picture": "profile_picture",
+    "prescription": "prescription",
+    "report": "report",
+    "chat_attachment": "chat_attachment"
+}
+
+# How long after its upload URL expires an issued blob can still be registered
+UPLOAD_GRANT_GRACE = timedelta(minutes=30)
+
+def _owns_blob(blob_name: str, user_id: ObjectId) -> bool:
+    """Whether a blob lies in one of the user's upload folders"""
+    if ".." in blob_name.split("/"):
+        return False
+    return any(
+        blob_name.startswith(f"{folder}/{user_id}/")
+        for folder in UPLOAD_FOLDERS.values()
+    )
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
@@ -38,14 +62,16 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
-@router.get("/sessions", response_model=List[ChatSession])
+@router.get("/sessions", response_model=None, responses={200: {"model": List[ChatSessionSummary]}})
 async def get_chat_sessions(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     session_type: Optional[str] = None,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    fields: Optional[str] = None
 ):
     """Get user's chat sessions"""
+    response_model, projection = select_fields(ChatSession, ChatSessionSummary, fields)
     query = {"user_id": current_user.id}
     
     if session_type:
@@ -54,17 +80,17 @@ async def get_chat_sessions(
     if status:
         query["status"] = status
     
-    cursor = db.chat_sessions.find(query).sort("last_activity", -1)
+    cursor = db.chat_sessions.find(query, projection).sort("last_activity", -1)
     sessions = []
     async for session in cursor:
-        sessions.append(ChatSession(**session))
+        sessions.append(response_model(**session))
     
-    return sessions
+    return FastJSONResponse(sessions)
 
 @router.post("/sessions", response_model=ChatSession)
 async def create_chat_session(
     session_data: ChatSessionCreate,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Create a new chat session"""
@@ -79,7 +105,7 @@ async def create_chat_session(
 @router.get("/sessions/{session_id}", response_model=ChatSession)
 async def get_chat_session(
     session_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get a specific chat session"""
@@ -99,7 +125,7 @@ async def get_chat_session(
 @router.get("/sessions/{session_id}/messages", response_model=List[Message])
 async def get_session_messages(
     session_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = 0,
     limit: int = 100
@@ -131,7 +157,7 @@ async def get_session_messages(
 async def send_message(
     session_id: str,
     message_data: MessageCreate,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Send a message in a chat session"""
@@ -215,7 +241,7 @@ async def websocket_endpoint(
 @router.put("/sessions/{session_id}/close")
 async def close_chat_session(
     session_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Close a chat session"""
@@ -245,7 +271,7 @@ async def close_chat_session(
 async def escalate_session(
     session_id: str,
     escalation_data: EscalationCreate,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Escalate a chat session"""
@@ -279,7 +305,7 @@ async def escalate_session(
 
 @router.get("/escalations", response_model=List[Escalation])
 async def get_user_escalations(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get user's escalations"""
@@ -295,7 +321,7 @@ async def get_user_escalations(
 async def upload_chat_file(
     session_id: str,
     file_data: FileUploadCreate,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Upload a file to chat session"""
@@ -311,11 +337,95 @@ async def upload_chat_file(
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
     
+    # Only blobs issued to this user for this session by /upload-url can be registered
+    blob_name = azure_storage.blob_name_from_url(file_data.file_url)
+    if not blob_name:
+        raise HTTPException(status_code=400, detail="File URL is not in our storage")
+    
+    grant = await db.upload_grants.find_one_and_delete({
+        "_id": blob_name,
+        "user_id": current_user.id,
+        "session_id": ObjectId(session_id)
+    })
+    
+    if not grant:
+        raise HTTPException(status_code=403, detail="File was not uploaded through an issued upload URL")
+    
     file_dict = file_data.dict()
     file_dict["user_id"] = current_user.id
     file_dict["session_id"] = ObjectId(session_id)
+    file_dict["blob_name"] = blob_name
+    file_dict["upload_purpose"] = grant["upload_purpose"]
     
     result = await db.file_uploads.insert_one(file_dict)
     created_file = await db.file_uploads.find_one({"_id": result.inserted_id})
     
-    return FileUpload(**created_file)
\ No newline at end of file
+    return FileUpload(**created_file)
+
+@router.post("/sessions/{session_id}/upload-url")
+async def get_chat_upload_url(
+    session_id: str,
+    upload_request: FileUploadUrlRequest,
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Issue a signed URL so the client can upload an attachment directly to storage.
+    
+    After the PUT to ``upload_url`` succeeds, register the file via
+    ``/sessions/{session_id}/upload`` with ``file_url`` set to ``blob_url``.
+    """
+    if not ObjectId.is_valid(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session ID")
+    
+    session = await db.chat_sessions.find_one({
+        "_id": ObjectId(session_id),
+        "user_id": current_user.id
+    })
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    try:
+        upload = azure_storage.get_upload_url(
+            file_name=upload_request.file_name,
+            folder=f"{UPLOAD_FOLDERS[upload_request.upload_purpose]}/{current_user.id}"
+        )
+    except Exception as e:
+        logger.error(f"Error issuing upload URL: {e}")
+        raise HTTPException(status_code=500, detail="Failed to issue upload URL")
+    
+    # Remember the issued blob so registration and signed reads are limited to it
+    await db.upload_grants.insert_one({
+        "_id": upload["blob_name"],
+        "user_id": current_user.id,
+        "session_id": ObjectId(session_id),
+        "upload_purpose": upload_request.upload_purpose,
+        "expires_at": datetime.utcnow() + timedelta(minutes=settings.sas_upload_expire_minutes) + UPLOAD_GRANT_GRACE
+    })
+    
+    return upload
+
+@router.get("/files/{file_id}/url")
+async def get_chat_file_url(
+    file_id: str,
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get a short-lived signed download URL for an uploaded file"""
+    if not ObjectId.is_valid(file_id):
+        raise HTTPException(status_code=400, detail="Invalid file ID")
+    
+    file_record = await db.file_uploads.find_one({
+        "_id": ObjectId(file_id),
+        "user_id": current_user.id
+    })
+    
+    if not file_record:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    # Sign only the blob issued to this user; the client-supplied file_url is never trusted
+    blob_name = file_record.get("blob_name")
+    if not blob_name or not _owns_blob(blob_name, current_user.id):
+        raise HTTPException(status_code=403, detail="File is not available for download")
+    
+    return {"url": azure_storage.get_read_url(blob_name)}
@@ -5,8 +5,8 @@ from bson import ObjectId
 from datetime import datetime
 from ..core.database import get_database
 from ..models.general import Contact, ContactCreate, ContactUpdate, Newsletter, NewsletterCreate
-from ..models.user import UserInDB
-from ..utils.auth import get_current_admin_user
+from ..models.user import Principal
+from ..utils.auth import get_current_admin_principal
 from ..services.email_service import email_service
 import logging
 
@@ -64,7 +64,7 @@ async def create_contact(
 
 @router.get("/", response_model=List[Contact])
 async def get_contacts(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -90,7 +90,7 @@ async def get_contacts(
 @router.get("/{contact_id}", response_model=Contact)
 async def get_contact(
     contact_id: str,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get a specific contact request (Admin only)"""
@@ -107,7 +107,7 @@ async def get_contact(
 async def update_contact(
     contact_id: str,
     contact_data: ContactUpdate,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Update contact request status (Admin only)"""
@@ -135,7 +135,7 @@ async def update_contact(
 async def reply_to_contact(
     contact_id: str,
     reply_message: str,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Reply to a contact request (Admin only)"""
@@ -275,7 +275,7 @@ async def unsubscribe_newsletter(
 
 @router.get("/newsletter/subscribers")
 async def get_newsletter_subscribers(
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100)
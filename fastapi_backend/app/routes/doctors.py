@@ -10,22 +10,36 @@ from typing import Optional, List
 from datetime import datetime
 
 from ..core.database import get_database
-from ..models.doctor import Doctor, DoctorUpdate
+from ..models.doctor import Doctor, DoctorUpdate, DoctorSummary
 from ..utils.auth import get_current_doctor
+from ..utils.projection import select_fields
+from ..core.responses import FastJSONResponse
 from ..services.availability_service import availability_service
+from ..services.suggest_service import suggestion_index
+from ..services.admin_search_service import admin_search_service
+from ..services.migration_service import migration_service, LEGACY_DOCTOR_FIELDS
 
 router = APIRouter()
 
-@router.get("/", response_model=List[Doctor])
+# Stored fields each doctor field is read from: un-migrated documents still use
+# legacy names, and schema_version (fetched with the always-selected id) lets
+# migrated ones skip the remapping
+DOCTOR_FIELD_SOURCES = {field: [legacy] for field, legacy in LEGACY_DOCTOR_FIELDS.items()}
+DOCTOR_FIELD_SOURCES["id"] = ["schema_version"]
+
+@router.get("/", response_model=None, responses={200: {"model": List[DoctorSummary]}})
 async def get_all_doctors(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     specialization: Optional[str] = Query(None),
     is_verified: Optional[bool] = Query(None),
     is_active: Optional[bool] = Query(True),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of the summary"),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get all doctors with filtering options"""
+    response_model, projection = select_fields(Doctor, DoctorSummary, fields, DOCTOR_FIELD_SOURCES)
+    
     try:
         # Build query filter
         query_filter = {}
@@ -37,33 +51,23 @@ async def get_all_doctors(
             query_filter["is_active"] = is_active
 
         # Get doctors from database
-        doctors_cursor = db.doctors.find(query_filter).skip(skip).limit(limit)
+        doctors_cursor = db.doctors.find(query_filter, projection).skip(skip).limit(limit)
         doctors = await doctors_cursor.to_list(None)
         
-        # Convert to Doctor models with field mapping
         result = []
         for doctor_data in doctors:
-            # Handle field mapping for backward compatibility
-            if "name" in doctor_data and "full_name" not in doctor_data:
-                doctor_data["full_name"] = doctor_data["name"]
-            if "specializations" in doctor_data and "specialization" not in doctor_data:
-                specializations = doctor_data.get("specializations", [])
-                doctor_data["specialization"] = specializations[0] if specializations else ""
-            if "experience" in doctor_data and "experience_years" not in doctor_data:
-                doctor_data["experience_years"] = doctor_data["experience"]
-            if "qualifications" in doctor_data and "qualification" not in doctor_data:
-                doctor_data["qualification"] = doctor_data["qualifications"]
-            if "address" in doctor_data and "clinic_address" not in doctor_data:
-                doctor_data["clinic_address"] = doctor_data["address"]
+            # Documents still on a legacy schema are mapped in memory until migrated
+            migration_service.normalize_doctor(doctor_data)
             
             try:
-                doctor = Doctor(**doctor_data)
+                doctor = response_model(**doctor_data)
                 result.append(doctor)
             except Exception as e:
                 # Skip invalid doctors
                 continue
         
-        return result
+        # Rows were validated above; serialize them without a second pass
+        return FastJSONResponse(result)
         
     except Exception as e:
         raise HTTPException(
@@ -91,18 +95,7 @@ async def get_doctor_by_id(
                 detail="Doctor not found"
             )
         
-        # Handle field mapping for backward compatibility
-        if "name" in doctor_data and "full_name" not in doctor_data:
-            doctor_data["full_name"] = doctor_data["name"]
-        if "specializations" in doctor_data and "specialization" not in doctor_data:
-            specializations = doctor_data.get("specializations", [])
-            doctor_data["specialization"] = specializations[0] if specializations else ""
-        if "experience" in doctor_data and "experience_years" not in doctor_data:
-            doctor_data["experience_years"] = doctor_data["experience"]
-        if "qualifications" in doctor_data and "qualification" not in doctor_data:
-            doctor_data["qualification"] = doctor_data["qualifications"]
-        if "address" in doctor_data and "clinic_address" not in doctor_data:
-            doctor_data["clinic_address"] = doctor_data["address"]
+        migration_service.normalize_doctor(doctor_data)
         
         return Doctor(**doctor_data)
         
@@ -128,18 +121,7 @@ async def get_doctor_profile(
                 detail="Doctor profile not found"
             )
         
-        # Handle field mapping
-        if "name" in doctor_data and "full_name" not in doctor_data:
-            doctor_data["full_name"] = doctor_data["name"]
-        if "specializations" in doctor_data and "specialization" not in doctor_data:
-            specializations = doctor_data.get("specializations", [])
-            doctor_data["specialization"] = specializations[0] if specializations else ""
-        if "experience" in doctor_data and "experience_years" not in doctor_data:
-            doctor_data["experience_years"] = doctor_data["experience"]
-        if "qualifications" in doctor_data and "qualification" not in doctor_data:
-            doctor_data["qualification"] = doctor_data["qualifications"]
-        if "address" in doctor_data and "clinic_address" not in doctor_data:
-            doctor_data["clinic_address"] = doctor_data["address"]
+        migration_service.normalize_doctor(doctor_data)
         
         return Doctor(**doctor_data)
         
@@ -163,6 +145,10 @@ async def update_doctor_profile(
         update_dict = update_data.dict(exclude_unset=True)
         if update_dict:
             update_dict["updated_at"] = datetime.utcnow()
+            if admin_search_service.needs_refresh("doctors", update_dict):
+                update_dict["search_keys"] = admin_search_service.search_keys(
+                    "doctors", {**current_doctor.dict(), **update_dict}
+                )
             
             # Update doctor in database
             result = await db.doctors.update_one(
@@ -178,19 +164,9 @@ async def update_doctor_profile(
         
         # Return updated doctor
         updated_doctor = await db.doctors.find_one({"_id": ObjectId(current_doctor.id)})
+        suggestion_index.index_doctor(updated_doctor)
         
-        # Handle field mapping
-        if "name" in updated_doctor and "full_name" not in updated_doctor:
-            updated_doctor["full_name"] = updated_doctor["name"]
-        if "specializations" in updated_doctor and "specialization" not in updated_doctor:
-            specializations = updated_doctor.get("specializations", [])
-            updated_doctor["specialization"] = specializations[0] if specializations else ""
-        if "experience" in updated_doctor and "experience_years" not in updated_doctor:
-            updated_doctor["experience_years"] = updated_doctor["experience"]
-        if "qualifications" in updated_doctor and "qualification" not in updated_doctor:
-            updated_doctor["qualification"] = updated_doctor["qualifications"]
-        if "address" in updated_doctor and "clinic_address" not in updated_doctor:
-            updated_doctor["clinic_address"] = updated_doctor["address"]
+        migration_service.normalize_doctor(updated_doctor)
         
         return Doctor(**updated_doctor)
         
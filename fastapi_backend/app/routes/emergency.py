@@ -1,23 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
+from fastapi.websockets import WebSocketState
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional, Dict
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime
 import uuid
+import asyncio
 from ..core.database import get_database
 from ..models.emergency import (
     Ambulance, AmbulanceCreate, AmbulanceUpdate,
     EmergencyRequest, EmergencyRequestCreate, EmergencyRequestUpdate, EmergencyStatus,
-    EmergencyContact, EmergencyContactCreate, EmergencyContactUpdate
+    TERMINAL_EMERGENCY_STATUSES,
+    EmergencyContact, EmergencyContactCreate, EmergencyContactUpdate,
+    LocationBatch
 )
-from ..models.user import UserInDB
-from ..utils.auth import get_current_active_user, get_current_admin_user
+from ..models.user import UserInDB, Principal
+from ..utils.auth import get_current_active_user, get_current_active_principal, get_current_admin_principal
 from ..services.email_service import email_service
+from ..services.dispatch_service import dispatch_service, dispatch_queue
+from ..services.tracking_service import ambulance_tracker
+from ..services.rollup_service import rollup_service
+from ..services.token_service import token_service
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Status values accepted by the status update endpoint
+EMERGENCY_STATUSES = [value for name, value in vars(EmergencyStatus).items() if name.isupper()]
+
 # Emergency Request endpoints
 @router.post("/request", response_model=EmergencyRequest)
 async def create_emergency_request(
@@ -29,29 +40,37 @@ async def create_emergency_request(
     # Generate unique request number
     request_number = f"ER{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
     
-    # Find nearest available ambulance
-    ambulance = await db.ambulances.find_one({
-        "is_available": True
-    })
-    
     request_dict = request_data.dict()
+    request_dict["_id"] = ObjectId()
     request_dict["user_id"] = current_user.id
     request_dict["request_number"] = request_number
+    request_dict["created_at"] = datetime.utcnow()
+    
+    # Atomically claim the nearest available ambulance
+    ambulance, distance_km, estimated_time = await dispatch_service.claim_nearest(
+        db, request_data.location, request_id=request_dict["_id"]
+    )
     
     if ambulance:
         request_dict["ambulance_id"] = ambulance["_id"]
-        # Set estimated arrival (15-30 minutes from now)
-        estimated_time = datetime.utcnow() + timedelta(minutes=20)
+        request_dict["status"] = EmergencyStatus.DISPATCHED
         request_dict["estimated_arrival"] = estimated_time
-        
-        # Mark ambulance as unavailable
-        await db.ambulances.update_one(
-            {"_id": ambulance["_id"]},
-            {"$set": {"is_available": False}}
-        )
+        request_dict["dispatch_distance_km"] = distance_km
     
-    result = await db.emergency_requests.insert_one(request_dict)
+    try:
+        result = await db.emergency_requests.insert_one(request_dict)
+    except Exception:
+        # Hand the claimed ambulance back rather than leave it tied to a request that does not exist
+        if ambulance:
+            await dispatch_service.release(db, ambulance["_id"], request_dict["_id"])
+            dispatch_queue.notify()
+        raise
     created_request = await db.emergency_requests.find_one({"_id": result.inserted_id})
+    await rollup_service.record_emergency(db, created_request)
+    
+    if not ambulance:
+        # Wait in the severity queue until a unit frees up
+        dispatch_queue.enqueue(created_request)
     
     # Send emergency notification (in production, use SMS/push notifications)
     try:
@@ -78,7 +97,7 @@ async def create_emergency_request(
 
 @router.get("/requests", response_model=List[EmergencyRequest])
 async def get_user_emergency_requests(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100)
@@ -97,7 +116,7 @@ async def get_user_emergency_requests(
 @router.get("/requests/{request_id}", response_model=EmergencyRequest)
 async def get_emergency_request(
     request_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get a specific emergency request"""
@@ -118,14 +137,14 @@ async def get_emergency_request(
 async def update_emergency_status(
     request_id: str,
     status: str,
-    current_user: UserInDB = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Update emergency request status (Admin only)"""
     if not ObjectId.is_valid(request_id):
         raise HTTPException(status_code=400, detail="Invalid request ID")
     
-    if status not in [s for s in dir(EmergencyStatus) if not s.startswith('_')]:
+    if status not in EMERGENCY_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid status")
     
     update_data = {
@@ -135,29 +154,32 @@ async def update_emergency_status(
     
     if status == EmergencyStatus.COMPLETED:
         update_data["completed_at"] = datetime.utcnow()
-        
-        # Mark ambulance as available again
-        request = await db.emergency_requests.find_one({"_id": ObjectId(request_id)})
-        if request and request.get("ambulance_id"):
-            await db.ambulances.update_one(
-                {"_id": request["ambulance_id"]},
-                {"$set": {"is_available": True}}
-            )
-    
-    result = await db.emergency_requests.update_one(
+    
+    request = await db.emergency_requests.find_one_and_update(
         {"_id": ObjectId(request_id)},
         {"$set": update_data}
     )
     
-    if result.matched_count == 0:
+    if request is None:
         raise HTTPException(status_code=404, detail="Emergency request not found")
     
+    # Re-setting a finished request must not free an ambulance that has moved on
+    if status in TERMINAL_EMERGENCY_STATUSES and request.get("status") not in TERMINAL_EMERGENCY_STATUSES:
+        dispatch_queue.discard(request["_id"])
+        # Stop sharing the ambulance's position before it can serve someone else
+        await ambulance_tracker.end_request(request["_id"], status)
+        # Mark ambulance as available again and hand it to the next waiting request
+        if request.get("ambulance_id") and await dispatch_service.release(
+            db, request["ambulance_id"], request["_id"]
+        ):
+            dispatch_queue.notify()
+    
     return {"message": "Status updated successfully"}
 
 # Emergency Contact endpoints
 @router.get("/contacts", response_model=List[EmergencyContact])
 async def get_emergency_contacts(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get user's emergency contacts"""
@@ -175,7 +197,7 @@ async def get_emergency_contacts(
 @router.post("/contacts", response_model=EmergencyContact)
 async def create_emergency_contact(
     contact_data: EmergencyContactCreate,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Create a new emergency contact"""
@@ -198,7 +220,7 @@ async def create_emergency_contact(
 async def update_emergency_contact(
     contact_id: str,
     contact_data: EmergencyContactUpdate,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Update an emergency contact"""
@@ -232,7 +254,7 @@ async def update_emergency_contact(
 @router.delete("/contacts/{contact_id}")
 async def delete_emergency_contact(
     contact_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Delete an emergency contact"""
@@ -255,7 +277,7 @@ async def delete_emergency_contact(
 # Ambulance endpoints (Admin only)
 @router.get("/ambulances", response_model=List[Ambulance])
 async def get_ambulances(
-    current_user: UserInDB = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database),
     is_available: Optional[bool] = None
 ):
@@ -274,11 +296,12 @@ async def get_ambulances(
 @router.post("/ambulances", response_model=Ambulance)
 async def create_ambulance(
     ambulance_data: AmbulanceCreate,
-    current_user: UserInDB = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Create a new ambulance (Admin only)"""
     ambulance_dict = ambulance_data.dict()
+    ambulance_dict.update(dispatch_service.location_fields(ambulance_dict.get("current_location")))
     
     result = await db.ambulances.insert_one(ambulance_dict)
     created_ambulance = await db.ambulances.find_one({"_id": result.inserted_id})
@@ -289,7 +312,7 @@ async def create_ambulance(
 async def update_ambulance(
     ambulance_id: str,
     ambulance_data: AmbulanceUpdate,
-    current_user: UserInDB = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Update an ambulance (Admin only)"""
@@ -297,6 +320,7 @@ async def update_ambulance(
         raise HTTPException(status_code=400, detail="Invalid ambulance ID")
     
     update_data = {k: v for k, v in ambulance_data.dict().items() if v is not None}
+    update_data.update(dispatch_service.location_fields(update_data.get("current_location")))
     update_data["updated_at"] = datetime.utcnow()
     
     result = await db.ambulances.update_one(
@@ -307,13 +331,43 @@ async def update_ambulance(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Ambulance not found")
     
+    ambulance_tracker.forget_ambulance(ObjectId(ambulance_id))
+    if update_data.get("is_available"):
+        dispatch_queue.notify()
     updated_ambulance = await db.ambulances.find_one({"_id": ObjectId(ambulance_id)})
     return Ambulance(**updated_ambulance)
 
+@router.get("/dispatch/metrics")
+async def get_dispatch_metrics(
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """Get dispatch queue depth and wait-time metrics (Admin only)"""
+    return dispatch_queue.metrics()
+
+@router.post("/ambulances/{ambulance_id}/locations")
+async def ingest_ambulance_locations(
+    ambulance_id: str,
+    batch: LocationBatch,
+    current_user: Principal = Depends(get_current_admin_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Ingest a batch of GPS points from an ambulance"""
+    if not ObjectId.is_valid(ambulance_id):
+        raise HTTPException(status_code=400, detail="Invalid ambulance ID")
+    
+    latest = await ambulance_tracker.ingest(
+        db, ObjectId(ambulance_id), [point.dict() for point in batch.points]
+    )
+    
+    return {
+        "accepted": len(batch.points),
+        "latest": {"lat": latest["lat"], "lng": latest["lng"], "recorded_at": latest["recorded_at"]}
+    }
+
 @router.get("/ambulances/track/{request_id}")
 async def track_ambulance(
     request_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Track ambulance for emergency request"""
@@ -335,8 +389,8 @@ async def track_ambulance(
             "message": "No ambulance assigned yet"
         }
     
-    # Get ambulance details
-    ambulance = await db.ambulances.find_one({"_id": request["ambulance_id"]})
+    # Static details are served from memory after the first poll, the position while fresh
+    ambulance = await ambulance_tracker.ambulance_info(db, request["ambulance_id"])
     
     if not ambulance:
         return {
@@ -344,13 +398,16 @@ async def track_ambulance(
             "message": "Ambulance details not available"
         }
     
+    position = await ambulance_tracker.latest(db, request["ambulance_id"]) or {}
+    
     return {
         "status": request["status"],
         "ambulance": {
             "vehicle_number": ambulance["vehicle_number"],
             "driver_name": ambulance["driver_name"],
             "driver_phone": ambulance["driver_phone"],
-            "current_location": ambulance.get("current_location", {}),
+            "current_location": {"lat": position.get("lat"), "lng": position.get("lng")} if position else {},
+            "location_updated_at": position.get("recorded_at"),
             "estimated_arrival": request.get("estimated_arrival")
         },
         "request_details": {
@@ -359,4 +416,42 @@ async def track_ambulance(
             "created_at": request["created_at"],
             "status": request["status"]
         }
-    }
\ No newline at end of file
+    }
+
+@router.websocket("/requests/{request_id}/ws")
+async def track_ambulance_ws(
+    websocket: WebSocket,
+    request_id: str,
+    token: str = Query(...),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """WebSocket pushing the assigned ambulance's position as it moves"""
+    claims = await token_service.authenticate(db, token)
+    user_id = claims["sub"] if claims else None
+    if user_id is None or not ObjectId.is_valid(user_id) or not ObjectId.is_valid(request_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    request = await db.emergency_requests.find_one(
+        {"_id": ObjectId(request_id), "user_id": ObjectId(user_id)},
+        {"ambulance_id": 1, "status": 1}
+    )
+    if not request or not request.get("ambulance_id") or request.get("status") in TERMINAL_EMERGENCY_STATUSES:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    ambulance_id = request["ambulance_id"]
+    await websocket.accept()
+    await ambulance_tracker.subscribe(db, request["_id"], ambulance_id, websocket)
+    # Polls for positions ingested by other workers and closes the socket when the request ends
+    watcher = asyncio.create_task(ambulance_tracker.watch(db, request["_id"], ambulance_id, websocket))
+    try:
+        # Runs until the client leaves or the tracker closes the socket
+        while websocket.application_state == WebSocketState.CONNECTED:
+            # Clients only listen; reading keeps the connection open and detects disconnects
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        ambulance_tracker.unsubscribe(request["_id"], websocket)
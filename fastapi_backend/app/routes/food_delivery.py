@@ -2,46 +2,84 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional
 from bson import ObjectId
-from datetime import datetime
-import uuid
 from ..core.database import get_database
 from ..models.food_delivery import (
-    Restaurant, RestaurantCreate, RestaurantUpdate,
+    Restaurant, RestaurantSummary, RestaurantCreate, RestaurantUpdate,
     FoodCategory, MenuItem, MenuItemCreate, MenuItemUpdate,
-    FoodCart, FoodCartItemBase, FoodOrder, FoodOrderCreate, FoodOrderStatus
+    FoodCart, FoodCartItemBase, FoodOrder, FoodCheckoutRequest, FoodOrderStatus
 )
-from ..models.user import UserInDB
-from ..utils.auth import get_current_active_user, get_current_admin_user
+from ..models.user import Principal
+from ..utils.auth import get_current_active_principal, get_current_admin_principal
 from ..services.azure_storage import azure_storage
+from ..utils.geo import geo_point
+from ..utils.projection import select_fields
+from ..core.responses import FastJSONResponse
+from ..services.cart_service import food_cart_engine, CartConflictError
+from ..services.checkout_service import food_checkout_service, CheckoutError
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # Restaurant endpoints
-@router.get("/restaurants", response_model=List[Restaurant])
+@router.get("/restaurants", response_model=None, responses={200: {"model": List[RestaurantSummary]}})
 async def get_restaurants(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     cuisine_type: Optional[str] = None,
     city: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(10.0, gt=0, le=50),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of the summary"),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get list of restaurants"""
+    """Get list of restaurants, nearest first when a location is given"""
+    if (lat is None) != (lng is None):
+        raise HTTPException(status_code=400, detail="lat and lng must be provided together")
+    
+    response_model, projection = select_fields(
+        Restaurant, RestaurantSummary, fields, {"distance_km": ["distance_m"]}
+    )
+    projection.pop("distance_km", None)  # computed, not stored
+    
     query = {"is_active": True}
     
     if cuisine_type:
         query["cuisine_type"] = {"$in": [cuisine_type]}
     
+    if min_rating is not None:
+        query["rating"] = {"$gte": min_rating}
+    
     if city:
         query["city"] = {"$regex": city, "$options": "i"}
     
-    cursor = db.restaurants.find(query).skip(skip).limit(limit)
+    if lat is not None:
+        # Bounded 2dsphere index scan around the user, ordered by distance
+        pipeline = [
+            {"$geoNear": {
+                "near": geo_point(lat, lng),
+                "distanceField": "distance_m",
+                "maxDistance": radius_km * 1000,
+                "query": query,
+                "spherical": True
+            }},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": projection}
+        ]
+        cursor = db.restaurants.aggregate(pipeline)
+    else:
+        cursor = db.restaurants.find(query, projection).sort("rating", -1).skip(skip).limit(limit)
+    
     restaurants = []
     async for restaurant in cursor:
-        restaurants.append(Restaurant(**restaurant))
+        if "distance_m" in restaurant:
+            restaurant["distance_km"] = round(restaurant.pop("distance_m") / 1000, 2)
+        restaurants.append(response_model(**restaurant))
     
-    return restaurants
+    return FastJSONResponse(restaurants)
 
 @router.get("/restaurants/{restaurant_id}", response_model=Restaurant)
 async def get_restaurant(
@@ -62,7 +100,7 @@ async def get_restaurant(
 async def create_restaurant(
     restaurant_data: RestaurantCreate,
     db: AsyncIOMotorDatabase = Depends(get_database),
-    current_user: UserInDB = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Create a new restaurant (Admin only)"""
     restaurant_dict = restaurant_data.dict()
@@ -77,7 +115,7 @@ async def update_restaurant(
     restaurant_id: str,
     restaurant_data: RestaurantUpdate,
     db: AsyncIOMotorDatabase = Depends(get_database),
-    current_user: UserInDB = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Update a restaurant (Admin only)"""
     if not ObjectId.is_valid(restaurant_id):
@@ -131,7 +169,7 @@ async def create_menu_item(
     restaurant_id: str,
     menu_item_data: MenuItemCreate,
     db: AsyncIOMotorDatabase = Depends(get_database),
-    current_user: UserInDB = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Create a new menu item (Admin only)"""
     if not ObjectId.is_valid(restaurant_id):
@@ -166,33 +204,25 @@ async def get_food_categories(
 # Cart endpoints
 @router.get("/cart", response_model=FoodCart)
 async def get_food_cart(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get user's food cart"""
-    cart = await db.food_carts.find_one({"user_id": current_user.id})
-    if not cart:
-        # Create empty cart
-        cart_data = {
-            "user_id": current_user.id,
-            "restaurant_id": None,
-            "items": [],
-            "total_amount": 0.0
-        }
-        result = await db.food_carts.insert_one(cart_data)
-        cart = await db.food_carts.find_one({"_id": result.inserted_id})
-    
+    cart = await food_cart_engine.get_or_create(db, current_user.id)
     return FoodCart(**cart)
 
 @router.post("/cart/add")
 async def add_to_food_cart(
     item: FoodCartItemBase,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Add item to food cart"""
     # Verify menu item exists
-    menu_item = await db.menu_items.find_one({"_id": item.menu_item_id})
+    menu_item = await db.menu_items.find_one(
+        {"_id": item.menu_item_id},
+        {"restaurant_id": 1, "is_available": 1}
+    )
     if not menu_item:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
@@ -202,61 +232,38 @@ async def add_to_food_cart(
     restaurant_id = menu_item["restaurant_id"]
     
     # Get or create cart
-    cart = await db.food_carts.find_one({"user_id": current_user.id})
-    if not cart:
-        cart = {
-            "user_id": current_user.id,
-            "restaurant_id": restaurant_id,
-            "items": [],
-            "total_amount": 0.0
-        }
-        result = await db.food_carts.insert_one(cart)
-        cart["_id"] = result.inserted_id
-    else:
-        # Check if adding from different restaurant
-        if cart["restaurant_id"] and cart["restaurant_id"] != restaurant_id:
+    cart = await food_cart_engine.get_or_create(db, current_user.id)
+    
+    def check_restaurant(snapshot):
+        # Checked against every snapshot so a concurrent add cannot mix restaurants
+        if snapshot.get("restaurant_id") and snapshot["restaurant_id"] != restaurant_id:
             raise HTTPException(
                 status_code=400, 
                 detail="Cannot add items from different restaurants. Clear cart first."
             )
-        cart["restaurant_id"] = restaurant_id
-    
-    # Check if item already in cart
-    item_exists = False
-    for cart_item in cart["items"]:
-        if cart_item["menu_item_id"] == item.menu_item_id:
-            cart_item["quantity"] += item.quantity
-            if item.special_instructions:
-                cart_item["special_instructions"] = item.special_instructions
-            item_exists = True
-            break
-    
-    if not item_exists:
-        cart["items"].append(item.dict())
-    
-    # Calculate total
-    total_amount = 0.0
-    for cart_item in cart["items"]:
-        menu_item = await db.menu_items.find_one({"_id": cart_item["menu_item_id"]})
-        if menu_item:
-            total_amount += menu_item["price"] * cart_item["quantity"]
-    
-    # Update cart
-    await db.food_carts.update_one(
-        {"_id": cart["_id"]},
-        {"$set": {
-            "restaurant_id": restaurant_id,
-            "items": cart["items"], 
-            "total_amount": total_amount
-        }}
-    )
+    
+    merge_fields = {}
+    if item.special_instructions:
+        merge_fields["special_instructions"] = item.special_instructions
+    
+    try:
+        await food_cart_engine.add_item(
+            db,
+            cart,
+            item.dict(),
+            cart_fields={"restaurant_id": restaurant_id},
+            merge_fields=merge_fields,
+            validate=check_restaurant
+        )
+    except CartConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
     return {"message": "Item added to cart successfully"}
 
 @router.delete("/cart/remove/{menu_item_id}")
 async def remove_from_food_cart(
     menu_item_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Remove item from food cart"""
@@ -267,91 +274,44 @@ async def remove_from_food_cart(
     if not cart:
         raise HTTPException(status_code=404, detail="Cart not found")
     
-    # Remove item from cart
-    cart["items"] = [item for item in cart["items"] if str(item["menu_item_id"]) != menu_item_id]
-    
-    # Recalculate total
-    total_amount = 0.0
-    for cart_item in cart["items"]:
-        menu_item = await db.menu_items.find_one({"_id": cart_item["menu_item_id"]})
-        if menu_item:
-            total_amount += menu_item["price"] * cart_item["quantity"]
-    
-    # Clear restaurant_id if cart is empty
-    restaurant_id = cart["restaurant_id"] if cart["items"] else None
-    
-    await db.food_carts.update_one(
-        {"_id": cart["_id"]},
-        {"$set": {
-            "restaurant_id": restaurant_id,
-            "items": cart["items"], 
-            "total_amount": total_amount
-        }}
-    )
+    # Clears restaurant_id once the last item is gone
+    try:
+        await food_cart_engine.remove_item(db, cart, ObjectId(menu_item_id))
+    except CartConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
     return {"message": "Item removed from cart successfully"}
 
 @router.delete("/cart/clear")
 async def clear_food_cart(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Clear user's food cart"""
-    await db.food_carts.update_one(
-        {"user_id": current_user.id},
-        {"$set": {
-            "restaurant_id": None,
-            "items": [], 
-            "total_amount": 0.0
-        }}
-    )
+    await food_cart_engine.clear(db, current_user.id)
     
     return {"message": "Cart cleared successfully"}
 
 # Order endpoints
 @router.post("/orders", response_model=FoodOrder)
 async def create_food_order(
-    order_data: FoodOrderCreate,
-    current_user: UserInDB = Depends(get_current_active_user),
+    order_data: FoodCheckoutRequest,
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Create a new food order"""
-    # Verify cart has items
-    cart = await db.food_carts.find_one({"user_id": current_user.id})
-    if not cart or not cart.get("items"):
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    # Generate order number
-    order_number = f"FO{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
-    
-    # Create order
-    order_dict = order_data.dict()
-    order_dict["order_number"] = order_number
-    order_dict["user_id"] = current_user.id
-    
-    # Set estimated delivery time (30-45 minutes from now)
-    estimated_time = datetime.utcnow()
-    estimated_time = estimated_time.replace(minute=estimated_time.minute + 35)
-    order_dict["estimated_delivery_time"] = estimated_time
-    
-    result = await db.food_orders.insert_one(order_dict)
-    
-    # Clear cart after order
-    await db.food_carts.update_one(
-        {"user_id": current_user.id},
-        {"$set": {
-            "restaurant_id": None,
-            "items": [], 
-            "total_amount": 0.0
-        }}
-    )
-    
-    created_order = await db.food_orders.find_one({"_id": result.inserted_id})
-    return FoodOrder(**created_order)
+    """Create a new food order from the user's cart"""
+    # Items and prices are snapshotted from the cart and menu, and the cart is
+    # cleared, in one transaction
+    try:
+        order = await food_checkout_service.checkout(db, current_user.id, order_data.dict())
+    except CheckoutError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    
+    return FoodOrder(**order)
 
 @router.get("/orders", response_model=List[FoodOrder])
 async def get_user_food_orders(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get user's food orders"""
@@ -365,7 +325,7 @@ async def get_user_food_orders(
 @router.get("/orders/{order_id}", response_model=FoodOrder)
 async def get_food_order(
     order_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get a specific food order"""
@@ -1,50 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Header
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument
 from ..core.database import get_database
-from ..models.medicine import Medicine, MedicineCreate, MedicineUpdate, Cart, CartItemBase
-from ..models.user import UserInDB
-from ..utils.auth import get_current_active_user, get_current_admin_user
+from ..models.medicine import Medicine, MedicineSummary, MedicineCreate, MedicineUpdate, RestockRequest, Cart, CartItemBase
+from ..models.orders import Order, MedicineCheckoutRequest
+from ..models.user import Principal
+from ..utils.auth import get_current_active_principal, get_current_admin_principal
+from ..utils.projection import select_fields
+from ..core.responses import FastJSONResponse
+from ..services.image_service import image_service
 from ..services.azure_storage import azure_storage
+from ..services.search_service import medicine_search_index
+from ..services.suggest_service import suggestion_index
+from ..services.cart_service import medicine_cart_engine, CartConflictError
+from ..services.checkout_service import medicine_checkout_service, CheckoutError
+from ..services.inventory_service import inventory_service, InventoryEventReason
+from ..services.migration_service import migration_service
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/", response_model=List[Medicine])
+@router.get("/", response_model=None, responses={200: {"model": List[MedicineSummary]}})
 async def get_medicines(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     category: Optional[str] = None,
     search: Optional[str] = None,
+    image_size: str = Query("small", pattern="^(thumbnail|small|medium|original)$"),
+    image_format: Optional[str] = Query(None, pattern="^(webp|avif)$", description="Defaults to AVIF when Accept lists image/avif"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of the summary"),
+    accept: Optional[str] = Header(None),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get list of medicines with optional filtering"""
+    response_model, projection = select_fields(
+        Medicine, MedicineSummary, fields, {"image_url": ["image_variants"]}
+    )
     query = {"is_active": True}
     
     if category:
         query["category"] = category
     
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-            {"brand": {"$regex": search, "$options": "i"}}
-        ]
+        # Rank matches from the in-memory index, then fetch only the requested page
+        await medicine_search_index.ensure_fresh(db)
+        ranked_ids = medicine_search_index.search(search, category=category)
+        page_ids = [ObjectId(medicine_id) for medicine_id in ranked_ids[skip:skip + limit]]
+        query["_id"] = {"$in": page_ids}
+        
+        documents = {doc["_id"]: doc async for doc in db.medicines.find(query, projection)}
+        results = [documents[medicine_id] for medicine_id in page_ids if medicine_id in documents]
+    else:
+        results = await db.medicines.find(query, projection).skip(skip).limit(limit).to_list(None)
     
-    cursor = db.medicines.find(query).skip(skip).limit(limit)
     medicines = []
-    async for medicine in cursor:
-        # Handle missing timestamp fields for backward compatibility
-        if "created_at" not in medicine:
-            medicine["created_at"] = datetime.utcnow()
-        if "updated_at" not in medicine:
-            medicine["updated_at"] = datetime.utcnow()
-        medicines.append(Medicine(**medicine))
-    
-    return medicines
+    prefer_avif = image_format == "avif" if image_format else image_service.accepts_avif(accept)
+    for medicine in results:
+        # Serve a size-appropriate variant instead of the full-resolution photo
+        if "image_url" in projection:
+            medicine["image_url"] = image_service.select_url(
+                medicine.get("image_variants"), image_size, medicine.get("image_url"), prefer_avif=prefer_avif
+            )
+        medicines.append(response_model(**medicine))
+    
+    # Image URLs depend on the Accept header; keep shared caches from mixing them up
+    return FastJSONResponse(medicines, headers={"Vary": "Accept"})
 
 @router.get("/{medicine_id}", response_model=Medicine)
 async def get_medicine(
@@ -65,18 +89,22 @@ async def get_medicine(
 async def create_medicine(
     medicine_data: MedicineCreate,
     db: AsyncIOMotorDatabase = Depends(get_database),
-    current_user: UserInDB = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Create a new medicine (Admin only)"""
     medicine_dict = medicine_data.dict()
     medicine_dict["created_at"] = datetime.utcnow()
     medicine_dict["updated_at"] = datetime.utcnow()
     
+    migration_service.with_schema_version("medicines", medicine_dict)
     result = await db.medicines.insert_one(medicine_dict)
     created_medicine = await db.medicines.find_one({"_id": result.inserted_id})
     # Ensure the timestamps are included for the Pydantic model
     created_medicine["created_at"] = medicine_dict["created_at"]
     created_medicine["updated_at"] = medicine_dict["updated_at"]
+    medicine_search_index.upsert(created_medicine)
+    suggestion_index.index_medicine(created_medicine)
+    await inventory_service.track_new(db, created_medicine, actor_id=current_user.id)
     
     return Medicine(**created_medicine)
 
@@ -85,7 +113,7 @@ async def update_medicine(
     medicine_id: str,
     medicine_data: MedicineUpdate,
     db: AsyncIOMotorDatabase = Depends(get_database),
-    current_user: UserInDB = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Update a medicine (Admin only)"""
     if not ObjectId.is_valid(medicine_id):
@@ -96,22 +124,36 @@ async def update_medicine(
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
     
-    result = await db.medicines.update_one(
+    if "stock_quantity" in update_data and "in_stock" not in update_data:
+        update_data["in_stock"] = update_data["stock_quantity"] > 0
+    
+    # Keep the previous document so a stock change can be logged as a movement
+    previous_medicine = await db.medicines.find_one_and_update(
         {"_id": ObjectId(medicine_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous_medicine is None:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
     updated_medicine = await db.medicines.find_one({"_id": ObjectId(medicine_id)})
+    
+    # Stock and is_active are set directly here; recompute the inventory counter from the result
+    if "stock_quantity" in update_data or "is_active" in update_data:
+        await inventory_service.record_adjustment(
+            db, previous_medicine, updated_medicine, actor_id=current_user.id
+        )
+    
+    medicine_search_index.upsert(updated_medicine)
+    suggestion_index.index_medicine(updated_medicine)
     return Medicine(**updated_medicine)
 
 @router.delete("/{medicine_id}")
 async def delete_medicine(
     medicine_id: str,
     db: AsyncIOMotorDatabase = Depends(get_database),
-    current_user: UserInDB = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Delete a medicine (Admin only)"""
     if not ObjectId.is_valid(medicine_id):
@@ -125,14 +167,51 @@ async def delete_medicine(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
+    medicine_search_index.remove(medicine_id)
+    suggestion_index.remove_medicine(medicine_id)
+    await inventory_service.forget(db, ObjectId(medicine_id))
     return {"message": "Medicine deleted successfully"}
 
+@router.post("/{medicine_id}/restock", response_model=Medicine)
+async def restock_medicine(
+    medicine_id: str,
+    restock: RestockRequest,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """Add received units to a medicine's stock (Admin only)"""
+    if not ObjectId.is_valid(medicine_id):
+        raise HTTPException(status_code=400, detail="Invalid medicine ID")
+    
+    previous_medicine = await db.medicines.find_one_and_update(
+        {"_id": ObjectId(medicine_id), "is_active": True},
+        {
+            "$inc": {"stock_quantity": restock.quantity},
+            "$set": {"in_stock": True, "updated_at": datetime.utcnow()}
+        },
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous_medicine is None:
+        raise HTTPException(status_code=404, detail="Medicine not found")
+    
+    stock_before = previous_medicine.get("stock_quantity") or 0
+    await inventory_service.record_change(
+        db,
+        previous_medicine,
+        stock_before + restock.quantity,
+        reason=InventoryEventReason.RESTOCK,
+        actor_id=current_user.id
+    )
+    
+    updated_medicine = await db.medicines.find_one({"_id": ObjectId(medicine_id)})
+    return Medicine(**updated_medicine)
+
 @router.post("/upload-image/{medicine_id}")
 async def upload_medicine_image(
     medicine_id: str,
     file: UploadFile = File(...),
     db: AsyncIOMotorDatabase = Depends(get_database),
-    current_user: UserInDB = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Upload medicine image"""
     if not ObjectId.is_valid(medicine_id):
@@ -148,23 +227,38 @@ async def upload_medicine_image(
         raise HTTPException(status_code=400, detail="File must be an image")
     
     try:
-        # Upload to Azure Storage
+        # Generate resized, EXIF-stripped variants and upload them all
         file_content = await file.read()
-        image_url = await azure_storage.upload_file(
-            file_content=file_content,
+        image_variants = await image_service.upload_variants(
+            content=file_content,
             file_name=file.filename,
-            content_type=file.content_type,
             folder="medicines"
         )
+        image_url = image_variants["original"]
         
-        # Update medicine with image URL
-        await db.medicines.update_one(
+        # Update medicine with image URLs
+        previous = await db.medicines.find_one_and_update(
             {"_id": ObjectId(medicine_id)},
-            {"$set": {"image_url": image_url}}
+            {"$set": {"image_url": image_url, "image_variants": image_variants}},
+            projection={"image_url": 1, "image_variants": 1},
+            return_document=ReturnDocument.BEFORE
         )
         
-        return {"message": "Image uploaded successfully", "image_url": image_url}
+        # Drop the references held by the replaced image; its original is one of its variants
+        if previous:
+            old_variants = previous.get("image_variants")
+            await azure_storage.release_urls(
+                old_variants.values() if old_variants else [previous.get("image_url")]
+            )
         
+        return {
+            "message": "Image uploaded successfully",
+            "image_url": image_url,
+            "image_variants": image_variants
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error uploading image: {e}")
         raise HTTPException(status_code=500, detail="Failed to upload image")
@@ -172,79 +266,41 @@ async def upload_medicine_image(
 # Cart endpoints
 @router.get("/cart/", response_model=Cart)
 async def get_cart(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get user's cart"""
-    cart = await db.carts.find_one({"user_id": current_user.id})
-    if not cart:
-        # Create empty cart
-        cart_data = {
-            "user_id": current_user.id,
-            "items": [],
-            "total_amount": 0.0
-        }
-        result = await db.carts.insert_one(cart_data)
-        cart = await db.carts.find_one({"_id": result.inserted_id})
-    
+    cart = await medicine_cart_engine.get_or_create(db, current_user.id)
     return Cart(**cart)
 
 @router.post("/cart/add")
 async def add_to_cart(
     item: CartItemBase,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Add item to cart"""
     # Verify medicine exists and is in stock
-    medicine = await db.medicines.find_one({"_id": item.medicine_id})
+    medicine = await db.medicines.find_one({"_id": item.medicine_id}, {"in_stock": 1})
     if not medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
     if not medicine.get("in_stock", False):
         raise HTTPException(status_code=400, detail="Medicine out of stock")
     
-    # Get or create cart
-    cart = await db.carts.find_one({"user_id": current_user.id})
-    if not cart:
-        cart = {
-            "user_id": current_user.id,
-            "items": [],
-            "total_amount": 0.0
-        }
-        result = await db.carts.insert_one(cart)
-        cart["_id"] = result.inserted_id
-    
-    # Check if item already in cart
-    item_exists = False
-    for cart_item in cart["items"]:
-        if cart_item["medicine_id"] == item.medicine_id:
-            cart_item["quantity"] += item.quantity
-            item_exists = True
-            break
-    
-    if not item_exists:
-        cart["items"].append(item.dict())
-    
-    # Calculate total
-    total_amount = 0.0
-    for cart_item in cart["items"]:
-        med = await db.medicines.find_one({"_id": cart_item["medicine_id"]})
-        if med:
-            total_amount += med["price"] * cart_item["quantity"]
-    
-    # Update cart
-    await db.carts.update_one(
-        {"_id": cart["_id"]},
-        {"$set": {"items": cart["items"], "total_amount": total_amount}}
-    )
+    # Get or create cart, then merge the item and reprice in one pass
+    cart = await medicine_cart_engine.get_or_create(db, current_user.id)
+    try:
+        await medicine_cart_engine.add_item(db, cart, item.dict())
+    except CartConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
     return {"message": "Item added to cart successfully"}
 
 @router.delete("/cart/remove/{medicine_id}")
 async def remove_from_cart(
     medicine_id: str,
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Remove item from cart"""
@@ -255,32 +311,35 @@ async def remove_from_cart(
     if not cart:
         raise HTTPException(status_code=404, detail="Cart not found")
     
-    # Remove item from cart
-    cart["items"] = [item for item in cart["items"] if str(item["medicine_id"]) != medicine_id]
-    
-    # Recalculate total
-    total_amount = 0.0
-    for cart_item in cart["items"]:
-        med = await db.medicines.find_one({"_id": cart_item["medicine_id"]})
-        if med:
-            total_amount += med["price"] * cart_item["quantity"]
-    
-    await db.carts.update_one(
-        {"_id": cart["_id"]},
-        {"$set": {"items": cart["items"], "total_amount": total_amount}}
-    )
+    try:
+        await medicine_cart_engine.remove_item(db, cart, ObjectId(medicine_id))
+    except CartConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
     return {"message": "Item removed from cart successfully"}
 
 @router.delete("/cart/clear")
 async def clear_cart(
-    current_user: UserInDB = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Clear user's cart"""
-    await db.carts.update_one(
-        {"user_id": current_user.id},
-        {"$set": {"items": [], "total_amount": 0.0}}
-    )
+    await medicine_cart_engine.clear(db, current_user.id)
+    
+    return {"message": "Cart cleared successfully"}
+
+@router.post("/checkout", response_model=Order)
+async def checkout(
+    checkout_data: MedicineCheckoutRequest,
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Place an order for everything in the user's cart"""
+    # Stock is reserved, the order and its items written, and the cart cleared
+    # in one transaction
+    try:
+        order = await medicine_checkout_service.checkout(db, current_user.id, checkout_data.dict())
+    except CheckoutError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     
-    return {"message": "Cart cleared successfully"}
\ No newline at end of file
+    return Order(**order)
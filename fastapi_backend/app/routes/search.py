@@ -0,0 +1,43 @@
+"""
+Search Routes for WeCure
+Serves search-as-you-type suggestions for medicines and doctors
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Optional
+
+from ..core.database import get_database
+from ..services.suggest_service import suggestion_index, SUGGESTION_KINDS
+
+router = APIRouter()
+
+@router.get("/suggest")
+async def get_suggestions(
+    q: str = Query(..., min_length=1, max_length=100, description="Text typed so far"),
+    limit: int = Query(10, ge=1, le=25),
+    types: Optional[str] = Query(
+        None,
+        description=f"Comma-separated suggestion types: {', '.join(SUGGESTION_KINDS)}"
+    ),
+    fuzzy: bool = Query(True, description="Allow typo-tolerant matches"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Suggest medicines, brands, compositions, doctors and specializations"""
+    await suggestion_index.ensure_fresh(db)
+    
+    kinds = None
+    if types:
+        requested = {kind.strip() for kind in types.split(",") if kind.strip()}
+        unknown = requested - set(SUGGESTION_KINDS)
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown suggestion types: {', '.join(sorted(unknown)) or types}"
+            )
+        kinds = requested
+    
+    return {
+        "query": q,
+        "suggestions": suggestion_index.suggest(q, limit=limit, kinds=kinds, fuzzy=fuzzy)
+    }
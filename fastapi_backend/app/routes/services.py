@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
 from ..core.database import get_database
 from ..models.general import Service, ServiceCreate, ServiceUpdate
-from ..models.user import UserInDB
-from ..utils.auth import get_current_admin_user
+from ..models.user import Principal
+from ..utils.auth import get_current_admin_principal
 from ..services.azure_storage import azure_storage
 import logging
 
@@ -95,7 +96,7 @@ async def get_service(
 @router.post("/", response_model=Service)
 async def create_service(
     service_data: ServiceCreate,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Create a new service (Admin only)"""
@@ -110,7 +111,7 @@ async def create_service(
 async def update_service(
     service_id: str,
     service_data: ServiceUpdate,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Update a service (Admin only)"""
@@ -136,7 +137,7 @@ async def update_service(
 @router.delete("/{service_id}")
 async def delete_service(
     service_id: str,
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Delete a service (Admin only)"""
@@ -157,7 +158,7 @@ async def delete_service(
 async def upload_service_image(
     service_id: str,
     file: UploadFile = File(...),
-    current_admin: UserInDB = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_principal),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Upload service image"""
@@ -184,11 +185,17 @@ async def upload_service_image(
         )
         
         # Update service with image URL
-        await db.services.update_one(
+        previous = await db.services.find_one_and_update(
             {"_id": ObjectId(service_id)},
-            {"$set": {"image_url": image_url}}
+            {"$set": {"image_url": image_url}},
+            projection={"image_url": 1},
+            return_document=ReturnDocument.BEFORE
         )
         
+        # Drop the reference held by the replaced image
+        if previous:
+            await azure_storage.release_urls([previous.get("image_url")])
+        
         return {"message": "Image uploaded successfully", "image_url": image_url}
         
     except Exception as e:
@@ -0,0 +1,112 @@
+"""
+Admin Search Service
+Indexed search over users, doctors and orders: each document carries a
+``search_keys`` array of lower-cased token prefixes (edge n-grams) maintained on
+write, and exact identifiers are matched through their unique indexes
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from .search_service import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Longest prefix stored per token; longer query terms are truncated to match
+MAX_PREFIX_LENGTH = 24
+
+# Fields whose tokens feed search_keys, per collection
+SEARCH_FIELDS: Dict[str, List[str]] = {
+    "users": ["full_name", "name", "email", "phone"],
+    "doctors": ["full_name", "name", "email", "phone", "license_number", "specialization"],
+    "orders": ["order_number"]
+}
+
+# Fields matched exactly (as typed, or case-normalized) through a unique index
+EXACT_FIELDS: Dict[str, List[str]] = {
+    "users": ["email"],
+    "doctors": ["email", "license_number"],
+    "orders": ["order_number"]
+}
+
+
+def edge_ngrams(token: str) -> List[str]:
+    """Every prefix of a token, up to MAX_PREFIX_LENGTH characters"""
+    return [token[:length] for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1)]
+
+
+class AdminSearchService:
+    def search_keys(self, collection: str, document: Dict[str, Any]) -> List[str]:
+        """The search_keys array to store on a document"""
+        keys = set()
+        for field in SEARCH_FIELDS[collection]:
+            for token in tokenize(document.get(field)):
+                keys.update(edge_ngrams(token))
+        return sorted(keys)
+
+    def with_search_keys(self, collection: str, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Add search_keys to a document about to be inserted"""
+        document["search_keys"] = self.search_keys(collection, document)
+        return document
+
+    def needs_refresh(self, collection: str, update_fields: Dict[str, Any]) -> bool:
+        """Whether an update touches any searched field"""
+        return any(field in update_fields for field in SEARCH_FIELDS[collection])
+
+    def build_filter(self, collection: str, search: str) -> Optional[Dict[str, Any]]:
+        """
+        Mongo filter for an admin search box
+
+        Every query token must be a prefix of some token of the document. Each
+        $or branch is served by an index: exact identifiers by their unique
+        indexes, everything else by the multikey search_keys index.
+
+        Returns:
+            The filter, or None for a blank search
+        """
+        term = search.strip()
+        if not term:
+            return None
+
+        clauses = []
+        for field in EXACT_FIELDS[collection]:
+            values = list(dict.fromkeys([term, term.lower(), term.upper()]))
+            clauses.append({field: {"$in": values}})
+
+        tokens = [token[:MAX_PREFIX_LENGTH] for token in tokenize(term)]
+        if tokens:
+            clauses.append({"search_keys": {"$all": list(dict.fromkeys(tokens))}})
+        return {"$or": clauses}
+
+    async def backfill(self, db: AsyncIOMotorDatabase, batch_size: int = 1000):
+        """Add search_keys to documents written before the field existed"""
+        for collection, fields in SEARCH_FIELDS.items():
+            try:
+                cursor = db[collection].find(
+                    {"search_keys": {"$exists": False}},
+                    {field: 1 for field in fields}
+                ).batch_size(batch_size)
+                batch = []
+                updated = 0
+                async for document in cursor:
+                    batch.append(UpdateOne(
+                        {"_id": document["_id"]},
+                        {"$set": {"search_keys": self.search_keys(collection, document)}}
+                    ))
+                    if len(batch) >= batch_size:
+                        await db[collection].bulk_write(batch, ordered=False)
+                        updated += len(batch)
+                        batch = []
+                if batch:
+                    await db[collection].bulk_write(batch, ordered=False)
+                    updated += len(batch)
+                if updated:
+                    logger.info(f"Backfilled search keys on {updated} {collection}")
+            except Exception as e:
+                logger.error(f"Could not backfill search keys on {collection}: {e}")
+
+# Global admin search service instance
+admin_search_service = AdminSearchService()
@@ -0,0 +1,177 @@
+"""
+Analytics Service
+Admin dashboard metrics computed with concurrent $facet aggregations and served
+from a short-lived snapshot
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..core.config import settings
+from .inventory_service import inventory_service
+
+logger = logging.getLogger(__name__)
+
+# Collections reported by the system health check
+HEALTH_COLLECTIONS = ["users", "doctors", "appointments", "orders", "medicines"]
+
+
+def _count_stage(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"$match": match}, {"$count": "count"}]
+
+
+def _facet_count(result: Dict[str, Any], name: str) -> int:
+    bucket = result.get(name) or []
+    return bucket[0]["count"] if bucket else 0
+
+
+class AnalyticsService:
+    def __init__(self):
+        self.ttl_seconds = settings.analytics_cache_seconds
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._computed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def _facet(self, db: AsyncIOMotorDatabase, collection: str, facets: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        result = await db[collection].aggregate([{"$facet": facets}]).to_list(1)
+        return result[0] if result else {}
+
+    async def compute(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        """Compute every dashboard metric with one aggregation per collection, run concurrently"""
+        now = datetime.utcnow()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        tomorrow_start = today_start + timedelta(days=1)
+        week_start = today_start - timedelta(days=7)
+
+        users, doctors, appointments, orders, emergencies, medicines, contacts, stock_summary = await asyncio.gather(
+            self._facet(db, "users", {
+                "total": _count_stage({"is_active": True}),
+                "new_today": _count_stage({"created_at": {"$gte": today_start}}),
+                "new_this_week": _count_stage({"created_at": {"$gte": week_start}})
+            }),
+            self._facet(db, "doctors", {
+                "total": _count_stage({"is_active": True}),
+                "verified": _count_stage({"is_active": True, "is_verified": True}),
+                "pending_verification": _count_stage({"is_active": True, "is_verified": False})
+            }),
+            self._facet(db, "appointments", {
+                "total": [{"$count": "count"}],
+                # Bookings store the date as "YYYY-MM-DD"; older records used datetimes
+                "today": _count_stage({"$or": [
+                    {"appointment_date": today_start.strftime("%Y-%m-%d")},
+                    {"appointment_date": {"$gte": today_start, "$lt": tomorrow_start}}
+                ]}),
+                "pending": _count_stage({"status": "pending"})
+            }),
+            self._facet(db, "orders", {
+                "total": [{"$count": "count"}],
+                "pending": _count_stage({"status": {"$in": ["pending", "confirmed", "processing"]}}),
+                "completed": _count_stage({"status": "delivered"}),
+                "revenue": [
+                    {"$match": {"status": "delivered"}},
+                    {"$group": {"_id": None, "total": {"$sum": "$final_amount"}}}
+                ]
+            }),
+            self._facet(db, "emergency_requests", {
+                "total": [{"$count": "count"}],
+                "active": _count_stage({"status": {"$in": ["pending", "dispatched", "en_route"]}})
+            }),
+            db.medicines.count_documents({"is_active": True}),
+            db.contacts.count_documents({"status": "pending"}),
+            inventory_service.get_summary(db)
+        )
+
+        revenue = orders.get("revenue") or []
+        return {
+            "users": {
+                "total": _facet_count(users, "total"),
+                "new_today": _facet_count(users, "new_today"),
+                "new_this_week": _facet_count(users, "new_this_week")
+            },
+            "doctors": {
+                "total": _facet_count(doctors, "total"),
+                "verified": _facet_count(doctors, "verified"),
+                "pending_verification": _facet_count(doctors, "pending_verification")
+            },
+            "appointments": {
+                "total": _facet_count(appointments, "total"),
+                "today": _facet_count(appointments, "today"),
+                "pending": _facet_count(appointments, "pending")
+            },
+            "orders": {
+                "total": _facet_count(orders, "total"),
+                "pending": _facet_count(orders, "pending"),
+                "completed": _facet_count(orders, "completed"),
+                "total_revenue": revenue[0]["total"] if revenue else 0
+            },
+            "emergency": {
+                "total": _facet_count(emergencies, "total"),
+                "active": _facet_count(emergencies, "active")
+            },
+            "medicine": {
+                "total": medicines,
+                "out_of_stock": stock_summary["out_of_stock"],
+                "low_stock": stock_summary["low_stock"]
+            },
+            "support": {
+                "pending_contacts": contacts
+            },
+            "generated_at": now
+        }
+
+    async def refresh(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        """Recompute the snapshot, letting concurrent callers share one computation"""
+        async with self._lock:
+            if self._computed_at is not None and time.monotonic() - self._computed_at < 1:
+                return self._snapshot  # refreshed while we waited for the lock
+            snapshot = await self.compute(db)
+            self._snapshot = snapshot
+            self._computed_at = time.monotonic()
+            return snapshot
+
+    async def _background_refresh(self, db: AsyncIOMotorDatabase):
+        try:
+            await self.refresh(db)
+        except Exception as e:
+            logger.error(f"Background analytics refresh failed: {e}")
+
+    async def get_snapshot(self, db: AsyncIOMotorDatabase, force: bool = False) -> Dict[str, Any]:
+        """
+        Dashboard metrics from the cached snapshot
+
+        A stale snapshot is served immediately while a refresh runs in the background;
+        only the very first call (or a forced one) waits for the aggregations.
+
+        Args:
+            force: Recompute now instead of serving the cached snapshot
+        """
+        if self._snapshot is None or force:
+            return await self.refresh(db)
+
+        is_stale = time.monotonic() - self._computed_at > self.ttl_seconds
+        if is_stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._background_refresh(db))
+        return self._snapshot
+
+    async def collection_counts(self, db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, Any]]:
+        """Approximate collection sizes from metadata, fetched concurrently"""
+        counts = await asyncio.gather(
+            *[db[collection].estimated_document_count() for collection in HEALTH_COLLECTIONS],
+            return_exceptions=True
+        )
+        health = {}
+        for collection, count in zip(HEALTH_COLLECTIONS, counts):
+            if isinstance(count, Exception):
+                health[collection] = {"status": f"error: {count}"}
+            else:
+                health[collection] = {"count": count, "status": "healthy"}
+        return health
+
+# Global analytics service instance
+analytics_service = AnalyticsService()
@@ -4,13 +4,25 @@ Handles 30-minute time slots and appointment scheduling logic
 """
 
 from datetime import datetime, timedelta, time
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Set, Tuple
+import asyncio
 import logging
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 
 logger = logging.getLogger(__name__)
 
+DATE_FORMAT = "%Y-%m-%d"
+
+# Appointments that occupy a slot
+BOOKED_STATUSES = ["pending", "confirmed"]
+
+DEFAULT_DAY_AVAILABILITY = {
+    'is_available': True,
+    'start_time': '09:00',
+    'end_time': '17:00'
+}
+
 class AvailabilityService:
     def __init__(self):
         self.slot_duration = 30  # 30 minutes per slot
@@ -85,67 +97,170 @@ class AvailabilityService:
         except:
             return time_str
     
-    async def get_doctor_available_slots(
+    def get_working_slots(self, doctor: Dict[str, Any], date_obj: datetime) -> Optional[List[str]]:
+        """All slots in the doctor's working hours on a date, or None if they do not work that day"""
+        availability = doctor.get('availability', {})
+        weekday = date_obj.strftime("%A").lower()
+        day_availability = availability.get(weekday, DEFAULT_DAY_AVAILABILITY)
+        
+        if not day_availability.get('is_available', True):
+            return None
+        
+        # Check if doctor has multiple time blocks (new format) or single block (legacy format)
+        if 'time_blocks' in day_availability:
+            # New format: multiple time blocks with breaks
+            return self.generate_multiple_time_blocks_slots(day_availability['time_blocks'])
+        
+        # Legacy format: single continuous time block
+        start_time = day_availability.get('start_time', '09:00')
+        end_time = day_availability.get('end_time', '17:00')
+        return self.generate_time_slots(start_time, end_time)
+    
+    async def get_booked_appointments(
+        self,
+        db: AsyncIOMotorDatabase,
+        doctor_id: ObjectId,
+        start_date: datetime,
+        days: int
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Slot-occupying appointments of a doctor over a date range, in one query
+        
+        Returns:
+            Appointments grouped by "YYYY-MM-DD" date
+        """
+        end_date = start_date + timedelta(days=days)
+        
+        # Bookings store the date as "YYYY-MM-DD"; older records and blocked slots use datetimes
+        cursor = db.appointments.find({
+            "doctor_id": doctor_id,
+            "status": {"$in": BOOKED_STATUSES},
+            "$or": [
+                {"appointment_date": {"$gte": start_date.strftime(DATE_FORMAT), "$lt": end_date.strftime(DATE_FORMAT)}},
+                {"appointment_date": {"$gte": start_date, "$lt": end_date}}
+            ]
+        })
+        
+        by_date: Dict[str, List[Dict[str, Any]]] = {}
+        async for appointment in cursor:
+            appointment_date = appointment["appointment_date"]
+            if isinstance(appointment_date, datetime):
+                appointment_date = appointment_date.strftime(DATE_FORMAT)
+            by_date.setdefault(appointment_date, []).append(appointment)
+        
+        for appointments in by_date.values():
+            appointments.sort(key=lambda appointment: appointment.get("appointment_time", ""))
+        return by_date
+    
+    async def get_range_availability(
         self,
         db: AsyncIOMotorDatabase,
         doctor_id: str,
-        date: str
-    ) -> List[str]:
-        """Get available time slots for a doctor on a specific date"""
-        try:
-            # Get doctor's availability settings
-            doctor = await db.doctors.find_one({"_id": ObjectId(doctor_id)})
+        start_date: str,
+        days: int,
+        doctor: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Slots of a doctor for every day of a range
+        
+        The doctor and the whole range's appointments are read once (concurrently)
+        and each day's slots are computed in memory.
+        
+        Args:
+            doctor_id: The doctor
+            start_date: First day in YYYY-MM-DD format
+            days: Number of days
+            doctor: Doctor document, if the caller already has it
+        
+        Returns:
+            Per date: day_obj, is_available, all_slots, booked_slots, available_slots
+            and appointments; empty if the doctor does not exist
+        """
+        start_date_obj = datetime.strptime(start_date, DATE_FORMAT)
+        
+        if doctor is None:
+            doctor, booked = await asyncio.gather(
+                db.doctors.find_one({"_id": ObjectId(doctor_id)}, {"availability": 1}),
+                self.get_booked_appointments(db, ObjectId(doctor_id), start_date_obj, days)
+            )
             if not doctor:
-                return []
-            
-            # Get doctor's working hours (default 9 AM to 5 PM)
-            availability = doctor.get('availability', {})
-            weekday = datetime.strptime(date, "%Y-%m-%d").strftime("%A").lower()
-            
-            day_availability = availability.get(weekday, {
-                'is_available': True,
-                'start_time': '09:00',
-                'end_time': '17:00'
-            })
-            
-            if not day_availability.get('is_available', True):
-                return []
-            
-            # Check if doctor has multiple time blocks (new format) or single block (legacy format)
-            if 'time_blocks' in day_availability:
-                # New format: multiple time blocks with breaks
-                time_blocks = day_availability['time_blocks']
-                all_slots = self.generate_multiple_time_blocks_slots(time_blocks)
-            else:
-                # Legacy format: single continuous time block
-                start_time = day_availability.get('start_time', '09:00')
-                end_time = day_availability.get('end_time', '17:00')
-                all_slots = self.generate_time_slots(start_time, end_time)
+                return {}
+        else:
+            booked = await self.get_booked_appointments(db, ObjectId(doctor_id), start_date_obj, days)
+        
+        now = datetime.now()
+        today = now.strftime(DATE_FORMAT)
+        current_time = now.strftime("%H:%M")
+        
+        availability = {}
+        for i in range(days):
+            day_obj = start_date_obj + timedelta(days=i)
+            date_str = day_obj.strftime(DATE_FORMAT)
+            appointments = booked.get(date_str, [])
+            all_slots = self.get_working_slots(doctor, day_obj)
+            booked_slots = set(apt.get("appointment_time") for apt in appointments)
             
-            # Get existing appointments for this doctor on this date
-            # Convert string date to datetime range for proper database query
-            date_obj = datetime.strptime(date, "%Y-%m-%d")
-            next_day = date_obj + timedelta(days=1)
+            available_slots = [slot for slot in (all_slots or []) if slot not in booked_slots]
+            # Remove past slots for today
+            if date_str == today:
+                available_slots = [slot for slot in available_slots if slot > current_time]
             
-            existing_appointments = await db.appointments.find({
-                "doctor_id": ObjectId(doctor_id),
-                "appointment_date": {
-                    "$gte": date_obj,
-                    "$lt": next_day
-                },
-                "status": {"$in": ["pending", "confirmed"]}  # Don't count cancelled appointments
-            }).to_list(None)
+            availability[date_str] = {
+                "day_obj": day_obj,
+                "is_available": all_slots is not None,
+                "all_slots": all_slots or [],
+                "booked_slots": booked_slots,
+                "available_slots": available_slots,
+                "appointments": appointments
+            }
+        return availability
+    
+    def format_slots(self, all_slots: List[str], booked_slots: Set[str], date: str) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Display entries for every slot of a day with its booked/past state
+        
+        Returns:
+            (formatted slots, number of slots still available)
+        """
+        formatted_slots = []
+        available_count = 0
+        current_time = datetime.now().strftime("%H:%M")
+        is_today = date == datetime.now().strftime(DATE_FORMAT)
+        
+        for slot in all_slots:
+            end_time = self.get_slot_duration_end(slot)
             
-            # Remove booked slots
-            booked_slots = [apt["appointment_time"] for apt in existing_appointments]
-            available_slots = [slot for slot in all_slots if slot not in booked_slots]
+            # Check if slot is available
+            is_booked = slot in booked_slots
+            is_past = is_today and slot <= current_time
+            is_available = not is_booked and not is_past
             
-            # Remove past slots for today
-            if date == datetime.now().strftime("%Y-%m-%d"):
-                current_time = datetime.now().strftime("%H:%M")
-                available_slots = [slot for slot in available_slots if slot > current_time]
+            if is_available:
+                available_count += 1
             
-            return available_slots
+            display_range = f"{self.format_time_slot(slot)} - {self.format_time_slot(end_time)}"
+            formatted_slots.append({
+                "time": slot,
+                "end_time": end_time,
+                "display_time": display_range,
+                "display_range": display_range,
+                "is_available": is_available,
+                "is_booked": is_booked,
+                "is_past": is_past
+            })
+        
+        return formatted_slots, available_count
+    
+    async def get_doctor_available_slots(
+        self,
+        db: AsyncIOMotorDatabase,
+        doctor_id: str,
+        date: str
+    ) -> List[str]:
+        """Get available time slots for a doctor on a specific date"""
+        try:
+            availability = await self.get_range_availability(db, doctor_id, date, 1)
+            return availability[date]["available_slots"] if availability else []
             
         except Exception as e:
             logger.error(f"Error getting available slots for doctor {doctor_id}: {e}")
@@ -194,17 +309,8 @@ class AvailabilityService:
     ) -> Dict[str, List[str]]:
         """Get available slots for a doctor for the next 7 days"""
         try:
-            availability = {}
-            start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-            
-            for i in range(7):
-                current_date = start_date_obj + timedelta(days=i)
-                date_str = current_date.strftime("%Y-%m-%d")
-                
-                slots = await self.get_doctor_available_slots(db, doctor_id, date_str)
-                availability[date_str] = slots
-            
-            return availability
+            availability = await self.get_range_availability(db, doctor_id, start_date, 7)
+            return {date_str: day["available_slots"] for date_str, day in availability.items()}
             
         except Exception as e:
             logger.error(f"Error getting weekly availability: {e}")
@@ -261,20 +367,15 @@ class AvailabilityService:
         """Get the next available slot for a doctor"""
         try:
             start_date = preferred_date or datetime.now().strftime("%Y-%m-%d")
-            start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
             
             # Look for available slots in the next 30 days
-            for i in range(30):
-                current_date = start_date_obj + timedelta(days=i)
-                date_str = current_date.strftime("%Y-%m-%d")
-                
-                available_slots = await self.get_doctor_available_slots(db, doctor_id, date_str)
-                
-                if available_slots:
+            availability = await self.get_range_availability(db, doctor_id, start_date, 30)
+            for date_str, day in availability.items():
+                if day["available_slots"]:
                     return {
                         "date": date_str,
-                        "time": available_slots[0],  # Return first available slot
-                        "day_name": current_date.strftime("%A")
+                        "time": day["available_slots"][0],  # Return first available slot
+                        "day_name": day["day_obj"].strftime("%A")
                     }
             
             return None
@@ -1,12 +1,28 @@
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
+from azure.storage.blob import (
+    BlobServiceClient, BlobClient, ContainerClient, BlobSasPermissions, generate_blob_sas
+)
 from azure.core.exceptions import AzureError
-from typing import Optional, BinaryIO
+from cachetools import TTLCache
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from typing import Optional, BinaryIO, Iterable, Tuple, Union, Dict, Any
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import io
 import logging
 import uuid
 from ..core.config import settings
+from ..core.database import get_database
 
 logger = logging.getLogger(__name__)
 
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# How long an upload waits for a concurrent deletion of the same content to finish
+DELETE_WAIT_ATTEMPTS = 20
+DELETE_WAIT_SECONDS = 0.05
+
 class AzureStorageService:
     def __init__(self):
         try:
@@ -14,14 +30,46 @@ class AzureStorageService:
                 settings.azure_storage_connection_string
             )
             self.container_name = settings.container_name
+            self.account_name = self.blob_service_client.account_name
+            self.account_key = getattr(self.blob_service_client.credential, "account_key", None)
+            
+            # Signed read URLs are reused until shortly before their token expires
+            read_ttl = settings.sas_read_expire_minutes * 60 - settings.sas_cache_margin_seconds
+            self._read_url_cache: TTLCache = TTLCache(maxsize=10000, ttl=max(read_ttl, 60))
             logger.info("Azure Storage Service initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Azure Storage Service: {e}")
             raise
 
+    def _hash_content(
+        self,
+        file_content: Union[bytes, BinaryIO]
+    ) -> Tuple[str, int, Union[bytes, BinaryIO]]:
+        """
+        Compute the SHA-256 digest of the content, streaming file objects in chunks
+
+        Returns:
+            Tuple of (hex digest, size in bytes, content rewound for upload)
+        """
+        sha256 = hashlib.sha256()
+        if isinstance(file_content, (bytes, bytearray)):
+            sha256.update(file_content)
+            return sha256.hexdigest(), len(file_content), file_content
+        
+        if not file_content.seekable():
+            # Spool non-seekable streams so the same bytes can be uploaded after hashing
+            file_content = io.BytesIO(file_content.read())
+        
+        size = 0
+        for chunk in iter(lambda: file_content.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            size += len(chunk)
+        file_content.seek(0)
+        return sha256.hexdigest(), size, file_content
+
     async def upload_file(
         self, 
-        file_content: BinaryIO, 
+        file_content: Union[bytes, BinaryIO], 
         file_name: str,
         content_type: Optional[str] = None,
         folder: Optional[str] = None
@@ -29,6 +77,10 @@ class AzureStorageService:
         """
         Upload a file to Azure Blob Storage
         
+        Blobs are content-addressed: the blob name is the SHA-256 digest of the
+        content, so uploading identical content again only bumps the reference
+        count in the ``blobs`` collection and skips the network transfer.
+        
         Args:
             file_content: File content as binary
             file_name: Original file name
@@ -39,12 +91,14 @@ class AzureStorageService:
             URL of the uploaded file
         """
         try:
-            # Generate unique filename
-            file_extension = file_name.split('.')[-1] if '.' in file_name else ''
-            unique_filename = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
+            digest, size, file_content = self._hash_content(file_content)
+            
+            # Key the blob by its content digest
+            file_extension = file_name.split('.')[-1].lower() if '.' in file_name else ''
+            digest_filename = f"{digest}.{file_extension}" if file_extension else digest
             
             # Add folder path if specified
-            blob_name = f"{folder}/{unique_filename}" if folder else unique_filename
+            blob_name = f"{folder}/{digest_filename}" if folder else digest_filename
             
             # Get blob client
             blob_client = self.blob_service_client.get_blob_client(
@@ -52,12 +106,55 @@ class AzureStorageService:
                 blob=blob_name
             )
             
-            # Upload file
-            blob_client.upload_blob(
-                file_content,
-                content_type=content_type,
-                overwrite=True
-            )
+            db = await get_database()
+            
+            # Take the reference before uploading, so a deletion cannot claim the
+            # blob between our upload and our record update. A record being
+            # deleted is never reused: the upsert then collides on _id and we
+            # wait for the deletion to finish before re-creating it.
+            for attempt in range(DELETE_WAIT_ATTEMPTS):
+                try:
+                    existing = await db.blobs.find_one_and_update(
+                        {"_id": blob_name, "deleting": {"$ne": True}},
+                        {
+                            "$inc": {"ref_count": 1},
+                            "$set": {"updated_at": datetime.utcnow()},
+                            "$setOnInsert": {
+                                "digest": digest,
+                                "size": size,
+                                "content_type": content_type,
+                                "uploaded": False,
+                                "created_at": datetime.utcnow()
+                            }
+                        },
+                        upsert=True
+                    )
+                    break
+                except DuplicateKeyError:
+                    await asyncio.sleep(DELETE_WAIT_SECONDS * (attempt + 1))
+            else:
+                raise RuntimeError(f"Timed out waiting for deletion of {blob_name}")
+            
+            # Identical content already stored: skip the upload
+            if existing and existing["ref_count"] > 0 and existing.get("uploaded", True):
+                logger.info(f"Deduplicated upload of {file_name}: {blob_name}")
+                return blob_client.url
+            
+            # Concurrent first uploads of the same content each upload (same bytes).
+            # The SDK call is blocking network I/O; keep it off the event loop
+            try:
+                await asyncio.to_thread(
+                    blob_client.upload_blob,
+                    file_content,
+                    content_type=content_type,
+                    overwrite=True
+                )
+            except Exception:
+                # Give back the reference taken above
+                await db.blobs.update_one({"_id": blob_name}, {"$inc": {"ref_count": -1}})
+                raise
+            
+            await db.blobs.update_one({"_id": blob_name}, {"$set": {"uploaded": True}})
             
             # Return the URL
             blob_url = blob_client.url
@@ -71,9 +168,14 @@ class AzureStorageService:
             logger.error(f"Unexpected error during file upload: {e}")
             raise
 
-    async def delete_file(self, blob_name: str) -> bool:
+    async def release_file(self, blob_name: str) -> bool:
         """
-        Delete a file from Azure Blob Storage
+        Release a reference to a file in Azure Blob Storage
+        
+        Call once for every upload_file result that is no longer used. The
+        blob itself is only deleted once its last reference goes away.
+        Blobs uploaded before reference counting was introduced have no
+        ``blobs`` record and are deleted immediately.
         
         Args:
             blob_name: Name of the blob to delete
@@ -82,12 +184,47 @@ class AzureStorageService:
             True if successful, False otherwise
         """
         try:
+            db = await get_database()
+            # Dropping the last reference also claims the deletion in the same
+            # update, so uploads stop treating the blob as existing from then on
+            record = await db.blobs.find_one_and_update(
+                {"_id": blob_name, "ref_count": {"$gt": 0}},
+                [{"$set": {
+                    "ref_count": {"$subtract": ["$ref_count", 1]},
+                    "deleting": {"$lte": ["$ref_count", 1]},
+                    "updated_at": datetime.utcnow()
+                }}],
+                return_document=ReturnDocument.AFTER
+            )
+            
+            if record and not record["deleting"]:
+                logger.info(f"Released reference to {blob_name} ({record['ref_count']} remaining)")
+                return True
+            
+            if record is None and await db.blobs.count_documents({"_id": blob_name}, limit=1):
+                # No references left to release; another call owns the deletion
+                return True
+            
             blob_client = self.blob_service_client.get_blob_client(
                 container=self.container_name,
                 blob=blob_name
             )
             
-            blob_client.delete_blob()
+            try:
+                await asyncio.to_thread(blob_client.delete_blob)
+            except Exception:
+                if record:
+                    # Leave an unclaimed empty record; the next upload re-creates the blob
+                    await db.blobs.update_one(
+                        {"_id": blob_name, "deleting": True},
+                        {"$set": {"deleting": False, "uploaded": False}}
+                    )
+                raise
+            
+            if record:
+                # Releases uploads waiting to re-create this content
+                await db.blobs.delete_one({"_id": blob_name, "deleting": True})
+            
             logger.info(f"File deleted successfully: {blob_name}")
             return True
             
@@ -98,24 +235,129 @@ class AzureStorageService:
             logger.error(f"Unexpected error during file deletion: {e}")
             return False
 
+    async def release_urls(self, urls: Iterable[Optional[str]]):
+        """Release the references behind blob URLs that were replaced; URLs outside our container are skipped"""
+        for url in urls:
+            blob_name = self.blob_name_from_url(url)
+            if blob_name:
+                await self.release_file(blob_name)
+
+    def _sign_blob_url(
+        self,
+        blob_name: str,
+        permission: BlobSasPermissions,
+        expires_in: timedelta
+    ) -> Tuple[str, datetime]:
+        """Build a SAS-signed URL for a blob"""
+        if not self.account_key:
+            raise RuntimeError("Storage account key is required to issue SAS tokens")
+        
+        now = datetime.utcnow()
+        expiry = now + expires_in
+        sas_token = generate_blob_sas(
+            account_name=self.account_name,
+            container_name=self.container_name,
+            blob_name=blob_name,
+            account_key=self.account_key,
+            permission=permission,
+            start=now - timedelta(minutes=5),  # tolerate clock skew
+            expiry=expiry
+        )
+        blob_client = self.blob_service_client.get_blob_client(
+            container=self.container_name,
+            blob=blob_name
+        )
+        return f"{blob_client.url}?{sas_token}", expiry
+
+    def blob_name_from_url(self, url: str) -> Optional[str]:
+        """Extract the blob name from a blob URL in this container"""
+        container_url = self.blob_service_client.get_container_client(self.container_name).url
+        prefix = f"{container_url}/"
+        if not url or not url.startswith(prefix):
+            return None
+        return url[len(prefix):].split('?', 1)[0]
+
+    def get_read_url(self, blob_name: str) -> str:
+        """
+        Get a short-lived signed read URL for a blob
+        
+        URLs are cached per blob and reused until shortly before the token
+        expires, so repeated reads don't re-sign.
+        
+        Args:
+            blob_name: Name of the blob
+            
+        Returns:
+            SAS-signed URL granting read access
+        """
+        cached_url = self._read_url_cache.get(blob_name)
+        if cached_url:
+            return cached_url
+        
+        url, _ = self._sign_blob_url(
+            blob_name,
+            BlobSasPermissions(read=True),
+            timedelta(minutes=settings.sas_read_expire_minutes)
+        )
+        self._read_url_cache[blob_name] = url
+        return url
+
+    def get_upload_url(
+        self,
+        file_name: str,
+        folder: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Issue a signed URL that lets a client upload a blob directly to storage
+        
+        Args:
+            file_name: Original file name
+            folder: Optional folder path in container
+            
+        Returns:
+            Upload URL, target blob name/URL, expiry and headers the client must send
+        """
+        file_extension = file_name.split('.')[-1].lower() if '.' in file_name else ''
+        unique_filename = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
+        blob_name = f"{folder}/{unique_filename}" if folder else unique_filename
+        
+        upload_url, expiry = self._sign_blob_url(
+            blob_name,
+            BlobSasPermissions(create=True, write=True),
+            timedelta(minutes=settings.sas_upload_expire_minutes)
+        )
+        
+        return {
+            "upload_url": upload_url,
+            "blob_name": blob_name,
+            "blob_url": upload_url.split('?', 1)[0],
+            "expires_at": expiry,
+            "method": "PUT",
+            "headers": {"x-ms-blob-type": "BlockBlob"}
+        }
+
     async def get_file_url(self, blob_name: str) -> Optional[str]:
         """
-        Get the URL of a file in Azure Blob Storage
+        Get a signed read URL of a file in Azure Blob Storage
         
         Args:
             blob_name: Name of the blob
             
         Returns:
-            URL of the file or None if not found
+            Signed URL of the file or None if not found
         """
         try:
+            cached_url = self._read_url_cache.get(blob_name)
+            if cached_url:
+                return cached_url
+            
             blob_client = self.blob_service_client.get_blob_client(
                 container=self.container_name,
                 blob=blob_name
             )
             
-            if blob_client.exists():
-                return blob_client.url
+            if await asyncio.to_thread(blob_client.exists):
+                return self.get_read_url(blob_name)
             else:
                 return None
                 
@@ -123,6 +365,24 @@ class AzureStorageService:
             logger.error(f"Error getting file URL: {e}")
             return None
 
+    def _list_blobs(self, folder: Optional[str] = None) -> list:
+        container_client = self.blob_service_client.get_container_client(
+            self.container_name
+        )
+        
+        blob_list = []
+        blobs = container_client.list_blobs(name_starts_with=folder)
+        
+        for blob in blobs:
+            blob_list.append({
+                'name': blob.name,
+                'size': blob.size,
+                'last_modified': blob.last_modified,
+                'url': f"{container_client.url}/{blob.name}"
+            })
+        
+        return blob_list
+
     async def list_files(self, folder: Optional[str] = None) -> list:
         """
         List files in the container
@@ -134,22 +394,8 @@ class AzureStorageService:
             List of blob names
         """
         try:
-            container_client = self.blob_service_client.get_container_client(
-                self.container_name
-            )
-            
-            blob_list = []
-            blobs = container_client.list_blobs(name_starts_with=folder)
-            
-            for blob in blobs:
-                blob_list.append({
-                    'name': blob.name,
-                    'size': blob.size,
-                    'last_modified': blob.last_modified,
-                    'url': f"{container_client.url}/{blob.name}"
-                })
-            
-            return blob_list
+            # Paging through the container is blocking I/O; keep it off the event loop
+            return await asyncio.to_thread(self._list_blobs, folder)
             
         except Exception as e:
             logger.error(f"Error listing files: {e}")
@@ -0,0 +1,244 @@
+"""
+Cart Service
+Shared cart engine for the medicine store and food delivery carts
+"""
+
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import logging
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from bson import ObjectId
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class CartConflictError(Exception):
+    """Raised when a cart keeps changing underneath an update"""
+    pass
+
+class CartEngine:
+    def __init__(
+        self,
+        cart_collection: str,
+        catalog_collection: str,
+        item_key: str,
+        empty_cart_fields: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            cart_collection: Collection holding one cart per user
+            catalog_collection: Collection the cart items reference (source of prices)
+            item_key: Field of a cart item holding the catalog document ID
+            empty_cart_fields: Extra fields an empty cart starts with
+        """
+        self.cart_collection = cart_collection
+        self.catalog_collection = catalog_collection
+        self.item_key = item_key
+        self.empty_cart_fields = empty_cart_fields or {}
+        self.max_retries = settings.cart_update_max_retries
+
+    def _empty_cart(self) -> Dict[str, Any]:
+        # user_id comes from the upsert filter
+        return {
+            **self.empty_cart_fields,
+            "items": [],
+            "total_amount": 0.0,
+            "version": 0,
+            "created_at": datetime.utcnow()
+        }
+
+    async def get_or_create(self, db: AsyncIOMotorDatabase, user_id: ObjectId) -> Dict[str, Any]:
+        """Fetch the user's cart, creating an empty one in the same round trip if needed"""
+        return await db[self.cart_collection].find_one_and_update(
+            {"user_id": user_id},
+            {"$setOnInsert": self._empty_cart()},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def fetch_prices(self, db: AsyncIOMotorDatabase, item_ids: List[ObjectId]) -> Dict[ObjectId, float]:
+        """Look up the current price of every referenced catalog item with one query"""
+        if not item_ids:
+            return {}
+        cursor = db[self.catalog_collection].find(
+            {"_id": {"$in": item_ids}},
+            {"price": 1}
+        )
+        return {doc["_id"]: doc.get("price", 0.0) async for doc in cursor}
+
+    def compute_total(self, quantities: Dict[ObjectId, int], prices: Dict[ObjectId, float]) -> float:
+        """Sum price x quantity over the cart in one pass; unknown items count as zero"""
+        return round(sum(prices.get(item_id, 0.0) * quantity for item_id, quantity in quantities.items()), 2)
+
+    def quantities(self, items: List[Dict[str, Any]]) -> Dict[ObjectId, int]:
+        """Total quantity per catalog item, merging duplicate lines"""
+        quantities: Dict[ObjectId, int] = {}
+        for item in items:
+            quantities[item[self.item_key]] = quantities.get(item[self.item_key], 0) + item["quantity"]
+        return quantities
+
+    async def _compare_and_swap(
+        self,
+        db: AsyncIOMotorDatabase,
+        cart: Dict[str, Any],
+        build_update: Callable[[Dict[str, Any]], Any]
+    ) -> Any:
+        """
+        Apply an update only if the cart is still at the version it was read at
+
+        On a lost race the cart is re-read and the update rebuilt from the fresh
+        copy, up to ``max_retries`` attempts.
+
+        Args:
+            cart: The cart document the caller read
+            build_update: Coroutine function building (update, result) from a cart snapshot
+
+        Returns:
+            The result produced by build_update for the snapshot that won
+        """
+        collection = db[self.cart_collection]
+        for attempt in range(self.max_retries):
+            update, result = await build_update(cart)
+            update.setdefault("$inc", {})["version"] = 1
+
+            # Carts created before versioning have no version field; {"version": None} matches those
+            outcome = await collection.update_one(
+                {"_id": cart["_id"], "version": cart.get("version")},
+                update
+            )
+            if outcome.matched_count:
+                return result
+
+            cart = await collection.find_one({"_id": cart["_id"]})
+            if cart is None:
+                raise CartConflictError("Cart was removed during the update")
+
+        logger.warning(f"Cart update gave up after {self.max_retries} attempts")
+        raise CartConflictError("Cart is being updated concurrently, please retry")
+
+    async def add_item(
+        self,
+        db: AsyncIOMotorDatabase,
+        cart: Dict[str, Any],
+        item: Dict[str, Any],
+        cart_fields: Optional[Dict[str, Any]] = None,
+        merge_fields: Optional[Dict[str, Any]] = None,
+        validate: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> float:
+        """
+        Add an item to a cart, merging quantities with an existing line
+
+        Args:
+            cart: The user's current cart document
+            item: Cart item to add (must contain item_key and quantity)
+            cart_fields: Extra cart-level fields to set
+            merge_fields: Fields to overwrite on an existing line when merging
+            validate: Check run against every cart snapshot before it is updated
+
+        Returns:
+            New cart total
+        """
+        item_id = item[self.item_key]
+
+        async def build_update(snapshot: Dict[str, Any]):
+            if validate:
+                validate(snapshot)
+
+            items = snapshot.get("items", [])
+            quantities = self.quantities(items)
+            quantities[item_id] = quantities.get(item_id, 0) + item["quantity"]
+            prices = await self.fetch_prices(db, list(quantities))
+            total_amount = self.compute_total(quantities, prices)
+
+            update_fields = {
+                "total_amount": total_amount,
+                "updated_at": datetime.utcnow(),
+                **(cart_fields or {})
+            }
+            line_index = next(
+                (index for index, line in enumerate(items) if line[self.item_key] == item_id),
+                None
+            )
+            if line_index is None:
+                return {"$push": {"items": item}, "$set": update_fields}, total_amount
+
+            # Bump the quantity of the matching line in place
+            for field, value in (merge_fields or {}).items():
+                update_fields[f"items.{line_index}.{field}"] = value
+            update = {
+                "$inc": {f"items.{line_index}.quantity": item["quantity"]},
+                "$set": update_fields
+            }
+            return update, total_amount
+
+        return await self._compare_and_swap(db, cart, build_update)
+
+    async def remove_item(
+        self,
+        db: AsyncIOMotorDatabase,
+        cart: Dict[str, Any],
+        item_id: ObjectId
+    ) -> float:
+        """
+        Remove a line from a cart, resetting cart-level fields once it is empty
+
+        Args:
+            cart: The user's current cart document
+            item_id: Catalog ID of the line to remove
+
+        Returns:
+            New cart total
+        """
+        async def build_update(snapshot: Dict[str, Any]):
+            quantities = self.quantities(snapshot.get("items", []))
+            quantities.pop(item_id, None)
+            prices = await self.fetch_prices(db, list(quantities))
+            total_amount = self.compute_total(quantities, prices)
+
+            update_fields = {"total_amount": total_amount, "updated_at": datetime.utcnow()}
+            if not quantities:
+                update_fields.update(self.empty_cart_fields)
+
+            update = {"$pull": {"items": {self.item_key: item_id}}, "$set": update_fields}
+            return update, total_amount
+
+        return await self._compare_and_swap(db, cart, build_update)
+
+    def _clear_update(self) -> Dict[str, Any]:
+        return {
+            "$set": {
+                **self.empty_cart_fields,
+                "items": [],
+                "total_amount": 0.0,
+                "updated_at": datetime.utcnow()
+            },
+            "$inc": {"version": 1}
+        }
+
+    async def clear(self, db: AsyncIOMotorDatabase, user_id: ObjectId):
+        """Empty the user's cart unconditionally"""
+        await db[self.cart_collection].update_one({"user_id": user_id}, self._clear_update())
+
+    async def clear_snapshot(self, db: AsyncIOMotorDatabase, cart: Dict[str, Any], session=None) -> bool:
+        """Empty a cart only if it is still at the version it was read at"""
+        result = await db[self.cart_collection].update_one(
+            {"_id": cart["_id"], "version": cart.get("version")},
+            self._clear_update(),
+            session=session
+        )
+        return result.matched_count == 1
+
+# Cart engine instances
+medicine_cart_engine = CartEngine(
+    cart_collection="carts",
+    catalog_collection="medicines",
+    item_key="medicine_id"
+)
+food_cart_engine = CartEngine(
+    cart_collection="food_carts",
+    catalog_collection="menu_items",
+    item_key="menu_item_id",
+    empty_cart_fields={"restaurant_id": None}
+)
@@ -0,0 +1,294 @@
+"""
+Checkout Service
+Turns food and medicine carts into orders, each inside a single MongoDB transaction
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+import logging
+import uuid
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from ..core.database import db as database
+from ..models.orders import FoodOrderItemCreate, OrderCreate, OrderItemCreate
+from .cart_service import food_cart_engine, medicine_cart_engine
+from .inventory_service import inventory_service, InventoryEventReason
+from .rollup_service import rollup_service
+from .admin_search_service import admin_search_service
+
+logger = logging.getLogger(__name__)
+
+# Estimated delivery time from checkout
+FOOD_DELIVERY_ETA = timedelta(minutes=35)
+MEDICINE_DELIVERY_ETA = timedelta(days=3)
+
+class CheckoutError(Exception):
+    """Checkout could not be completed; carries the HTTP status to report"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+class FoodCheckoutService:
+    @staticmethod
+    def generate_order_number() -> str:
+        return f"FO{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
+
+    async def _checkout(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: ObjectId,
+        checkout_data: Dict[str, Any],
+        session
+    ) -> Dict[str, Any]:
+        cart = await db.food_carts.find_one({"user_id": user_id}, session=session)
+        if not cart or not cart.get("items"):
+            raise CheckoutError("Cart is empty")
+
+        # Snapshot names and prices of everything in the cart with one query
+        menu_item_ids = list({item["menu_item_id"] for item in cart["items"]})
+        cursor = db.menu_items.find(
+            {"_id": {"$in": menu_item_ids}},
+            {"name": 1, "price": 1, "restaurant_id": 1, "is_available": 1},
+            session=session
+        )
+        menu_items = {menu_item["_id"]: menu_item async for menu_item in cursor}
+
+        unavailable = [
+            str(menu_item_id) for menu_item_id in menu_item_ids
+            if not menu_items.get(menu_item_id, {}).get("is_available", False)
+        ]
+        if unavailable:
+            raise CheckoutError(f"Menu items no longer available: {', '.join(unavailable)}", 409)
+
+        restaurant_id = cart.get("restaurant_id") or menu_items[menu_item_ids[0]]["restaurant_id"]
+        if any(menu_item["restaurant_id"] != restaurant_id for menu_item in menu_items.values()):
+            raise CheckoutError("Cart contains items from different restaurants", 409)
+
+        now = datetime.utcnow()
+        order_id = ObjectId()
+        order_items: List[Dict[str, Any]] = []
+        for item in cart["items"]:
+            menu_item = menu_items[item["menu_item_id"]]
+            order_item = FoodOrderItemCreate(
+                order_id=order_id,
+                menu_item_id=item["menu_item_id"],
+                restaurant_id=restaurant_id,
+                quantity=item["quantity"],
+                price_per_unit=menu_item["price"],
+                total_price=round(menu_item["price"] * item["quantity"], 2),
+                item_name=menu_item["name"],
+                special_instructions=item.get("special_instructions")
+            ).dict()
+            order_item["created_at"] = now
+            order_items.append(order_item)
+
+        order = {
+            **checkout_data,
+            "_id": order_id,
+            "order_number": self.generate_order_number(),
+            "user_id": user_id,
+            "restaurant_id": restaurant_id,
+            "items": [
+                {
+                    "menu_item_id": item["menu_item_id"],
+                    "quantity": item["quantity"],
+                    "special_instructions": item.get("special_instructions")
+                }
+                for item in cart["items"]
+            ],
+            "total_amount": round(sum(order_item["total_price"] for order_item in order_items), 2),
+            "estimated_delivery_time": now + FOOD_DELIVERY_ETA,
+            "created_at": now,
+            "updated_at": now
+        }
+
+        await db.food_orders.insert_one(order, session=session)
+        await db.food_order_items.insert_many(order_items, session=session)
+
+        # Only clear the cart we priced; a concurrent edit aborts the transaction
+        if not await food_cart_engine.clear_snapshot(db, cart, session=session):
+            raise CheckoutError("Cart changed during checkout, please review it and retry", 409)
+
+        return order
+
+    async def checkout(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: ObjectId,
+        checkout_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Place a food order from the user's cart
+
+        Args:
+            user_id: The ordering user
+            checkout_data: Delivery and payment details supplied by the client
+
+        Returns:
+            The inserted order document
+        """
+        async with await database.client.start_session() as session:
+            order = await session.with_transaction(
+                lambda s: self._checkout(db, user_id, checkout_data, s)
+            )
+
+        # Outside the transaction: the day's rollup document is shared by every checkout
+        await rollup_service.record_order(db, order["total_amount"], is_food=True)
+        logger.info(f"Food order {order['order_number']} placed with {len(order['items'])} items")
+        return order
+
+class MedicineCheckoutService:
+    @staticmethod
+    def generate_order_number() -> str:
+        return f"MO{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
+
+    async def _reserve_stock(
+        self,
+        db: AsyncIOMotorDatabase,
+        quantities: Dict[ObjectId, int],
+        medicines: Dict[ObjectId, Dict[str, Any]],
+        order_id: ObjectId,
+        session
+    ):
+        """Decrement stock for every line, failing the whole batch if any line is short"""
+        result = await db.medicines.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": medicine_id, "is_active": True, "stock_quantity": {"$gte": quantity}},
+                    {"$inc": {"stock_quantity": -quantity}}
+                )
+                for medicine_id, quantity in quantities.items()
+            ],
+            ordered=False,
+            session=session
+        )
+        if result.modified_count != len(quantities):
+            short = [
+                medicines[medicine_id].get("name", str(medicine_id))
+                for medicine_id, quantity in quantities.items()
+                if medicines[medicine_id].get("stock_quantity", 0) < quantity
+            ]
+            detail = f": {', '.join(short)}" if short else ""
+            raise CheckoutError(f"Insufficient stock{detail}", 409)
+
+        # Sold-out medicines stop showing as available
+        await db.medicines.update_many(
+            {"_id": {"$in": list(quantities)}, "stock_quantity": {"$lte": 0}},
+            {"$set": {"in_stock": False, "updated_at": datetime.utcnow()}},
+            session=session
+        )
+
+        # Stock read inside the transaction is exactly what was decremented
+        await inventory_service.record_movements(
+            db,
+            [
+                {
+                    "medicine_id": medicine_id,
+                    "name": medicines[medicine_id].get("name"),
+                    "stock_before": medicines[medicine_id].get("stock_quantity") or 0,
+                    "delta": -quantity
+                }
+                for medicine_id, quantity in quantities.items()
+            ],
+            reason=InventoryEventReason.CHECKOUT,
+            order_id=order_id,
+            session=session
+        )
+
+    async def _checkout(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: ObjectId,
+        checkout_data: Dict[str, Any],
+        session
+    ) -> Dict[str, Any]:
+        cart = await db.carts.find_one({"user_id": user_id}, session=session)
+        if not cart or not cart.get("items"):
+            raise CheckoutError("Cart is empty")
+
+        quantities = medicine_cart_engine.quantities(cart["items"])
+        cursor = db.medicines.find(
+            {"_id": {"$in": list(quantities)}},
+            {"name": 1, "brand": 1, "price": 1, "stock_quantity": 1, "is_active": 1},
+            session=session
+        )
+        medicines = {medicine["_id"]: medicine async for medicine in cursor}
+
+        missing = [str(medicine_id) for medicine_id in quantities if medicine_id not in medicines]
+        if missing:
+            raise CheckoutError(f"Medicines no longer available: {', '.join(missing)}", 409)
+
+        order_id = ObjectId()
+        await self._reserve_stock(db, quantities, medicines, order_id, session)
+
+        now = datetime.utcnow()
+        order_items: List[Dict[str, Any]] = []
+        for medicine_id, quantity in quantities.items():
+            medicine = medicines[medicine_id]
+            order_item = OrderItemCreate(
+                order_id=order_id,
+                product_id=medicine_id,
+                quantity=quantity,
+                price_per_unit=medicine["price"],
+                total_price=round(medicine["price"] * quantity, 2),
+                product_name=medicine["name"],
+                product_details={"brand": medicine.get("brand")}
+            ).dict()
+            order_item["created_at"] = now
+            order_items.append(order_item)
+
+        total_amount = round(sum(order_item["total_price"] for order_item in order_items), 2)
+        order = OrderCreate(
+            **checkout_data,
+            user_id=user_id,
+            order_number=self.generate_order_number(),
+            total_amount=total_amount,
+            final_amount=total_amount,
+            estimated_delivery=now + MEDICINE_DELIVERY_ETA
+        ).dict()
+        order.update({"_id": order_id, "created_at": now, "updated_at": now})
+
+        await db.orders.insert_one(admin_search_service.with_search_keys("orders", order), session=session)
+        await db.order_items.insert_many(order_items, session=session)
+
+        if not await medicine_cart_engine.clear_snapshot(db, cart, session=session):
+            raise CheckoutError("Cart changed during checkout, please review it and retry", 409)
+
+        return order
+
+    async def checkout(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: ObjectId,
+        checkout_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Place a medicine order from the user's cart, reserving stock
+
+        Concurrent checkouts of the same medicine conflict on its stock document;
+        the transaction is retried on such transient errors and every retry
+        re-checks stock, so stock never goes negative and nothing is half-written.
+
+        Args:
+            user_id: The ordering user
+            checkout_data: Shipping and payment details supplied by the client
+
+        Returns:
+            The inserted order document
+        """
+        async with await database.client.start_session() as session:
+            order = await session.with_transaction(
+                lambda s: self._checkout(db, user_id, checkout_data, s)
+            )
+
+        await rollup_service.record_order(db, order["final_amount"])
+        logger.info(f"Medicine order {order['order_number']} placed for {order['final_amount']}")
+        return order
+
+# Global checkout service instances
+food_checkout_service = FoodCheckoutService()
+medicine_checkout_service = MedicineCheckoutService()
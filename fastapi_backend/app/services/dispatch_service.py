@@ -0,0 +1,339 @@
+"""
+Dispatch Service
+Claims the nearest available ambulance atomically, estimates its arrival, and
+queues unassigned emergencies by severity until a unit frees up
+"""
+
+import asyncio
+import heapq
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from ..core.config import settings
+from ..utils.geo import geo_point, haversine_km, lat_lng
+
+logger = logging.getLogger(__name__)
+
+# Used when either end of the trip has no usable coordinates
+DEFAULT_ETA_MINUTES = 20
+
+# Queue order: lower rank is served first
+SEVERITY_RANK = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+DEFAULT_SEVERITY_RANK = SEVERITY_RANK["medium"]
+
+# Number of recent assignments kept for wait-time metrics
+WAIT_SAMPLE_SIZE = 200
+
+class DispatchService:
+    def __init__(self):
+        self.average_speed_kmh = settings.ambulance_average_speed_kmh
+        self.overhead_minutes = settings.ambulance_dispatch_overhead_minutes
+        self.max_dispatch_km = settings.ambulance_max_dispatch_km
+
+    def location_fields(self, current_location: Optional[Dict[str, float]]) -> Dict[str, Any]:
+        """Fields to store for an ambulance position, including its indexed GeoJSON copy"""
+        coordinates = lat_lng(current_location)
+        if coordinates is None:
+            return {}
+        lat, lng = coordinates
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            # The 2dsphere index rejects such points, failing the whole write
+            logger.warning(f"Ignoring out-of-range ambulance location {current_location}")
+            return {}
+        return {
+            "current_location": current_location,
+            "geo_location": geo_point(*coordinates)
+        }
+
+    def estimate_arrival_minutes(self, distance_km: Optional[float]) -> float:
+        """Turnout time plus driving time at the average speed"""
+        if distance_km is None:
+            return DEFAULT_ETA_MINUTES
+        return self.overhead_minutes + distance_km / self.average_speed_kmh * 60
+
+    async def claim_nearest(
+        self,
+        db: AsyncIOMotorDatabase,
+        location: Optional[Dict[str, float]],
+        request_id: Optional[ObjectId] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[float], Optional[datetime]]:
+        """
+        Claim the nearest available ambulance for an emergency
+
+        The claim is a single find_one_and_update over a $near query, so two
+        concurrent emergencies can never be given the same ambulance.
+
+        Args:
+            location: Emergency location as {"lat": float, "lng": float}
+            request_id: Emergency request the ambulance is assigned to
+
+        Returns:
+            (ambulance, distance_km, estimated_arrival); all None when no unit is free
+        """
+        claim = {
+            "$set": {
+                "is_available": False,
+                "assigned_request_id": request_id,
+                "updated_at": datetime.utcnow()
+            }
+        }
+        coordinates = lat_lng(location)
+
+        ambulance = None
+        if coordinates is not None:
+            ambulance = await db.ambulances.find_one_and_update(
+                {
+                    "is_available": True,
+                    "geo_location": {
+                        "$near": {
+                            "$geometry": geo_point(*coordinates),
+                            "$maxDistance": self.max_dispatch_km * 1000
+                        }
+                    }
+                },
+                claim,
+                return_document=ReturnDocument.AFTER
+            )
+
+        if ambulance is None:
+            # No located unit in range: fall back to any free unit without a known position
+            ambulance = await db.ambulances.find_one_and_update(
+                {"is_available": True, "geo_location": {"$exists": False}},
+                claim,
+                return_document=ReturnDocument.AFTER
+            )
+
+        if ambulance is None:
+            logger.warning(f"No ambulance available for emergency {request_id}")
+            return None, None, None
+
+        distance_km = None
+        ambulance_coordinates = lat_lng(ambulance.get("current_location"))
+        if coordinates is not None and ambulance_coordinates is not None:
+            distance_km = round(haversine_km(*ambulance_coordinates, *coordinates), 2)
+
+        eta_minutes = self.estimate_arrival_minutes(distance_km)
+        estimated_arrival = datetime.utcnow() + timedelta(minutes=eta_minutes)
+        logger.info(
+            f"Dispatched ambulance {ambulance.get('vehicle_number')} "
+            f"({distance_km if distance_km is not None else '?'} km, ETA {eta_minutes:.0f} min)"
+        )
+        return ambulance, distance_km, estimated_arrival
+
+    async def release(self, db: AsyncIOMotorDatabase, ambulance_id: ObjectId, request_id: ObjectId) -> bool:
+        """
+        Return an ambulance to the available pool
+
+        Only releases the unit while it is still assigned to ``request_id``, so a
+        stale release cannot free an ambulance already serving another emergency.
+
+        Returns:
+            True if the ambulance was released
+        """
+        result = await db.ambulances.update_one(
+            {"_id": ambulance_id, "assigned_request_id": request_id},
+            {
+                "$set": {"is_available": True, "updated_at": datetime.utcnow()},
+                "$unset": {"assigned_request_id": ""}
+            }
+        )
+        return result.modified_count > 0
+
+    async def backfill_geo_locations(self, db: AsyncIOMotorDatabase):
+        """Add the GeoJSON field to ambulances stored before it existed"""
+        try:
+            cursor = db.ambulances.find(
+                {"geo_location": {"$exists": False}, "current_location": {"$ne": None}},
+                {"current_location": 1}
+            )
+            updated = 0
+            async for ambulance in cursor:
+                fields = self.location_fields(ambulance.get("current_location"))
+                if fields:
+                    await db.ambulances.update_one({"_id": ambulance["_id"]}, {"$set": fields})
+                    updated += 1
+            if updated:
+                logger.info(f"Backfilled geo_location on {updated} ambulances")
+        except Exception as e:
+            logger.error(f"Could not backfill ambulance locations: {e}")
+
+# Global dispatch service instance
+dispatch_service = DispatchService()
+
+class DispatchQueue:
+    """
+    Severity-ordered queue of emergencies waiting for an ambulance.
+
+    A background scheduler drains the queue whenever it is woken (an ambulance
+    freed up or a request was queued) and on a fixed interval as a safety net.
+    Assignment is conditional on the request still being pending and unassigned,
+    so several workers draining their own queues cannot double-assign.
+    """
+
+    def __init__(self):
+        self.retry_seconds = settings.dispatch_retry_seconds
+        self._heap: List[Tuple[int, float, str]] = []  # (severity rank, created timestamp, request id)
+        self._queued: Dict[str, Dict[str, Any]] = {}  # request id -> request snapshot
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._recent_waits = deque(maxlen=WAIT_SAMPLE_SIZE)  # seconds waited by assigned requests
+        self._assigned_total = 0
+
+    # Queue maintenance
+
+    def enqueue(self, request: Dict[str, Any]):
+        """Queue a request that could not be given an ambulance"""
+        request_id = str(request["_id"])
+        if request_id in self._queued:
+            return
+        created_at = request.get("created_at") or datetime.utcnow()
+        rank = SEVERITY_RANK.get(request.get("severity"), DEFAULT_SEVERITY_RANK)
+        self._queued[request_id] = {
+            "_id": request["_id"],
+            "location": request.get("location"),
+            "severity": request.get("severity"),
+            "created_at": created_at
+        }
+        heapq.heappush(self._heap, (rank, created_at.timestamp(), request_id))
+        self.notify()
+
+    def discard(self, request_id: ObjectId):
+        """Stop waiting on a request (cancelled or handled elsewhere); its heap entry is skipped lazily"""
+        self._queued.pop(str(request_id), None)
+
+    def notify(self):
+        """Wake the scheduler, e.g. after an ambulance becomes available"""
+        self._wake.set()
+
+    async def load(self, db: AsyncIOMotorDatabase):
+        """Queue requests left pending without an ambulance (e.g. across a restart)"""
+        cursor = db.emergency_requests.find(
+            {"status": "pending", "ambulance_id": None},
+            {"location": 1, "severity": 1, "created_at": 1}
+        )
+        async for request in cursor:
+            self.enqueue(request)
+
+    # Scheduling
+
+    async def _assign(self, db: AsyncIOMotorDatabase, request: Dict[str, Any]) -> Optional[bool]:
+        """
+        Try to give one waiting request an ambulance
+
+        Returns:
+            True if assigned, False if no ambulance is free, None if the request no longer waits
+        """
+        ambulance, distance_km, estimated_arrival = await dispatch_service.claim_nearest(
+            db, request.get("location"), request_id=request["_id"]
+        )
+        if ambulance is None:
+            return False
+
+        result = await db.emergency_requests.update_one(
+            {"_id": request["_id"], "status": "pending", "ambulance_id": None},
+            {"$set": {
+                "ambulance_id": ambulance["_id"],
+                "status": "dispatched",
+                "estimated_arrival": estimated_arrival,
+                "dispatch_distance_km": distance_km,
+                "updated_at": datetime.utcnow()
+            }}
+        )
+        if result.matched_count == 0:
+            # Cancelled or assigned meanwhile; hand the unit back
+            await dispatch_service.release(db, ambulance["_id"], request["_id"])
+            return None
+
+        wait_seconds = (datetime.utcnow() - request["created_at"]).total_seconds()
+        self._recent_waits.append(wait_seconds)
+        self._assigned_total += 1
+        logger.info(
+            f"Assigned queued {request.get('severity') or 'medium'} emergency {request['_id']} "
+            f"after {wait_seconds:.0f}s"
+        )
+        return True
+
+    async def drain(self, db: AsyncIOMotorDatabase):
+        """Assign free ambulances to waiting requests, most urgent and longest-waiting first"""
+        deferred = []
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            request = self._queued.get(entry[2])
+            if request is None:
+                continue  # discarded
+
+            assigned = await self._assign(db, request)
+            if assigned is False:
+                deferred.append(entry)
+                # Nothing in range of this request; stop if the fleet is fully busy
+                if not await db.ambulances.find_one({"is_available": True}, {"_id": 1}):
+                    break
+                continue
+            self._queued.pop(entry[2], None)
+
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        await self.load(db)
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.retry_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self._queued:
+                continue
+            try:
+                await self.drain(db)
+            except Exception as e:
+                logger.error(f"Dispatch scheduler error: {e}")
+
+    def start(self, db: AsyncIOMotorDatabase):
+        """Start the background scheduler"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        """Stop the background scheduler"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # Metrics
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth and wait-time statistics"""
+        now = datetime.utcnow()
+        waiting = [(now - request["created_at"]).total_seconds() for request in self._queued.values()]
+        by_severity: Dict[str, int] = {}
+        for request in self._queued.values():
+            severity = request.get("severity") or "medium"
+            by_severity[severity] = by_severity.get(severity, 0) + 1
+
+        recent = sorted(self._recent_waits)
+        return {
+            "queue_depth": len(self._queued),
+            "queue_by_severity": by_severity,
+            "oldest_wait_seconds": round(max(waiting), 1) if waiting else 0,
+            "average_wait_seconds": round(sum(waiting) / len(waiting), 1) if waiting else 0,
+            "assigned_total": self._assigned_total,
+            "recent_assignment_wait_seconds": {
+                "samples": len(recent),
+                "average": round(sum(recent) / len(recent), 1) if recent else 0,
+                "p95": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 1) if recent else 0,
+                "max": round(recent[-1], 1) if recent else 0
+            }
+        }
+
+# Global dispatch queue instance
+dispatch_queue = DispatchQueue()
@@ -0,0 +1,305 @@
+"""
+Doctor Stats Service
+Per-doctor dashboard counters in ``doctor_stats``, updated in the same transaction
+as the appointment write and periodically reconciled against the appointments
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from ..core.config import settings
+from ..core.database import db as database
+
+logger = logging.getLogger(__name__)
+
+DAY_FORMAT = "%Y-%m-%d"
+
+# Statuses counted as upcoming on the dashboard
+UPCOMING_STATUSES = ["pending", "confirmed"]
+
+# Appointments that count on the dashboard; blocked slots have no patient and are not bookings
+COUNTED_APPOINTMENTS = {"status": {"$ne": "blocked"}, "patient_id": {"$ne": None}}
+
+
+def _day_key(appointment_date: Any) -> Optional[str]:
+    """Bookings store the date as "YYYY-MM-DD"; older records used datetimes"""
+    if isinstance(appointment_date, datetime):
+        return appointment_date.strftime(DAY_FORMAT)
+    return appointment_date or None
+
+
+class DoctorStatsService:
+    def __init__(self):
+        self.reconcile_seconds = settings.doctor_stats_reconcile_hours * 3600
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now().strftime(DAY_FORMAT)
+
+    def _contribution(self, appointment: Optional[Dict[str, Any]], today: str) -> Dict[str, float]:
+        """Counter values one appointment adds to its doctor's stats"""
+        if not appointment:
+            return {}
+        status = appointment.get("status") or "pending"
+        contribution = {f"status_counts.{status}": 1}
+        if status == "completed":
+            contribution["total_earnings"] = appointment.get("consultation_fee") or 0
+
+        # Only today and later are kept per day; past days are never read
+        day = _day_key(appointment.get("appointment_date"))
+        if day and day >= today:
+            contribution[f"by_date.{day}.{status}"] = 1
+        return contribution
+
+    async def _apply_change(
+        self,
+        db: AsyncIOMotorDatabase,
+        doctor_id: ObjectId,
+        before: Optional[Dict[str, Any]],
+        after: Optional[Dict[str, Any]],
+        extra: Optional[Dict[str, float]] = None,
+        session=None
+    ):
+        """Move an appointment's contribution from its old state to its new one"""
+        today = self._today()
+        increments = dict(extra or {})
+        for field, value in self._contribution(after, today).items():
+            increments[field] = increments.get(field, 0) + value
+        for field, value in self._contribution(before, today).items():
+            increments[field] = increments.get(field, 0) - value
+        increments = {field: value for field, value in increments.items() if value}
+        if not increments:
+            return
+
+        await db.doctor_stats.update_one(
+            {"_id": doctor_id},
+            {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+            session=session
+        )
+
+    # Transactional writes
+
+    async def create_appointment(self, db: AsyncIOMotorDatabase, appointment: Dict[str, Any]) -> ObjectId:
+        """
+        Insert an appointment and count it on the doctor's dashboard in one transaction
+
+        Returns:
+            The inserted appointment ID
+        """
+        appointment.setdefault("_id", ObjectId())
+
+        async def work(session):
+            await db.appointments.insert_one(appointment, session=session)
+
+            # Exact distinct-patient set: only the first booking adds a patient
+            seen = await db.doctor_patients.update_one(
+                {"doctor_id": appointment["doctor_id"], "patient_id": appointment["patient_id"]},
+                {"$inc": {"appointments": 1}, "$setOnInsert": {"first_seen_at": appointment.get("created_at")}},
+                upsert=True,
+                session=session
+            )
+            extra = {"total_appointments": 1}
+            if seen.upserted_id is not None:
+                extra["total_patients"] = 1
+
+            await self._apply_change(db, appointment["doctor_id"], None, appointment, extra=extra, session=session)
+
+        async with await database.client.start_session() as session:
+            await session.with_transaction(work)
+        return appointment["_id"]
+
+    async def update_appointment(
+        self,
+        db: AsyncIOMotorDatabase,
+        appointment_id: ObjectId,
+        update_fields: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Update an appointment and adjust its doctor's counters in one transaction
+
+        The counters are moved from the document as it was at write time, so
+        concurrent updates of the same appointment cannot skew them.
+
+        Returns:
+            The updated appointment, or None if it does not exist
+        """
+        async def work(session):
+            before = await db.appointments.find_one_and_update(
+                {"_id": appointment_id},
+                {"$set": update_fields},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if before is None:
+                return None
+            after = {**before, **update_fields}
+            await self._apply_change(db, before["doctor_id"], before, after, session=session)
+            return after
+
+        async with await database.client.start_session() as session:
+            return await session.with_transaction(work)
+
+    # Reads
+
+    async def get_stats(self, db: AsyncIOMotorDatabase, doctor_id: ObjectId) -> Dict[str, Any]:
+        """Dashboard counters for one doctor, built on first use"""
+        stats = await db.doctor_stats.find_one({"_id": doctor_id})
+        if stats is None:
+            stats = await self.reconcile(db, doctor_id)
+
+        today = self._today()
+        status_counts = stats.get("status_counts", {})
+        by_date = stats.get("by_date", {})
+        return {
+            "total_appointments": stats.get("total_appointments", 0),
+            "today_appointments": sum(by_date.get(today, {}).values()),
+            "upcoming_appointments": sum(
+                counts.get(status, 0)
+                for day, counts in by_date.items() if day > today
+                for status in UPCOMING_STATUSES
+            ),
+            "completed_appointments": status_counts.get("completed", 0),
+            "pending_appointments": status_counts.get("pending", 0),
+            "total_patients": stats.get("total_patients", 0),
+            "total_earnings": float(stats.get("total_earnings", 0))
+        }
+
+    # Reconciliation
+
+    async def reconcile(self, db: AsyncIOMotorDatabase, doctor_id: ObjectId) -> Dict[str, Any]:
+        """
+        Recompute one doctor's counters and patient set from the appointments
+
+        Runs in a transaction so bookings landing meanwhile either wait for it
+        or are retried on top of the rebuilt counters.
+
+        Returns:
+            The rebuilt doctor_stats document
+        """
+        today = self._today()
+
+        async def work(session):
+            result = await db.appointments.aggregate([
+                {"$match": {"doctor_id": doctor_id, **COUNTED_APPOINTMENTS}},
+                {"$facet": {
+                    "statuses": [
+                        {"$group": {
+                            "_id": {"$ifNull": ["$status", "pending"]},
+                            "count": {"$sum": 1},
+                            "fees": {"$sum": "$consultation_fee"}
+                        }}
+                    ],
+                    "days": [
+                        {"$project": {
+                            "status": {"$ifNull": ["$status", "pending"]},
+                            "day": {"$cond": [
+                                {"$eq": [{"$type": "$appointment_date"}, "date"]},
+                                {"$dateToString": {"format": DAY_FORMAT, "date": "$appointment_date"}},
+                                "$appointment_date"
+                            ]}
+                        }},
+                        {"$match": {"day": {"$gte": today}}},
+                        {"$group": {"_id": {"day": "$day", "status": "$status"}, "count": {"$sum": 1}}}
+                    ],
+                    "patients": [
+                        {"$group": {
+                            "_id": "$patient_id",
+                            "appointments": {"$sum": 1},
+                            "first_seen_at": {"$min": "$created_at"}
+                        }}
+                    ]
+                }}
+            ], session=session).to_list(1)
+            facets = result[0] if result else {"statuses": [], "days": [], "patients": []}
+
+            status_counts = {row["_id"]: row["count"] for row in facets["statuses"]}
+            completed = next((row for row in facets["statuses"] if row["_id"] == "completed"), None)
+            by_date: Dict[str, Dict[str, int]] = {}
+            for row in facets["days"]:
+                by_date.setdefault(row["_id"]["day"], {})[row["_id"]["status"]] = row["count"]
+
+            await db.doctor_patients.delete_many({"doctor_id": doctor_id}, session=session)
+            if facets["patients"]:
+                await db.doctor_patients.insert_many([
+                    {
+                        "doctor_id": doctor_id,
+                        "patient_id": row["_id"],
+                        "appointments": row["appointments"],
+                        "first_seen_at": row["first_seen_at"]
+                    }
+                    for row in facets["patients"]
+                ], session=session)
+
+            stats = {
+                "_id": doctor_id,
+                "total_appointments": sum(status_counts.values()),
+                "status_counts": status_counts,
+                "by_date": by_date,
+                "total_patients": len(facets["patients"]),
+                "total_earnings": completed["fees"] if completed else 0,
+                "updated_at": datetime.utcnow(),
+                "reconciled_at": datetime.utcnow()
+            }
+            await db.doctor_stats.replace_one({"_id": doctor_id}, stats, upsert=True, session=session)
+            return stats
+
+        async with await database.client.start_session() as session:
+            return await session.with_transaction(work)
+
+    @staticmethod
+    def _counters(stats: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "total_appointments": stats.get("total_appointments", 0),
+            "total_patients": stats.get("total_patients", 0),
+            "status_counts": {status: count for status, count in stats.get("status_counts", {}).items() if count}
+        }
+
+    async def reconcile_all(self, db: AsyncIOMotorDatabase):
+        """Reconcile every doctor with appointments, correcting any drift"""
+        doctor_ids = set(await db.appointments.distinct("doctor_id", COUNTED_APPOINTMENTS))
+        doctor_ids.update(await db.doctor_stats.distinct("_id"))
+        drifted = 0
+        for doctor_id in doctor_ids:
+            before = await db.doctor_stats.find_one({"_id": doctor_id})
+            stats = await self.reconcile(db, doctor_id)
+            if before is None or self._counters(before) != self._counters(stats):
+                drifted += 1
+        logger.info(f"Reconciled dashboard stats for {len(doctor_ids)} doctors ({drifted} corrected)")
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        # Counters are kept up to date on write and built on first read, so the first
+        # pass can wait; a random offset keeps restarting workers from reconciling at once
+        await asyncio.sleep(random.uniform(0.5, 1.0) * self.reconcile_seconds)
+        while True:
+            try:
+                await self.reconcile_all(db)
+            except Exception as e:
+                logger.error(f"Doctor stats reconciliation failed: {e}")
+            await asyncio.sleep(self.reconcile_seconds)
+
+    def start(self, db: AsyncIOMotorDatabase):
+        """Start the periodic reconciliation job"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        """Stop the periodic reconciliation job"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global doctor stats service instance
+doctor_stats_service = DoctorStatsService()
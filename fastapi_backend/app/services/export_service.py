@@ -0,0 +1,179 @@
+"""
+Export Service
+Streams whole admin collections as gzip-compressed CSV or NDJSON straight from a
+Mongo cursor, so memory stays constant however many rows are exported
+"""
+
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# gzip container (zlib wbits 16 + 15)
+GZIP_WBITS = 31
+
+# Uncompressed bytes gathered before each compress call
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+# Exportable collections with the columns written for each; never secrets
+EXPORTS: Dict[str, Dict[str, Any]] = {
+    "users": {
+        "collection": "users",
+        "fields": ["_id", "email", "full_name", "phone", "gender", "date_of_birth", "address",
+                   "is_google_user", "is_active", "created_at", "updated_at"]
+    },
+    "doctors": {
+        "collection": "doctors",
+        "fields": ["_id", "email", "full_name", "phone", "specialization", "experience_years",
+                   "license_number", "clinic_address", "consultation_fee", "is_verified",
+                   "is_active", "created_at", "updated_at"]
+    },
+    "orders": {
+        "collection": "orders",
+        "fields": ["_id", "order_number", "user_id", "status", "payment_status", "payment_method",
+                   "total_amount", "discount_amount", "tax_amount", "shipping_amount", "final_amount",
+                   "shipping_address", "tracking_number", "estimated_delivery", "delivered_at",
+                   "created_at", "updated_at"]
+    },
+    "appointments": {
+        "collection": "appointments",
+        "fields": ["_id", "patient_id", "doctor_id", "appointment_date", "appointment_time",
+                   "duration", "type", "status", "consultation_fee", "payment_status",
+                   "is_online", "created_at", "updated_at"]
+    },
+    "emergency-requests": {
+        "collection": "emergency_requests",
+        "fields": ["_id", "request_number", "user_id", "emergency_type", "severity", "status",
+                   "address", "location", "contact_phone", "ambulance_id", "estimated_arrival",
+                   "created_at", "updated_at", "completed_at"]
+    },
+    "contacts": {
+        "collection": "contacts",
+        "fields": ["_id", "name", "email", "phone", "subject", "department", "priority",
+                   "status", "assigned_to", "created_at", "updated_at", "resolved_at"]
+    }
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (ObjectId, datetime)):
+        return _json_default(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    return value
+
+
+class ExportService:
+    def __init__(self):
+        self.batch_size = settings.export_batch_size
+
+    def build_query(
+        self,
+        status: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Filter shared by every export"""
+        query: Dict[str, Any] = {}
+        if status:
+            query["status"] = status
+        if created_from or created_to:
+            query["created_at"] = {}
+            if created_from:
+                query["created_at"]["$gte"] = created_from
+            if created_to:
+                query["created_at"]["$lt"] = created_to
+        return query
+
+    async def _rows(self, db: AsyncIOMotorDatabase, export: Dict[str, Any], query: Dict[str, Any], export_format: str) -> AsyncIterator[str]:
+        fields: List[str] = export["fields"]
+        cursor = db[export["collection"]].find(
+            query,
+            {field: 1 for field in fields}
+        ).sort("_id", 1).batch_size(self.batch_size)
+
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            async for document in cursor:
+                writer.writerow([_csv_value(document.get(field)) for field in fields])
+                if buffer.tell() >= CHUNK_SIZE:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            lines = []
+            size = 0
+            async for document in cursor:
+                line = json.dumps({field: document.get(field) for field in fields}, default=_json_default)
+                lines.append(line)
+                size += len(line) + 1
+                if size >= CHUNK_SIZE:
+                    yield "\n".join(lines) + "\n"
+                    lines = []
+                    size = 0
+            if lines:
+                yield "\n".join(lines) + "\n"
+
+    async def stream(
+        self,
+        db: AsyncIOMotorDatabase,
+        name: str,
+        export_format: str,
+        query: Dict[str, Any]
+    ) -> AsyncIterator[bytes]:
+        """
+        Gzip-compressed export body, produced chunk by chunk
+
+        Args:
+            name: Export name (a key of EXPORTS)
+            export_format: "csv" or "ndjson"
+            query: Mongo filter for the rows
+
+        Yields:
+            Compressed bytes, ready to be sent with Content-Encoding: gzip
+        """
+        export = EXPORTS[name]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+        rows = 0
+        started = datetime.utcnow()
+
+        async for chunk in self._rows(db, export, query, export_format):
+            rows += chunk.count("\n")
+            compressed = compressor.compress(chunk.encode("utf-8"))
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+        elapsed = (datetime.utcnow() - started).total_seconds()
+        logger.info(f"Exported {name} as {export_format}: ~{rows} lines in {elapsed:.1f}s")
+
+# Global export service instance
+export_service = ExportService()
@@ -0,0 +1,172 @@
+"""
+Image Processing Service
+Generates resized, EXIF-stripped WebP/AVIF variants of catalog images in a process pool
+"""
+
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from ..core.config import settings
+from .azure_storage import azure_storage
+
+logger = logging.getLogger(__name__)
+
+# Longest edge (in pixels) for each generated size
+VARIANT_SIZES = {
+    "thumbnail": 150,
+    "small": 320,
+    "medium": 640,
+}
+
+AVIF_SUPPORTED = features.check("avif")
+
+
+def _encode(image: Image.Image, image_format: str, **params) -> bytes:
+    """Encode an image without carrying over EXIF metadata"""
+    buffer = io.BytesIO()
+    icc_profile = image.info.get("icc_profile")
+    if icc_profile:
+        params["icc_profile"] = icc_profile
+    image.save(buffer, format=image_format, **params)
+    return buffer.getvalue()
+
+
+def render_image_variants(content: bytes) -> Dict[str, Tuple[bytes, str, str]]:
+    """Render all variants of an image.
+
+    Runs inside a worker process, so it only takes and returns picklable data.
+
+    Returns:
+        Mapping of variant name to (data, content_type, file_extension)
+    """
+    try:
+        source = Image.open(io.BytesIO(content))
+        source_format = source.format
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(source)
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Unsupported or corrupt image: {e}")
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    variants: Dict[str, Tuple[bytes, str, str]] = {}
+
+    # Full-size original, re-encoded so that EXIF (GPS, device info) is stripped
+    if source_format == "JPEG":
+        variants["original"] = (
+            _encode(image.convert("RGB"), "JPEG", quality=90, optimize=True),
+            "image/jpeg",
+            "jpg",
+        )
+    elif source_format == "PNG":
+        variants["original"] = (_encode(image, "PNG", optimize=True), "image/png", "png")
+    else:
+        variants["original"] = (_encode(image, "WEBP", quality=90), "image/webp", "webp")
+
+    for size_name, max_edge in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        variants[f"{size_name}_webp"] = (
+            _encode(resized, "WEBP", quality=80, method=4),
+            "image/webp",
+            "webp",
+        )
+        if AVIF_SUPPORTED:
+            variants[f"{size_name}_avif"] = (
+                _encode(resized, "AVIF", quality=60),
+                "image/avif",
+                "avif",
+            )
+
+    return variants
+
+
+class ImageProcessingService:
+    def __init__(self):
+        self.max_workers = settings.image_worker_processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Lazily start the worker pool so importing the module stays cheap"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def render_variants(self, content: bytes) -> Dict[str, Tuple[bytes, str, str]]:
+        """Render image variants off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), render_image_variants, content)
+
+    async def upload_variants(self, content: bytes, file_name: str, folder: str) -> Dict[str, str]:
+        """
+        Render and upload every variant of an image
+
+        Args:
+            content: Raw image bytes as uploaded
+            file_name: Original file name (used for the blob base name)
+            folder: Folder path in the container
+
+        Returns:
+            Mapping of variant name to blob URL
+        """
+        variants = await self.render_variants(content)
+        base_name = file_name.rsplit('.', 1)[0] if '.' in file_name else file_name
+
+        names = list(variants.keys())
+        urls = await asyncio.gather(*[
+            azure_storage.upload_file(
+                file_content=variants[name][0],
+                file_name=f"{base_name}_{name}.{variants[name][2]}",
+                content_type=variants[name][1],
+                folder=folder
+            )
+            for name in names
+        ])
+
+        logger.info(f"Uploaded {len(names)} image variants for {file_name}")
+        return dict(zip(names, urls))
+
+    @staticmethod
+    def accepts_avif(accept: Optional[str]) -> bool:
+        """Whether a client's Accept header lists AVIF"""
+        return bool(accept) and "image/avif" in accept
+
+    def select_url(
+        self,
+        variants: Optional[Dict[str, str]],
+        size: str,
+        fallback: Optional[str] = None,
+        prefer_avif: bool = False
+    ) -> Optional[str]:
+        """
+        Pick the URL for the requested display size, falling back to the original image
+
+        Args:
+            variants: Variant name -> URL, as stored by upload_variants
+            size: thumbnail, small, medium or original
+            fallback: URL to use when the medicine has no variants
+            prefer_avif: Serve the smaller AVIF variant when it exists; WebP otherwise
+        """
+        if not variants:
+            return fallback
+        if size == "original":
+            return variants.get("original", fallback)
+        if prefer_avif and variants.get(f"{size}_avif"):
+            return variants[f"{size}_avif"]
+        return variants.get(f"{size}_webp") or variants.get("original") or fallback
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global image processing service instance
+image_service = ImageProcessingService()
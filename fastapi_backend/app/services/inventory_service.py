@@ -0,0 +1,312 @@
+"""
+Inventory Service
+Append-only stock movement log with incrementally maintained per-medicine counters
+and low-stock summary
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_ID = "medicines"
+
+class InventoryEventReason(str):
+    CHECKOUT = "checkout"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+
+class StockStatus(str):
+    IN_STOCK = "in_stock"
+    LOW_STOCK = "low_stock"
+    OUT_OF_STOCK = "out_of_stock"
+
+# Statuses tracked in the summary counters and watchlist
+WATCHED_STATUSES = [StockStatus.LOW_STOCK, StockStatus.OUT_OF_STOCK]
+
+class InventoryService:
+    def __init__(self):
+        self.low_stock_threshold = settings.low_stock_threshold
+
+    def stock_status(self, stock_quantity: Optional[int]) -> str:
+        """Classify a stock level"""
+        stock_quantity = stock_quantity or 0
+        if stock_quantity <= 0:
+            return StockStatus.OUT_OF_STOCK
+        if stock_quantity <= self.low_stock_threshold:
+            return StockStatus.LOW_STOCK
+        return StockStatus.IN_STOCK
+
+    async def record_movements(
+        self,
+        db: AsyncIOMotorDatabase,
+        movements: List[Dict[str, Any]],
+        reason: str,
+        order_id: Optional[ObjectId] = None,
+        actor_id: Optional[ObjectId] = None,
+        session=None
+    ):
+        """
+        Append stock movements to the event log and fold them into the counters
+
+        Args:
+            movements: One dict per medicine with medicine_id, name, stock_before and delta;
+                stock_before is None for a medicine that was not tracked before
+            reason: Why stock moved (see InventoryEventReason)
+            order_id: Order that caused the movement, if any
+            actor_id: User who caused the movement, if any
+            session: Session of the surrounding transaction, if any
+        """
+        if not movements:
+            return
+
+        now = datetime.utcnow()
+        events = []
+        counter_updates = []
+        summary_delta = {status: 0 for status in WATCHED_STATUSES}
+
+        for movement in movements:
+            is_new = movement["stock_before"] is None
+            stock_before = movement["stock_before"] or 0
+            stock_after = stock_before + movement["delta"]
+            status_before = None if is_new else self.stock_status(stock_before)
+            status_after = self.stock_status(stock_after)
+
+            events.append({
+                "medicine_id": movement["medicine_id"],
+                "reason": reason,
+                "delta": movement["delta"],
+                "stock_before": stock_before,
+                "stock_after": stock_after,
+                "order_id": order_id,
+                "actor_id": actor_id,
+                "created_at": now
+            })
+
+            counter_increments = {"event_count": 1}
+            if reason == InventoryEventReason.CHECKOUT:
+                counter_increments["units_sold"] = -movement["delta"]
+            elif reason == InventoryEventReason.RESTOCK:
+                counter_increments["units_restocked"] = movement["delta"]
+
+            counter_fields = {
+                "name": movement.get("name"),
+                "stock_quantity": stock_after,
+                "status": status_after,
+                "last_event_at": now
+            }
+            if status_after != status_before:
+                counter_fields["status_since"] = now
+                if status_before in summary_delta:
+                    summary_delta[status_before] -= 1
+                if status_after in summary_delta:
+                    summary_delta[status_after] += 1
+                if status_after in WATCHED_STATUSES:
+                    logger.warning(
+                        f"Medicine {movement.get('name') or movement['medicine_id']} is now "
+                        f"{status_after} ({stock_after} left)"
+                    )
+
+            counter_updates.append(UpdateOne(
+                {"_id": movement["medicine_id"]},
+                {"$set": counter_fields, "$inc": counter_increments},
+                upsert=True
+            ))
+
+        await db.inventory_events.insert_many(events, session=session)
+        await db.inventory_counters.bulk_write(counter_updates, ordered=False, session=session)
+        await self._update_summary(db, summary_delta, session=session)
+
+    async def _update_summary(self, db: AsyncIOMotorDatabase, summary_delta: Dict[str, int], session=None):
+        increments = {status: delta for status, delta in summary_delta.items() if delta}
+        if not increments:
+            return
+        await db.inventory_summary.update_one(
+            {"_id": SUMMARY_ID},
+            {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+            session=session
+        )
+
+    async def record_change(
+        self,
+        db: AsyncIOMotorDatabase,
+        medicine_before: Dict[str, Any],
+        stock_after: int,
+        reason: str,
+        actor_id: Optional[ObjectId] = None
+    ):
+        """Record a single medicine's stock change given its document from before the write"""
+        stock_before = medicine_before.get("stock_quantity") or 0
+        if stock_after == stock_before:
+            return
+        await self.record_movements(
+            db,
+            [{
+                "medicine_id": medicine_before["_id"],
+                "name": medicine_before.get("name"),
+                "stock_before": stock_before,
+                "delta": stock_after - stock_before
+            }],
+            reason=reason,
+            actor_id=actor_id
+        )
+
+    async def record_adjustment(
+        self,
+        db: AsyncIOMotorDatabase,
+        medicine_before: Dict[str, Any],
+        medicine_after: Dict[str, Any],
+        actor_id: Optional[ObjectId] = None
+    ):
+        """
+        Log an admin edit of a medicine and recompute its counter from the edited document
+
+        Catalog edits set stock and is_active directly, so the counter is derived
+        from the document rather than from a delta against what it held before.
+        """
+        stock_before = medicine_before.get("stock_quantity") or 0
+        stock_after = medicine_after.get("stock_quantity") or 0
+        changed = stock_after != stock_before
+        if changed:
+            await db.inventory_events.insert_one({
+                "medicine_id": medicine_after["_id"],
+                "reason": InventoryEventReason.ADJUSTMENT,
+                "delta": stock_after - stock_before,
+                "stock_before": stock_before,
+                "stock_after": stock_after,
+                "order_id": None,
+                "actor_id": actor_id,
+                "created_at": datetime.utcnow()
+            })
+        await self.sync(db, medicine_after, event_count=int(changed))
+
+    async def sync(self, db: AsyncIOMotorDatabase, medicine: Dict[str, Any], event_count: int = 0):
+        """Set one medicine's counter from its document and move the summary by its status change"""
+        if not medicine.get("is_active", True):
+            await self.forget(db, medicine["_id"])
+            return
+
+        stock_quantity = medicine.get("stock_quantity") or 0
+        status = self.stock_status(stock_quantity)
+        now = datetime.utcnow()
+        # Pipeline update: "$status" is the stored status, read in the same atomic write
+        previous = await db.inventory_counters.find_one_and_update(
+            {"_id": medicine["_id"]},
+            [{"$set": {
+                "name": {"$literal": medicine.get("name")},
+                "stock_quantity": stock_quantity,
+                "status": status,
+                "status_since": {"$cond": [{"$eq": ["$status", status]}, "$status_since", now]},
+                "event_count": {"$add": [{"$ifNull": ["$event_count", 0]}, event_count]},
+                "last_event_at": now if event_count else "$last_event_at"
+            }}],
+            projection={"status": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+
+        status_before = previous.get("status") if previous else None
+        if status_before == status:
+            return
+        if status in WATCHED_STATUSES:
+            logger.warning(
+                f"Medicine {medicine.get('name') or medicine['_id']} is now {status} ({stock_quantity} left)"
+            )
+        summary_delta = {watched: 0 for watched in WATCHED_STATUSES}
+        if status_before in summary_delta:
+            summary_delta[status_before] -= 1
+        if status in summary_delta:
+            summary_delta[status] += 1
+        await self._update_summary(db, summary_delta)
+
+    async def track_new(self, db: AsyncIOMotorDatabase, medicine: Dict[str, Any], actor_id: Optional[ObjectId] = None):
+        """Start tracking a newly created medicine with its opening stock"""
+        await self.record_movements(
+            db,
+            [{
+                "medicine_id": medicine["_id"],
+                "name": medicine.get("name"),
+                "stock_before": None,
+                "delta": medicine.get("stock_quantity") or 0
+            }],
+            reason=InventoryEventReason.RESTOCK,
+            actor_id=actor_id
+        )
+
+    async def forget(self, db: AsyncIOMotorDatabase, medicine_id: ObjectId):
+        """Drop a deactivated medicine from the counters and summary"""
+        counter = await db.inventory_counters.find_one_and_delete({"_id": medicine_id})
+        if counter and counter.get("status") in WATCHED_STATUSES:
+            await self._update_summary(db, {counter["status"]: -1})
+
+    async def rebuild(self, db: AsyncIOMotorDatabase):
+        """Recompute counters and summary from the catalog (initial load or reconciliation)"""
+        summary = {status: 0 for status in WATCHED_STATUSES}
+        now = datetime.utcnow()
+        batch = []
+        cursor = db.medicines.find({"is_active": True}, {"name": 1, "stock_quantity": 1}).batch_size(5000)
+        async for medicine in cursor:
+            status = self.stock_status(medicine.get("stock_quantity"))
+            if status in summary:
+                summary[status] += 1
+            batch.append(UpdateOne(
+                {"_id": medicine["_id"]},
+                {
+                    "$set": {
+                        "name": medicine.get("name"),
+                        "stock_quantity": medicine.get("stock_quantity") or 0,
+                        "status": status
+                    },
+                    "$setOnInsert": {"status_since": now, "event_count": 0}
+                },
+                upsert=True
+            ))
+            if len(batch) >= 1000:
+                await db.inventory_counters.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await db.inventory_counters.bulk_write(batch, ordered=False)
+
+        await db.inventory_summary.replace_one(
+            {"_id": SUMMARY_ID},
+            {**summary, "updated_at": now},
+            upsert=True
+        )
+        logger.info(f"Inventory counters rebuilt: {summary}")
+
+    async def ensure_summary(self, db: AsyncIOMotorDatabase):
+        """Build the counters once if they have never been computed"""
+        try:
+            if not await db.inventory_summary.find_one({"_id": SUMMARY_ID}, {"_id": 1}):
+                await self.rebuild(db)
+        except Exception as e:
+            logger.error(f"Could not build inventory counters: {e}")
+
+    async def get_summary(self, db: AsyncIOMotorDatabase) -> Dict[str, int]:
+        """Precomputed low-stock and out-of-stock counts"""
+        summary = await db.inventory_summary.find_one({"_id": SUMMARY_ID}) or {}
+        return {status: summary.get(status, 0) for status in WATCHED_STATUSES}
+
+    async def get_watchlist(
+        self,
+        db: AsyncIOMotorDatabase,
+        status: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Medicines currently low or out of stock, lowest stock first"""
+        statuses = [status] if status else WATCHED_STATUSES
+        cursor = db.inventory_counters.find(
+            {"status": {"$in": statuses}}
+        ).sort("stock_quantity", 1).skip(skip).limit(limit)
+        return await cursor.to_list(None)
+
+# Global inventory service instance
+inventory_service = InventoryService()
@@ -0,0 +1,170 @@
+"""
+Migration Service
+Versioned normalization of stored documents: every migrated document carries a
+``schema_version``, a batched idempotent runner brings older documents up to
+date once, and read adapters cover stragglers the runner has not reached yet
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Legacy doctor field each current field may still be stored under
+LEGACY_DOCTOR_FIELDS: Dict[str, str] = {
+    "full_name": "name",
+    "specialization": "specializations",
+    "experience_years": "experience",
+    "qualification": "qualifications",
+    "clinic_address": "address"
+}
+
+
+def _created_time(document: Dict[str, Any]) -> datetime:
+    """Creation time of a document without timestamps, taken from its ObjectId"""
+    document_id = document.get("_id")
+    if hasattr(document_id, "generation_time"):
+        # Stored timestamps are naive UTC
+        return document_id.generation_time.replace(tzinfo=None)
+    return datetime.utcnow()
+
+
+def _doctor_v1(doctor: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy legacy doctor fields to their current names and fill timestamps"""
+    changes = {}
+    for field, legacy in LEGACY_DOCTOR_FIELDS.items():
+        if legacy in doctor and field not in doctor:
+            value = doctor[legacy]
+            if field == "specialization":
+                value = value[0] if value else ""
+            changes[field] = value
+    for field in ("created_at", "updated_at"):
+        if field not in doctor:
+            changes[field] = _created_time(doctor)
+    return changes
+
+
+def _medicine_v1(medicine: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill timestamps missing from medicines created before they were stored"""
+    return {
+        field: _created_time(medicine)
+        for field in ("created_at", "updated_at")
+        if field not in medicine
+    }
+
+
+# Ordered (version, step) migrations per collection; a step returns the fields to $set
+MIGRATIONS: Dict[str, List[Tuple[int, Callable[[Dict[str, Any]], Dict[str, Any]]]]] = {
+    "doctors": [(1, _doctor_v1)],
+    "medicines": [(1, _medicine_v1)]
+}
+
+# Schema version new documents are written with
+CURRENT_SCHEMA_VERSIONS: Dict[str, int] = {
+    collection: steps[-1][0] for collection, steps in MIGRATIONS.items()
+}
+
+
+class MigrationService:
+    def is_current(self, collection: str, document: Dict[str, Any]) -> bool:
+        """Whether a document is already at the current schema version"""
+        return document.get("schema_version", 0) >= CURRENT_SCHEMA_VERSIONS[collection]
+
+    def upgrade(self, collection: str, document: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fields to $set to bring a document to the current schema version
+
+        Args:
+            collection: Collection the document belongs to
+            document: Stored document, possibly partially projected
+
+        Returns:
+            The changes, including the new schema_version; empty if already current
+        """
+        version = document.get("schema_version", 0)
+        changes = {}
+        for step_version, step in MIGRATIONS[collection]:
+            if step_version > version:
+                changes.update(step({**document, **changes}))
+                version = step_version
+        if changes or version != document.get("schema_version", 0):
+            changes["schema_version"] = version
+        return changes
+
+    def normalize(self, collection: str, document: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Read adapter: apply pending migrations in memory to an un-migrated document
+
+        Documents at the current version are returned untouched, so hot read
+        paths pay only a version check once the runner has completed.
+        """
+        if document is None or self.is_current(collection, document):
+            return document
+        document.update(self.upgrade(collection, document))
+        return document
+
+    def normalize_doctor(self, doctor: Dict[str, Any]) -> Dict[str, Any]:
+        """Read adapter for doctor documents"""
+        return self.normalize("doctors", doctor)
+
+    def with_schema_version(self, collection: str, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Stamp the current schema version on a document about to be inserted"""
+        document["schema_version"] = CURRENT_SCHEMA_VERSIONS[collection]
+        return document
+
+    async def migrate_collection(
+        self,
+        db: AsyncIOMotorDatabase,
+        collection: str,
+        batch_size: int = 1000
+    ) -> int:
+        """
+        Bring every document of a collection to the current schema version
+
+        Idempotent: only documents below the current version are read, and each
+        update is conditional on the document still being below it, so reruns
+        and concurrent runners do not rewrite migrated documents.
+
+        Returns:
+            Number of documents migrated
+        """
+        target = CURRENT_SCHEMA_VERSIONS[collection]
+        pending = {"schema_version": {"$not": {"$gte": target}}}
+        cursor = db[collection].find(pending).batch_size(batch_size)
+        batch = []
+        migrated = 0
+        async for document in cursor:
+            batch.append(UpdateOne(
+                {"_id": document["_id"], **pending},
+                {"$set": self.upgrade(collection, document)}
+            ))
+            if len(batch) >= batch_size:
+                result = await db[collection].bulk_write(batch, ordered=False)
+                migrated += result.modified_count
+                batch = []
+        if batch:
+            result = await db[collection].bulk_write(batch, ordered=False)
+            migrated += result.modified_count
+        return migrated
+
+    async def migrate(self, db: AsyncIOMotorDatabase, batch_size: int = 1000) -> Dict[str, int]:
+        """Run pending migrations on every versioned collection"""
+        results = {}
+        for collection in MIGRATIONS:
+            try:
+                results[collection] = await self.migrate_collection(db, collection, batch_size)
+                if results[collection]:
+                    logger.info(
+                        f"Migrated {results[collection]} {collection} to schema version "
+                        f"{CURRENT_SCHEMA_VERSIONS[collection]}"
+                    )
+            except Exception as e:
+                logger.error(f"Could not migrate {collection}: {e}")
+        return results
+
+# Global migration service instance
+migration_service = MigrationService()
@@ -0,0 +1,222 @@
+"""
+Rollup Service
+Per-day counters in ``daily_stats``, incremented at write time and rebuilt by a
+backfill job, so trend charts read one small document per day
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+DAY_FORMAT = "%Y-%m-%d"
+
+# Top-level counters of a daily_stats document
+COUNTER_FIELDS = [
+    "signups", "doctor_signups",
+    "bookings_total",
+    "orders", "food_orders",
+    "revenue", "medicine_revenue", "food_revenue",
+    "emergencies"
+]
+
+
+def day_key(moment: Optional[datetime] = None) -> str:
+    """The daily_stats document ID for a moment (UTC day)"""
+    return (moment or datetime.utcnow()).strftime(DAY_FORMAT)
+
+
+class RollupService:
+    async def increment(
+        self,
+        db: AsyncIOMotorDatabase,
+        increments: Dict[str, Any],
+        moment: Optional[datetime] = None
+    ):
+        """
+        Add to the counters of one day
+
+        Rollups are secondary data: failures are logged, never raised, so they
+        cannot break the write they describe.
+        """
+        try:
+            await db.daily_stats.update_one(
+                {"_id": day_key(moment)},
+                {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to update daily stats {increments}: {e}")
+
+    # Write-time hooks
+
+    async def record_signup(self, db: AsyncIOMotorDatabase, is_doctor: bool = False):
+        await self.increment(db, {"doctor_signups" if is_doctor else "signups": 1})
+
+    async def record_booking(self, db: AsyncIOMotorDatabase, appointment: Dict[str, Any]):
+        status = appointment.get("status", "pending")
+        await self.increment(
+            db,
+            {"bookings_total": 1, f"bookings.{status}": 1},
+            moment=appointment.get("created_at")
+        )
+
+    async def record_booking_status(self, db: AsyncIOMotorDatabase, appointment: Dict[str, Any], new_status: str):
+        """Move a booking between status buckets of the day it was made"""
+        old_status = appointment.get("status", "pending")
+        if old_status == new_status or not appointment.get("created_at"):
+            return
+        await self.increment(
+            db,
+            {f"bookings.{old_status}": -1, f"bookings.{new_status}": 1},
+            moment=appointment["created_at"]
+        )
+
+    async def record_order(self, db: AsyncIOMotorDatabase, amount: float, is_food: bool = False):
+        """Count a placed order; called after the checkout transaction commits"""
+        if is_food:
+            increments = {"food_orders": 1, "food_revenue": amount, "revenue": amount}
+        else:
+            increments = {"orders": 1, "medicine_revenue": amount, "revenue": amount}
+        await self.increment(db, increments)
+
+    async def record_emergency(self, db: AsyncIOMotorDatabase, request: Dict[str, Any]):
+        severity = request.get("severity") or "medium"
+        await self.increment(
+            db,
+            {"emergencies": 1, f"emergencies_by_severity.{severity}": 1},
+            moment=request.get("created_at")
+        )
+
+    # Reads
+
+    async def get_trends(self, db: AsyncIOMotorDatabase, days: int) -> List[Dict[str, Any]]:
+        """One entry per day for the last ``days`` days, oldest first, zero-filled"""
+        today = datetime.utcnow()
+        keys = [day_key(today - timedelta(days=offset)) for offset in range(days - 1, -1, -1)]
+        documents = {
+            document["_id"]: document
+            async for document in db.daily_stats.find({"_id": {"$gte": keys[0], "$lte": keys[-1]}})
+        }
+
+        trends = []
+        for key in keys:
+            document = documents.get(key, {})
+            entry = {"date": key}
+            for field in COUNTER_FIELDS:
+                entry[field] = round(document.get(field, 0), 2)
+            entry["bookings"] = document.get("bookings", {})
+            entry["emergencies_by_severity"] = document.get("emergencies_by_severity", {})
+            trends.append(entry)
+        return trends
+
+    # Backfill
+
+    @staticmethod
+    def _group_by_day(match: Dict[str, Any], extra_group: Optional[Dict[str, Any]] = None, date_field: str = "created_at"):
+        group_id: Dict[str, Any] = {"day": {"$dateToString": {"format": DAY_FORMAT, "date": f"${date_field}"}}}
+        group_id.update(extra_group or {})
+        return [
+            {"$match": match},
+            {"$group": {"_id": group_id, "count": {"$sum": 1}}}
+        ]
+
+    async def backfill(self, db: AsyncIOMotorDatabase, days: int = 90) -> int:
+        """
+        Recompute daily_stats for the last ``days`` days from the source collections
+
+        Each day is replaced wholesale, so the job is idempotent; increments
+        landing while it runs may be overwritten and are restored by the next run.
+
+        Returns:
+            Number of days written
+        """
+        start = (datetime.utcnow() - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        since = {"created_at": {"$gte": start, "$type": "date"}}
+
+        def aggregate(collection: str, pipeline: List[Dict[str, Any]]):
+            return db[collection].aggregate(pipeline).to_list(None)
+
+        signups, doctor_signups, bookings, orders, food_orders, emergencies = await asyncio.gather(
+            aggregate("users", self._group_by_day(since)),
+            aggregate("doctors", self._group_by_day(since)),
+            aggregate("appointments", self._group_by_day(since, {"status": "$status"})),
+            aggregate("orders", [
+                {"$match": since},
+                {"$group": {
+                    "_id": {"day": {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at"}}},
+                    "count": {"$sum": 1},
+                    "amount": {"$sum": "$final_amount"}
+                }}
+            ]),
+            aggregate("food_orders", [
+                {"$match": since},
+                {"$group": {
+                    "_id": {"day": {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at"}}},
+                    "count": {"$sum": 1},
+                    "amount": {"$sum": "$total_amount"}
+                }}
+            ]),
+            aggregate("emergency_requests", self._group_by_day(since, {"severity": "$severity"}))
+        )
+
+        stats: Dict[str, Dict[str, Any]] = {}
+
+        def day(key: str) -> Dict[str, Any]:
+            if key not in stats:
+                stats[key] = {field: 0 for field in COUNTER_FIELDS}
+                stats[key].update({"bookings": {}, "emergencies_by_severity": {}})
+            return stats[key]
+
+        for row in signups:
+            day(row["_id"]["day"])["signups"] = row["count"]
+        for row in doctor_signups:
+            day(row["_id"]["day"])["doctor_signups"] = row["count"]
+        for row in bookings:
+            entry = day(row["_id"]["day"])
+            entry["bookings_total"] += row["count"]
+            status = row["_id"].get("status") or "pending"
+            entry["bookings"][status] = entry["bookings"].get(status, 0) + row["count"]
+        for row in orders:
+            entry = day(row["_id"]["day"])
+            entry["orders"] = row["count"]
+            entry["medicine_revenue"] = row["amount"] or 0
+            entry["revenue"] += row["amount"] or 0
+        for row in food_orders:
+            entry = day(row["_id"]["day"])
+            entry["food_orders"] = row["count"]
+            entry["food_revenue"] = row["amount"] or 0
+            entry["revenue"] += row["amount"] or 0
+        for row in emergencies:
+            entry = day(row["_id"]["day"])
+            entry["emergencies"] += row["count"]
+            severity = row["_id"].get("severity") or "medium"
+            entry["emergencies_by_severity"][severity] = entry["emergencies_by_severity"].get(severity, 0) + row["count"]
+
+        # Days with no activity are written too, clearing stale counters
+        now = datetime.utcnow()
+        for offset in range(days):
+            key = day_key(start + timedelta(days=offset))
+            await db.daily_stats.replace_one(
+                {"_id": key},
+                {**day(key), "updated_at": now, "backfilled_at": now},
+                upsert=True
+            )
+
+        logger.info(f"Backfilled daily stats for {days} days")
+        return days
+
+    async def ensure_backfill(self, db: AsyncIOMotorDatabase):
+        """Backfill once if the rollups have never been built"""
+        try:
+            if not await db.daily_stats.find_one({}, {"_id": 1}):
+                await self.backfill(db)
+        except Exception as e:
+            logger.error(f"Could not backfill daily stats: {e}")
+
+# Global rollup service instance
+rollup_service = RollupService()
@@ -0,0 +1,210 @@
+"""
+Medicine Search Service
+In-process inverted index with prefix matching over the medicine catalog
+"""
+
+import asyncio
+import bisect
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Relevance weight of a term match in each indexed field
+FIELD_WEIGHTS = {
+    "name": 5.0,
+    "brand": 3.0,
+    "composition": 2.0,
+    "category": 1.0,
+}
+
+# Terms shorter than this only match whole tokens, not prefixes
+MIN_PREFIX_LENGTH = 2
+
+# Score multiplier for a prefix match relative to an exact token match
+PREFIX_MATCH_FACTOR = 0.6
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-case and split text into alphanumeric tokens"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class MedicineSearchIndex:
+    def __init__(self):
+        self.refresh_interval = settings.search_index_refresh_seconds
+        self._postings: Dict[str, Dict[str, float]] = {}  # token -> {medicine_id: weight}
+        self._vocabulary: List[str] = []  # sorted tokens for prefix range scans
+        self._doc_tokens: Dict[str, Set[str]] = {}  # medicine_id -> tokens, for removal
+        self._categories: Dict[str, str] = {}
+        self._built_at: Optional[float] = None
+        self._loading_changes: Optional[Dict[str, Optional[Dict[str, Any]]]] = None  # writes during a rebuild
+        self._build_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _document_terms(medicine: Dict[str, Any]) -> Dict[str, float]:
+        """Map each token of a medicine to the weight of its best field"""
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(medicine.get(field)):
+                if weight > terms.get(token, 0.0):
+                    terms[token] = weight
+        return terms
+
+    def _add(self, medicine_id: str, medicine: Dict[str, Any]):
+        terms = self._document_terms(medicine)
+        for token, weight in terms.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocabulary, token)
+            postings[medicine_id] = weight
+        self._doc_tokens[medicine_id] = set(terms)
+        self._categories[medicine_id] = medicine.get("category")
+
+    def _discard(self, medicine_id: str):
+        for token in self._doc_tokens.pop(medicine_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(medicine_id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                    self._vocabulary.pop(index)
+        self._categories.pop(medicine_id, None)
+
+    def remove(self, medicine_id: str):
+        """Drop a medicine from the index"""
+        medicine_id = str(medicine_id)
+        self._discard(medicine_id)
+        if self._loading_changes is not None:
+            self._loading_changes[medicine_id] = None
+
+    def upsert(self, medicine: Dict[str, Any]):
+        """Index a created or updated medicine document"""
+        medicine_id = str(medicine["_id"])
+        self._discard(medicine_id)
+        # Missing is_active counts as active, matching the rebuild query
+        if medicine.get("is_active", True) is not False:
+            self._add(medicine_id, medicine)
+        if self._loading_changes is not None:
+            self._loading_changes[medicine_id] = medicine
+
+    async def rebuild(self, db: AsyncIOMotorDatabase):
+        """Rebuild the whole index from the catalog and swap it in"""
+        async with self._build_lock:
+            started = time.monotonic()
+            fresh = MedicineSearchIndex()
+            projection = {field: 1 for field in FIELD_WEIGHTS}
+            self._loading_changes = {}
+            try:
+                cursor = db.medicines.find({"is_active": {"$ne": False}}, projection).batch_size(5000)
+                async for medicine in cursor:
+                    fresh._add(str(medicine["_id"]), medicine)
+
+                # Writes made locally while the query ran
+                for medicine_id, medicine in self._loading_changes.items():
+                    if medicine is None:
+                        fresh.remove(medicine_id)
+                    else:
+                        fresh.upsert(medicine)
+            finally:
+                self._loading_changes = None
+
+            self._postings = fresh._postings
+            self._vocabulary = fresh._vocabulary
+            self._doc_tokens = fresh._doc_tokens
+            self._categories = fresh._categories
+            self._built_at = time.monotonic()
+            logger.info(
+                f"Medicine search index built: {len(self._doc_tokens)} medicines, "
+                f"{len(self._vocabulary)} terms in {self._built_at - started:.2f}s"
+            )
+
+    async def ensure_fresh(self, db: AsyncIOMotorDatabase):
+        """Build the index on first use and refresh it in the background once stale.
+
+        Local catalog writes are applied immediately through ``upsert``/``remove``;
+        the periodic refresh picks up writes made by other workers.
+        """
+        if self._built_at is None:
+            await self.rebuild(db)
+            return
+
+        is_stale = time.monotonic() - self._built_at > self.refresh_interval
+        if is_stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self.rebuild(db))
+
+    def _match_term(self, term: str) -> Dict[str, float]:
+        """Score medicines matching a single query term exactly or by prefix"""
+        scores: Dict[str, float] = {}
+
+        exact = self._postings.get(term)
+        if exact:
+            scores.update(exact)
+
+        if len(term) < MIN_PREFIX_LENGTH:
+            return scores
+
+        index = bisect.bisect_right(self._vocabulary, term)
+        while index < len(self._vocabulary) and self._vocabulary[index].startswith(term):
+            for medicine_id, weight in self._postings[self._vocabulary[index]].items():
+                prefix_score = weight * PREFIX_MATCH_FACTOR
+                if prefix_score > scores.get(medicine_id, 0.0):
+                    scores[medicine_id] = prefix_score
+            index += 1
+
+        return scores
+
+    def search(self, query: str, category: Optional[str] = None) -> List[str]:
+        """
+        Find medicines matching every term of the query
+
+        Args:
+            query: Free-text search string
+            category: Optional category filter
+
+        Returns:
+            Medicine IDs ordered by relevance
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        scores: Optional[Dict[str, float]] = None
+        for term in terms:
+            term_scores = self._match_term(term)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    medicine_id: score + term_scores[medicine_id]
+                    for medicine_id, score in scores.items()
+                    if medicine_id in term_scores
+                }
+            if not scores:
+                return []
+
+        if category:
+            scores = {
+                medicine_id: score for medicine_id, score in scores.items()
+                if self._categories.get(medicine_id) == category
+            }
+
+        return sorted(scores, key=lambda medicine_id: (-scores[medicine_id], medicine_id))
+
+# Global medicine search index instance
+medicine_search_index = MedicineSearchIndex()
@@ -0,0 +1,358 @@
+"""
+Search Suggestion Service
+In-memory prefix trie over medicine and doctor terms with bounded edit-distance matching
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..core.config import settings
+from .search_service import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Suggestion kinds in display priority order
+SUGGESTION_KINDS = ["medicine", "brand", "composition", "doctor", "specialization"]
+KIND_PRIORITY = {kind: index for index, kind in enumerate(SUGGESTION_KINDS)}
+
+# Kinds that point at one document; the others aggregate many documents
+ENTITY_KINDS = {"medicine", "doctor"}
+
+MAX_KEY_LENGTH = 40
+
+
+def normalize(text: Optional[str]) -> str:
+    """Normalize a phrase to the form stored in the trie"""
+    return " ".join(tokenize(text))[:MAX_KEY_LENGTH]
+
+
+def max_edits_for(query: str) -> int:
+    """Allowed typos grow with query length; very short queries must match exactly"""
+    if len(query) < 3:
+        return 0
+    if len(query) < 6:
+        return 1
+    return 2
+
+
+class TrieNode:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        self.entries: Optional[Set[Tuple[str, str]]] = None  # suggestion keys ending here
+
+
+class Suggestion:
+    __slots__ = ("kind", "text", "entity_id", "refs")
+
+    def __init__(self, kind: str, text: str, entity_id: Optional[str]):
+        self.kind = kind
+        self.text = text
+        self.entity_id = entity_id
+        self.refs: Set[str] = set()  # source documents contributing this suggestion
+
+
+class SuggestionIndex:
+    def __init__(self):
+        self.refresh_interval = settings.search_index_refresh_seconds
+        self._root = TrieNode()
+        self._suggestions: Dict[Tuple[str, str], Suggestion] = {}
+        self._sources: Dict[str, List[Tuple[str, str]]] = {}  # source key -> suggestion keys
+        self._built_at: Optional[float] = None
+        self._loading_changes: Optional[Dict[str, Optional[Dict[str, Any]]]] = None  # writes during a rebuild
+        self._build_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # Index maintenance
+
+    @staticmethod
+    def _trie_keys(phrase: str) -> Iterable[str]:
+        """A phrase is reachable from its start and from the start of each later word"""
+        words = phrase.split(" ")
+        for index in range(len(words)):
+            yield " ".join(words[index:])
+
+    def _insert_key(self, key: str, suggestion_key: Tuple[str, str]):
+        node = self._root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = TrieNode()
+            node = child
+        if node.entries is None:
+            node.entries = set()
+        node.entries.add(suggestion_key)
+
+    def _delete_key(self, key: str, suggestion_key: Tuple[str, str]):
+        path = [self._root]
+        for char in key:
+            child = path[-1].children.get(char)
+            if child is None:
+                return
+            path.append(child)
+
+        node = path[-1]
+        if node.entries:
+            node.entries.discard(suggestion_key)
+            if not node.entries:
+                node.entries = None
+
+        # Prune branches left empty
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.children or node.entries:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+
+    def _add_term(self, source_key: str, kind: str, text: Optional[str], entity_id: Optional[str]):
+        phrase = normalize(text)
+        if not phrase:
+            return
+        suggestion_key = (kind, f"{phrase}#{entity_id}" if kind in ENTITY_KINDS else phrase)
+        suggestion = self._suggestions.get(suggestion_key)
+        if suggestion is None:
+            suggestion = self._suggestions[suggestion_key] = Suggestion(kind, text.strip(), entity_id)
+            for key in self._trie_keys(phrase):
+                self._insert_key(key, suggestion_key)
+        suggestion.refs.add(source_key)
+        self._sources.setdefault(source_key, []).append(suggestion_key)
+
+    def _remove_source(self, source_key: str):
+        for suggestion_key in self._sources.pop(source_key, []):
+            suggestion = self._suggestions.get(suggestion_key)
+            if suggestion is None:
+                continue
+            suggestion.refs.discard(source_key)
+            if suggestion.refs:
+                continue
+            del self._suggestions[suggestion_key]
+            phrase = suggestion_key[1].split("#", 1)[0]
+            for key in self._trie_keys(phrase):
+                self._delete_key(key, suggestion_key)
+
+    def _record(self, source_key: str, document: Optional[Dict[str, Any]]):
+        """Remember a write made while a rebuild loads, to replay it into the new trie"""
+        if self._loading_changes is not None:
+            self._loading_changes[source_key] = document
+
+    def index_medicine(self, medicine: Dict[str, Any]):
+        """Add or refresh the suggestions contributed by a medicine"""
+        medicine_id = str(medicine["_id"])
+        source_key = f"medicine:{medicine_id}"
+        self._record(source_key, medicine)
+        self._remove_source(source_key)
+        # Missing is_active counts as active, matching the rebuild query
+        if medicine.get("is_active", True) is False:
+            return
+        self._add_term(source_key, "medicine", medicine.get("name"), medicine_id)
+        self._add_term(source_key, "brand", medicine.get("brand"), None)
+        self._add_term(source_key, "composition", medicine.get("composition"), None)
+
+    def remove_medicine(self, medicine_id: str):
+        """Drop the suggestions contributed by a medicine"""
+        source_key = f"medicine:{medicine_id}"
+        self._record(source_key, None)
+        self._remove_source(source_key)
+
+    def index_doctor(self, doctor: Dict[str, Any]):
+        """Add or refresh the suggestions contributed by a doctor"""
+        doctor_id = str(doctor["_id"])
+        source_key = f"doctor:{doctor_id}"
+        self._record(source_key, doctor)
+        self._remove_source(source_key)
+        if doctor.get("is_active", True) is False:
+            return
+        self._add_term(source_key, "doctor", doctor.get("full_name") or doctor.get("name"), doctor_id)
+
+        specializations = doctor.get("specializations") or []
+        if doctor.get("specialization"):
+            specializations = [doctor["specialization"], *specializations]
+        for specialization in specializations:
+            self._add_term(source_key, "specialization", specialization, None)
+
+    async def rebuild(self, db: AsyncIOMotorDatabase):
+        """Rebuild the trie from the catalog and doctor directory and swap it in"""
+        async with self._build_lock:
+            started = time.monotonic()
+            fresh = SuggestionIndex()
+            self._loading_changes = {}
+            try:
+                medicines = db.medicines.find(
+                    {"is_active": {"$ne": False}},
+                    {"name": 1, "brand": 1, "composition": 1}
+                ).batch_size(5000)
+                async for medicine in medicines:
+                    fresh.index_medicine(medicine)
+
+                doctors = db.doctors.find(
+                    {"is_active": {"$ne": False}},
+                    {"full_name": 1, "name": 1, "specialization": 1, "specializations": 1}
+                ).batch_size(5000)
+                async for doctor in doctors:
+                    fresh.index_doctor(doctor)
+
+                # Writes made locally while the queries ran
+                for source_key, document in self._loading_changes.items():
+                    if document is None:
+                        fresh._remove_source(source_key)
+                    elif source_key.startswith("medicine:"):
+                        fresh.index_medicine(document)
+                    else:
+                        fresh.index_doctor(document)
+            finally:
+                self._loading_changes = None
+
+            self._root = fresh._root
+            self._suggestions = fresh._suggestions
+            self._sources = fresh._sources
+            self._built_at = time.monotonic()
+            logger.info(
+                f"Suggestion index built: {len(self._suggestions)} suggestions "
+                f"in {self._built_at - started:.2f}s"
+            )
+
+    async def ensure_fresh(self, db: AsyncIOMotorDatabase):
+        """Build on first use and refresh in the background once stale"""
+        if self._built_at is None:
+            await self.rebuild(db)
+            return
+
+        is_stale = time.monotonic() - self._built_at > self.refresh_interval
+        if is_stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self.rebuild(db))
+
+    # Lookup
+
+    @staticmethod
+    def _collect(
+        node: TrieNode,
+        distance: int,
+        found: Dict[Tuple[str, str], int],
+        cap: int,
+        kinds: Optional[Set[str]] = None
+    ):
+        """Breadth-first collection of entries below a node, shortest completions first
+
+        Only entries of the requested kinds are collected, so other kinds cannot
+        fill the cap and starve them.
+        """
+        queue = deque([node])
+        while queue and len(found) < cap:
+            current = queue.popleft()
+            if current.entries:
+                for suggestion_key in current.entries:
+                    # Suggestion keys are (kind, phrase)
+                    if kinds and suggestion_key[0] not in kinds:
+                        continue
+                    if distance < found.get(suggestion_key, distance + 1):
+                        found[suggestion_key] = distance
+            queue.extend(current.children.values())
+
+    def _fuzzy_prefix(self, query: str, max_edits: int) -> List[Tuple[int, TrieNode]]:
+        """Find trie nodes whose prefix is within max_edits of the query.
+
+        Walks the trie carrying one Levenshtein DP row per node and prunes a
+        branch as soon as every cell of its row exceeds the edit budget. The
+        first character must match exactly, which keeps the walk to one
+        subtree of the root (typos rarely hit the first letter).
+        """
+        matches: List[Tuple[int, TrieNode]] = []
+        first_child = self._root.children.get(query[0])
+        if first_child is None:
+            return matches
+        first_row = list(range(len(query) + 1))
+        stack = [(first_child, query[0], first_row)]
+
+        while stack:
+            node, char, previous_row = stack.pop()
+            row = [previous_row[0] + 1]
+            for column in range(1, len(query) + 1):
+                row.append(min(
+                    row[column - 1] + 1,
+                    previous_row[column] + 1,
+                    previous_row[column - 1] + (query[column - 1] != char),
+                ))
+
+            distance = row[-1]
+            if distance <= max_edits:
+                matches.append((distance, node))
+            # Descend while a longer prefix could still match, or match more closely
+            if min(row) < min(distance, max_edits + 1):
+                stack.extend((child, next_char, row) for next_char, child in node.children.items())
+
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def suggest(
+        self,
+        query: str,
+        limit: int = 10,
+        kinds: Optional[Set[str]] = None,
+        fuzzy: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Suggest completions for a partially typed query
+
+        Args:
+            query: Text typed so far
+            limit: Maximum number of suggestions
+            kinds: Restrict to these suggestion kinds
+            fuzzy: Allow typo-tolerant matches when exact prefixes run short
+
+        Returns:
+            Suggestions ordered by edit distance, kind and popularity
+        """
+        phrase = normalize(query)
+        if not phrase:
+            return []
+
+        cap = limit * 5
+        found: Dict[Tuple[str, str], int] = {}
+
+        node = self._root
+        for char in phrase:
+            node = node.children.get(char)
+            if node is None:
+                break
+        if node is not None:
+            self._collect(node, 0, found, cap, kinds)
+
+        max_edits = max_edits_for(phrase) if fuzzy else 0
+        if max_edits and len(found) < limit:
+            for distance, match in self._fuzzy_prefix(phrase, max_edits):
+                if len(found) >= cap:
+                    break
+                self._collect(match, distance, found, cap, kinds)
+
+        ranked = []
+        for suggestion_key, distance in found.items():
+            suggestion = self._suggestions.get(suggestion_key)
+            if suggestion is None:
+                continue
+            ranked.append((
+                distance,
+                KIND_PRIORITY[suggestion.kind],
+                -len(suggestion.refs),
+                len(suggestion.text),
+                suggestion,
+            ))
+        ranked.sort(key=lambda item: item[:4])
+
+        return [
+            {
+                "text": suggestion.text,
+                "type": suggestion.kind,
+                "id": suggestion.entity_id,
+                "distance": distance,
+            }
+            for distance, _, _, _, suggestion in ranked[:limit]
+        ]
+
+# Global suggestion index instance
+suggestion_index = SuggestionIndex()
@@ -0,0 +1,296 @@
+"""
+Token Service
+Short-lived access tokens paired with rotating refresh tokens. Each login starts a
+refresh token family in ``refresh_tokens``; presenting an already rotated token
+revokes the whole family. Revocations live in ``token_revocations`` and are
+fronted by an in-memory bloom filter, so the per-request check touches the
+database only for revoked tokens and rare false positives.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..core.config import settings
+from ..core.security import (
+    create_access_token,
+    create_refresh_token,
+    decode_access_token,
+    decode_refresh_token
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch(moment: datetime) -> float:
+    """Unix time of a naive UTC datetime, comparable with a token's iat"""
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+class TokenError(Exception):
+    """A refresh token that cannot be exchanged for new tokens"""
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false positive rate"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenService:
+    def __init__(self):
+        self.access_lifetime = timedelta(minutes=settings.access_token_expire_minutes)
+        self.refresh_lifetime = timedelta(days=settings.refresh_token_expire_days)
+        self.sync_seconds = settings.revocation_sync_seconds
+        self._revoked = self._new_filter()
+        self._loading_keys: Optional[Set[str]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _new_filter() -> BloomFilter:
+        return BloomFilter(settings.revocation_bloom_capacity, settings.revocation_bloom_error_rate)
+
+    async def issue(
+        self,
+        db: AsyncIOMotorDatabase,
+        subject_id: Any,
+        user_type: str,
+        is_active: bool = True,
+        is_admin: bool = False,
+        family_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Issue an access token and a refresh token
+
+        Args:
+            db: Database
+            subject_id: User or doctor ID
+            user_type: "user" or "doctor"
+            is_active: Account active flag, carried in the access token
+            is_admin: Admin flag, carried in the access token
+            family_id: Session to continue on rotation; a new one on login
+
+        Returns:
+            Fields of the Token response
+        """
+        family_id = family_id or uuid.uuid4().hex
+        jti = uuid.uuid4().hex
+        now = datetime.utcnow()
+        await db.refresh_tokens.insert_one({
+            "_id": jti,
+            "family_id": family_id,
+            "subject_id": ObjectId(str(subject_id)),
+            "user_type": user_type,
+            "created_at": now,
+            "expires_at": now + self.refresh_lifetime,
+            "used_at": None,
+            "revoked": False
+        })
+        access_token = create_access_token(
+            subject_id,
+            expires_delta=self.access_lifetime,
+            claims={"role": user_type, "active": is_active, "admin": is_admin, "sid": family_id}
+        )
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "user_type": user_type,
+            "refresh_token": create_refresh_token(subject_id, jti=jti, family_id=family_id),
+            "expires_in": int(self.access_lifetime.total_seconds())
+        }
+
+    async def rotate(self, db: AsyncIOMotorDatabase, refresh_token: str) -> Dict[str, Any]:
+        """
+        Exchange a refresh token for a new token pair in the same family
+
+        The account's current active and admin flags are read here, once per
+        access token lifetime, instead of on every request.
+
+        Raises:
+            TokenError: Invalid, expired, reused or revoked token, or inactive account
+        """
+        claims = decode_refresh_token(refresh_token)
+        if claims is None:
+            raise TokenError("Invalid refresh token")
+
+        # Claim the token atomically so two concurrent exchanges cannot both succeed
+        record = await db.refresh_tokens.find_one_and_update(
+            {"_id": claims["jti"], "used_at": None, "revoked": False},
+            {"$set": {"used_at": datetime.utcnow()}}
+        )
+        if record is None:
+            if await db.refresh_tokens.count_documents({"_id": claims["jti"]}, limit=1):
+                # A rotated or revoked token presented again: assume it leaked
+                logger.warning(f"Refresh token reuse for {claims['sub']}; revoking session {claims['fam']}")
+                await self.revoke_family(db, claims["fam"])
+                raise TokenError("Refresh token reuse detected")
+            raise TokenError("Invalid refresh token")
+
+        is_doctor = record["user_type"] == "doctor"
+        account = await (db.doctors if is_doctor else db.users).find_one(
+            {"_id": record["subject_id"]},
+            {"is_active": 1, "is_admin": 1}
+        )
+        if not account or not account.get("is_active", True):
+            await self.revoke_family(db, record["family_id"])
+            raise TokenError("Account not found or inactive")
+
+        return await self.issue(
+            db,
+            record["subject_id"],
+            record["user_type"],
+            is_active=True,
+            is_admin=not is_doctor and account.get("is_admin", False),
+            family_id=record["family_id"]
+        )
+
+    async def authenticate(self, db: AsyncIOMotorDatabase, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a valid, unrevoked access token, or None"""
+        claims = decode_access_token(token)
+        if claims is None or await self.is_revoked(db, claims):
+            return None
+        if "role" not in claims:
+            return await self._legacy_claims(db, claims)
+        return claims
+
+    async def _legacy_claims(self, db: AsyncIOMotorDatabase, claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Fill role and flags of an access token issued before they were carried as claims
+
+        Such tokens hold only the subject, so the account is read on each use
+        until they expire.
+        """
+        if not ObjectId.is_valid(claims["sub"]):
+            return None
+        subject_id = ObjectId(claims["sub"])
+        projection = {"is_active": 1, "is_admin": 1}
+        account = await db.users.find_one({"_id": subject_id}, projection)
+        role = "user"
+        if account is None:
+            account = await db.doctors.find_one({"_id": subject_id}, projection)
+            role = "doctor"
+        if account is None:
+            return None
+        return {
+            **claims,
+            "role": role,
+            "active": account.get("is_active", True),
+            "admin": role == "user" and account.get("is_admin", False)
+        }
+
+    async def is_revoked(self, db: AsyncIOMotorDatabase, claims: Dict[str, Any]) -> bool:
+        """Whether the token, its session or its subject was revoked after it was issued"""
+        keys = [f"sub:{claims['sub']}"]
+        if claims.get("jti"):
+            keys.append(f"jti:{claims['jti']}")
+        if claims.get("sid"):
+            keys.append(f"sid:{claims['sid']}")
+        candidates = [key for key in keys if key in self._revoked]
+        if not candidates:
+            return False
+
+        # Filter hit: confirm against the exact store, since it may be a false positive
+        cursor = db.token_revocations.find(
+            {"_id": {"$in": candidates}, "expires_at": {"$gt": datetime.utcnow()}}
+        )
+        async for record in cursor:
+            if claims.get("iat", 0) <= _epoch(record["revoked_at"]):
+                return True
+        return False
+
+    async def _revoke(self, db: AsyncIOMotorDatabase, key: str):
+        """Reject access tokens matching a key that were issued up to now"""
+        now = datetime.utcnow()
+        # Access tokens issued before now expire within one lifetime; keep the entry that long
+        await db.token_revocations.update_one(
+            {"_id": key},
+            {"$max": {"revoked_at": now, "expires_at": now + self.access_lifetime + timedelta(minutes=1)}},
+            upsert=True
+        )
+        self._revoked.add(key)
+        if self._loading_keys is not None:
+            self._loading_keys.add(key)
+
+    async def revoke_family(self, db: AsyncIOMotorDatabase, family_id: str):
+        """End a login session: its refresh tokens and the access tokens issued from them"""
+        await db.refresh_tokens.update_many({"family_id": family_id}, {"$set": {"revoked": True}})
+        await self._revoke(db, f"sid:{family_id}")
+
+    async def revoke_subject(self, db: AsyncIOMotorDatabase, subject_id: Any):
+        """End every session of a user or doctor, e.g. on deactivation"""
+        await db.refresh_tokens.update_many(
+            {"subject_id": ObjectId(str(subject_id))},
+            {"$set": {"revoked": True}}
+        )
+        await self._revoke(db, f"sub:{subject_id}")
+
+    async def logout(self, db: AsyncIOMotorDatabase, refresh_token: str):
+        """End the session a refresh token belongs to"""
+        claims = decode_refresh_token(refresh_token)
+        if claims is not None:
+            await self.revoke_family(db, claims["fam"])
+
+    async def load(self, db: AsyncIOMotorDatabase):
+        """Rebuild the filter from unexpired revocations, picking up other workers' and dropping expired ones"""
+        revoked = self._new_filter()
+        self._loading_keys = set()
+        try:
+            cursor = db.token_revocations.find({"expires_at": {"$gt": datetime.utcnow()}}, {"_id": 1})
+            async for record in cursor:
+                revoked.add(record["_id"])
+            # Revocations made locally while the query ran
+            for key in self._loading_keys:
+                revoked.add(key)
+            self._revoked = revoked
+        finally:
+            self._loading_keys = None
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            try:
+                await self.load(db)
+            except Exception as e:
+                logger.error(f"Could not load token revocations: {e}")
+
+    def start(self, db: AsyncIOMotorDatabase):
+        """Start the periodic revocation sync; call after an initial load"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        """Stop the periodic revocation sync"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global token service instance
+token_service = TokenService()
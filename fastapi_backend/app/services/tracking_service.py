@@ -0,0 +1,285 @@
+"""
+Ambulance Tracking Service
+Ingests batched GPS points, keeps the latest position of every ambulance in memory
+and pushes updates to patients over WebSockets
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+import logging
+from bson import ObjectId
+from fastapi import WebSocket
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import CollectionInvalid
+
+from ..core.config import settings
+from ..models.emergency import TERMINAL_EMERGENCY_STATUSES
+from .dispatch_service import dispatch_service
+
+logger = logging.getLogger(__name__)
+
+LOCATIONS_COLLECTION = "ambulance_locations"
+
+class AmbulanceTracker:
+    """
+    Latest-position table and WebSocket channels for patients awaiting an ambulance.
+
+    State lives in this process; with several workers each one tracks the
+    batches it ingests. A cached position older than a few seconds is re-read
+    from the ambulance document, which every worker updates once per batch,
+    and each socket is also polled on an interval so it gets positions
+    ingested by other workers.
+
+    Sockets are keyed by emergency request, so a patient only follows the
+    ambulance while it serves their request.
+    """
+
+    def __init__(self):
+        self.retention_seconds = settings.ambulance_location_retention_days * 86400
+        self.position_cache_seconds = settings.ambulance_position_cache_seconds
+        self._latest: Dict[str, Dict[str, Any]] = {}  # ambulance_id -> last known point
+        self._latest_at: Dict[str, float] = {}  # ambulance_id -> monotonic time the point was cached
+        self._ambulance_info: Dict[str, Dict[str, Any]] = {}  # ambulance_id -> static details
+        self.push_fallback_seconds = settings.ambulance_push_fallback_seconds
+        self._sockets: Dict[str, Dict[WebSocket, Any]] = {}  # request_id -> {socket: recorded_at last sent}
+        self._request_ambulance: Dict[str, str] = {}  # request_id -> ambulance_id
+        self._ambulance_requests: Dict[str, Set[str]] = {}  # ambulance_id -> request_ids
+
+    async def ensure_collection(self, db: AsyncIOMotorDatabase):
+        """Create the time-series collection for raw GPS points"""
+        try:
+            await db.create_collection(
+                LOCATIONS_COLLECTION,
+                timeseries={
+                    "timeField": "recorded_at",
+                    "metaField": "ambulance_id",
+                    "granularity": "seconds"
+                },
+                expireAfterSeconds=self.retention_seconds
+            )
+        except CollectionInvalid:
+            pass  # already exists
+        except Exception as e:
+            logger.error(f"Could not create {LOCATIONS_COLLECTION} collection: {e}")
+
+    # Ingestion
+
+    async def ingest(self, db: AsyncIOMotorDatabase, ambulance_id: ObjectId, points: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Store a batch of GPS points for one ambulance
+
+        Args:
+            ambulance_id: The reporting ambulance
+            points: Points with lat, lng and optional recorded_at, speed_kmh, heading
+
+        Returns:
+            The latest known position after the batch
+        """
+        received_at = datetime.utcnow()
+        for point in points:
+            point["recorded_at"] = point.get("recorded_at") or received_at
+        points.sort(key=lambda point: point["recorded_at"])
+
+        await db[LOCATIONS_COLLECTION].insert_many([
+            {**point, "ambulance_id": ambulance_id} for point in points
+        ])
+
+        key = str(ambulance_id)
+        newest = points[-1]
+        current = self._latest.get(key)
+        if current is not None and current.get("recorded_at") and current["recorded_at"] >= newest["recorded_at"]:
+            return current  # late batch; history is stored but the position stays
+
+        self._remember(key, newest)
+
+        # One write per batch keeps the dispatch index fresh without per-point updates
+        await db.ambulances.update_one(
+            {"_id": ambulance_id},
+            {"$set": {
+                **dispatch_service.location_fields({"lat": newest["lat"], "lng": newest["lng"]}),
+                "location_updated_at": newest["recorded_at"]
+            }}
+        )
+
+        await self._broadcast(key, newest)
+        return newest
+
+    def _remember(self, key: str, position: Dict[str, Any]):
+        self._latest[key] = position
+        self._latest_at[key] = time.monotonic()
+
+    async def latest(self, db: AsyncIOMotorDatabase, ambulance_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """
+        Last known position of an ambulance
+
+        Served from memory while fresh; after ``ambulance_position_cache_seconds``
+        it is re-read from the ambulance document, so positions ingested by other
+        workers show up here too.
+        """
+        key = str(ambulance_id)
+        current = self._latest.get(key)
+        cached_at = self._latest_at.get(key)
+        if current is not None and cached_at is not None and time.monotonic() - cached_at < self.position_cache_seconds:
+            return current
+
+        ambulance = await db.ambulances.find_one(
+            {"_id": ambulance_id},
+            {"current_location": 1, "location_updated_at": 1}
+        )
+        location = (ambulance or {}).get("current_location")
+        if not location:
+            return current
+
+        stored = {
+            "lat": location.get("lat"),
+            "lng": location.get("lng"),
+            "recorded_at": ambulance.get("location_updated_at")
+        }
+        # Keep a newer point this process ingested but has not yet written back
+        if current is not None and current.get("recorded_at") and (
+            not stored["recorded_at"] or current["recorded_at"] > stored["recorded_at"]
+        ):
+            stored = current
+        self._remember(key, stored)
+        return stored
+
+    async def ambulance_info(self, db: AsyncIOMotorDatabase, ambulance_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """Static ambulance details, read once and then served from memory"""
+        key = str(ambulance_id)
+        info = self._ambulance_info.get(key)
+        if info is None:
+            ambulance = await db.ambulances.find_one(
+                {"_id": ambulance_id},
+                {"vehicle_number": 1, "driver_name": 1, "driver_phone": 1}
+            )
+            if ambulance is None:
+                return None
+            info = {
+                "vehicle_number": ambulance["vehicle_number"],
+                "driver_name": ambulance["driver_name"],
+                "driver_phone": ambulance["driver_phone"]
+            }
+            self._ambulance_info[key] = info
+        return info
+
+    def forget_ambulance(self, ambulance_id: ObjectId):
+        """Drop cached details and position after an ambulance is edited"""
+        key = str(ambulance_id)
+        self._ambulance_info.pop(key, None)
+        self._latest.pop(key, None)
+        self._latest_at.pop(key, None)
+
+    # Push channels
+
+    @staticmethod
+    def _serialize(position: Dict[str, Any]) -> str:
+        recorded_at = position.get("recorded_at")
+        return json.dumps({
+            "type": "location",
+            "lat": position.get("lat"),
+            "lng": position.get("lng"),
+            "speed_kmh": position.get("speed_kmh"),
+            "heading": position.get("heading"),
+            "recorded_at": recorded_at.isoformat() if recorded_at else None
+        })
+
+    async def _send(self, request_key: str, websocket: WebSocket, position: Dict[str, Any], message: Optional[str] = None):
+        """Send a position to one socket and remember which point it has seen"""
+        await websocket.send_text(message or self._serialize(position))
+        sockets = self._sockets.get(request_key)
+        if sockets is not None and websocket in sockets:
+            sockets[websocket] = position.get("recorded_at")
+
+    async def subscribe(self, db: AsyncIOMotorDatabase, request_id: ObjectId, ambulance_id: ObjectId, websocket: WebSocket):
+        """Register a patient socket for a request and send the current position right away"""
+        request_key, ambulance_key = str(request_id), str(ambulance_id)
+        self._sockets.setdefault(request_key, {})[websocket] = None
+        self._request_ambulance[request_key] = ambulance_key
+        self._ambulance_requests.setdefault(ambulance_key, set()).add(request_key)
+        position = await self.latest(db, ambulance_id)
+        if position:
+            await self._send(request_key, websocket, position)
+
+    def unsubscribe(self, request_id: ObjectId, websocket: WebSocket):
+        request_key = str(request_id)
+        sockets = self._sockets.get(request_key)
+        if sockets is None:
+            return
+        sockets.pop(websocket, None)
+        if not sockets:
+            self._drop_request(request_key)
+
+    def _drop_request(self, request_key: str):
+        self._sockets.pop(request_key, None)
+        ambulance_key = self._request_ambulance.pop(request_key, None)
+        requests = self._ambulance_requests.get(ambulance_key)
+        if requests is not None:
+            requests.discard(request_key)
+            if not requests:
+                del self._ambulance_requests[ambulance_key]
+
+    @staticmethod
+    async def _close(websocket: WebSocket, status: str):
+        """Tell a patient their request is over and close the socket"""
+        try:
+            await websocket.send_text(json.dumps({"type": "status", "status": status}))
+            await websocket.close()
+        except Exception:
+            pass  # already gone
+
+    async def end_request(self, request_id: ObjectId, status: str):
+        """Close every socket following a request once it no longer holds its ambulance"""
+        request_key = str(request_id)
+        sockets = list(self._sockets.get(request_key, ()))
+        self._drop_request(request_key)
+        await asyncio.gather(*[self._close(websocket, status) for websocket in sockets])
+
+    async def watch(self, db: AsyncIOMotorDatabase, request_id: ObjectId, ambulance_id: ObjectId, websocket: WebSocket):
+        """
+        Poll fallback for one socket
+
+        Re-sends the latest position when it moved without a push reaching this
+        process, and closes the socket once the request ends or loses its
+        ambulance, including when that happened on another worker.
+        """
+        request_key = str(request_id)
+        while True:
+            await asyncio.sleep(self.push_fallback_seconds)
+            request = await db.emergency_requests.find_one(
+                {"_id": request_id},
+                {"status": 1, "ambulance_id": 1}
+            )
+            if request is None or request.get("status") in TERMINAL_EMERGENCY_STATUSES or request.get("ambulance_id") != ambulance_id:
+                self.unsubscribe(request_id, websocket)
+                await self._close(websocket, request.get("status") if request else "not_found")
+                return
+
+            sockets = self._sockets.get(request_key)
+            if sockets is None or websocket not in sockets:
+                return
+            position = await self.latest(db, ambulance_id)
+            if position and position.get("recorded_at") != sockets[websocket]:
+                await self._send(request_key, websocket, position)
+
+    async def _broadcast(self, ambulance_key: str, position: Dict[str, Any]):
+        targets = [
+            (request_key, websocket)
+            for request_key in self._ambulance_requests.get(ambulance_key, ())
+            for websocket in self._sockets.get(request_key, {})
+        ]
+        if not targets:
+            return
+        message = self._serialize(position)
+        results = await asyncio.gather(
+            *[self._send(request_key, websocket, position, message) for request_key, websocket in targets],
+            return_exceptions=True
+        )
+        for (request_key, websocket), result in zip(targets, results):
+            if isinstance(result, Exception):
+                self.unsubscribe(request_key, websocket)
+
+# Global ambulance tracker instance
+ambulance_tracker = AmbulanceTracker()
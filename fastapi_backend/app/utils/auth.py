@@ -2,9 +2,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from ..core.database import get_database
-from ..core.security import decode_token
-from ..models.user import UserInDB
+from ..models.user import UserInDB, Principal
 from ..models.doctor import DoctorInDB
+from ..services.migration_service import migration_service
+from ..services.token_service import token_service
 from bson import ObjectId
 from typing import Optional, Union
 
@@ -23,9 +24,10 @@ async def get_current_user(
     
     try:
         token = credentials.credentials
-        user_id = decode_token(token)
-        if user_id is None:
+        claims = await token_service.authenticate(db, token)
+        if claims is None:
             raise credentials_exception
+        user_id = claims["sub"]
     except Exception:
         raise credentials_exception
     
@@ -53,11 +55,12 @@ async def get_current_doctor(
     try:
         token = credentials.credentials
         print(f"🔐 Doctor auth: Received token: {token[:20]}..." if token else "🔐 Doctor auth: No token received")
-        doctor_id = decode_token(token)
-        print(f"🔐 Doctor auth: Decoded doctor_id: {doctor_id}")
-        if doctor_id is None:
+        claims = await token_service.authenticate(db, token)
+        if claims is None:
             print("🔐 Doctor auth: Failed to decode token")
             raise credentials_exception
+        doctor_id = claims["sub"]
+        print(f"🔐 Doctor auth: Decoded doctor_id: {doctor_id}")
     except Exception as e:
         print(f"🔐 Doctor auth: Exception during token validation: {str(e)}")
         raise credentials_exception
@@ -66,25 +69,8 @@ async def get_current_doctor(
     if doctor_data is None:
         raise credentials_exception
     
-    # Handle field mapping for backward compatibility
-    if "name" in doctor_data and "full_name" not in doctor_data:
-        doctor_data["full_name"] = doctor_data["name"]
-    if "specializations" in doctor_data and "specialization" not in doctor_data:
-        specializations = doctor_data.get("specializations", [])
-        doctor_data["specialization"] = specializations[0] if specializations else ""
-    if "experience" in doctor_data and "experience_years" not in doctor_data:
-        doctor_data["experience_years"] = doctor_data["experience"]
-    if "qualifications" in doctor_data and "qualification" not in doctor_data:
-        doctor_data["qualification"] = doctor_data["qualifications"]
-    if "address" in doctor_data and "clinic_address" not in doctor_data:
-        doctor_data["clinic_address"] = doctor_data["address"]
-    
-    # Add required fields if missing
-    from datetime import datetime
-    if "created_at" not in doctor_data:
-        doctor_data["created_at"] = datetime.utcnow()
-    if "updated_at" not in doctor_data:
-        doctor_data["updated_at"] = datetime.utcnow()
+    # Legacy field names are mapped in memory until the document is migrated
+    migration_service.normalize_doctor(doctor_data)
     
     print(f"🔐 Doctor auth: Creating DoctorInDB with keys: {list(doctor_data.keys())}")
     return DoctorInDB(**doctor_data)
@@ -129,13 +115,66 @@ async def get_current_verified_doctor(
         raise HTTPException(status_code=400, detail="Inactive doctor")
     return current_doctor
 
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+) -> Principal:
+    """Get current caller from access token claims, without loading the account"""
+    claims = await token_service.authenticate(db, credentials.credentials)
+    if claims is None or "role" not in claims:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return Principal(
+        id=claims["sub"],
+        user_type=claims["role"],
+        is_active=claims.get("active", True),
+        is_admin=claims.get("admin", False),
+        session_id=claims.get("sid")
+    )
+
+async def get_current_active_principal(
+    principal: Principal = Depends(get_current_principal)
+) -> Principal:
+    """Get current active user from token claims"""
+    if principal.user_type != "user":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+async def get_current_admin_principal(
+    principal: Principal = Depends(get_current_active_principal)
+) -> Principal:
+    """Get current admin user from token claims"""
+    if not principal.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return principal
+
+async def _store_rehash(collection, document: dict, new_hash: str):
+    """Replace a password hash made with outdated cost parameters"""
+    # Conditional on the old hash so a concurrent password change is not overwritten
+    await collection.update_one(
+        {"_id": document["_id"], "hashed_password": document["hashed_password"]},
+        {"$set": {"hashed_password": new_hash}}
+    )
+
 async def authenticate_user(
     email: str, 
     password: str, 
     db: AsyncIOMotorDatabase
 ) -> Optional[UserInDB]:
     """Authenticate user with email and password"""
-    from ..core.security import verify_password
+    from ..core.security import verify_and_update_password
     
     user_data = await db.users.find_one({"email": email})
     if not user_data:
@@ -146,8 +185,12 @@ async def authenticate_user(
         user_data["full_name"] = user_data["name"]
     
     user = UserInDB(**user_data)
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        await _store_rehash(db.users, user_data, new_hash)
+        user.hashed_password = new_hash
     
     return user
 
@@ -157,27 +200,21 @@ async def authenticate_doctor(
     db: AsyncIOMotorDatabase
 ) -> Optional[DoctorInDB]:
     """Authenticate doctor with email and password"""
-    from ..core.security import verify_password
+    from ..core.security import verify_and_update_password
     
     doctor_data = await db.doctors.find_one({"email": email})
     if not doctor_data:
         return None
     
-    # Handle field mapping for backward compatibility
-    if "name" in doctor_data and "full_name" not in doctor_data:
-        doctor_data["full_name"] = doctor_data["name"]
-    if "specializations" in doctor_data and "specialization" not in doctor_data:
-        specializations = doctor_data.get("specializations", [])
-        doctor_data["specialization"] = specializations[0] if specializations else ""
-    if "experience" in doctor_data and "experience_years" not in doctor_data:
-        doctor_data["experience_years"] = doctor_data["experience"]
-    if "qualifications" in doctor_data and "qualification" not in doctor_data:
-        doctor_data["qualification"] = doctor_data["qualifications"]
-    if "address" in doctor_data and "clinic_address" not in doctor_data:
-        doctor_data["clinic_address"] = doctor_data["address"]
+    # Legacy field names are mapped in memory until the document is migrated
+    migration_service.normalize_doctor(doctor_data)
     
     doctor = DoctorInDB(**doctor_data)
-    if not verify_password(password, doctor.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, doctor.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        await _store_rehash(db.doctors, doctor_data, new_hash)
+        doctor.hashed_password = new_hash
     
     return doctor
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""
+Geo helpers shared by location-aware features
+"""
+
+import math
+from typing import Any, Dict, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+def geo_point(lat: float, lng: float) -> Dict[str, Any]:
+    """Build a GeoJSON point (GeoJSON orders coordinates longitude first)"""
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two coordinates in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def lat_lng(location: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """Read a {"lat": ..., "lng": ...} dict, returning None if it is incomplete"""
+    if not location or location.get("lat") is None or location.get("lng") is None:
+        return None
+    return float(location["lat"]), float(location["lng"])
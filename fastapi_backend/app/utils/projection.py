@@ -0,0 +1,84 @@
+"""
+Field selection for list endpoints: turns a ``?fields=`` query parameter into a
+Mongo projection and a matching lightweight response model
+"""
+
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple, Type
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, Field, create_model
+
+
+def _stored_name(model: Type[BaseModel], field_name: str) -> str:
+    """Name of a model field in the Mongo document (its alias, e.g. "_id")"""
+    return model.model_fields[field_name].alias or field_name
+
+
+@lru_cache(maxsize=256)
+def _partial_model(model: Type[BaseModel], field_names: FrozenSet[str]) -> Type[BaseModel]:
+    """A model with only the selected fields of ``model``, all optional"""
+    fields = {}
+    for name in field_names:
+        field = model.model_fields[name]
+        fields[name] = (Optional[field.annotation], Field(default=None, alias=field.alias))
+    return create_model(
+        f"{model.__name__}Fields",
+        __config__=ConfigDict(
+            populate_by_name=True,
+            arbitrary_types_allowed=True,
+            json_encoders={ObjectId: str}
+        ),
+        **fields
+    )
+
+
+def select_fields(
+    model: Type[BaseModel],
+    summary: Type[BaseModel],
+    fields: Optional[str],
+    sources: Optional[Dict[str, List[str]]] = None
+) -> Tuple[Type[BaseModel], Dict[str, int]]:
+    """
+    Response model and Mongo projection for a list request
+
+    Args:
+        model: Full resource model; ``fields`` may name any of its fields
+        summary: Compact model used when no fields are requested
+        fields: Comma-separated field names (or aliases) from the query string
+        sources: Extra stored fields a model field is derived from, such as
+            legacy field names or image variants
+
+    Returns:
+        (response model, projection)
+    """
+    if fields:
+        aliases = {field.alias: name for name, field in model.model_fields.items() if field.alias}
+        selected = set()
+        unknown = []
+        for requested in (part.strip() for part in fields.split(",")):
+            if not requested:
+                continue
+            name = aliases.get(requested, requested)
+            if name in model.model_fields:
+                selected.add(name)
+            else:
+                unknown.append(requested)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+        selected.add("id")
+        response_model = _partial_model(model, frozenset(selected))
+    else:
+        selected = set(summary.model_fields)
+        response_model = summary
+
+    projection = {}
+    for name in selected:
+        projection[_stored_name(model, name)] = 1
+        for source in (sources or {}).get(name, []):
+            projection[source] = 1
+    return response_model, projection
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Benchmark: latency, throughput and payload size of the heaviest list endpoints"""
+
+import asyncio
+import aiohttp
+import statistics
+import sys
+import time
+
+BASE_URL = "http://localhost:8000"
+
+# The app rate-limits to 100 requests per minute per client; stay under it
+REQUESTS_PER_CASE = 10
+CONCURRENCY = 5
+
+# (label, path, params, needs auth)
+CASES = [
+    ("doctors (summary)", "/api/doctors/", {"limit": 100}, False),
+    ("doctors (full)", "/api/doctors/", {
+        "limit": 100,
+        "fields": "full_name,email,phone,specialization,experience_years,license_number,clinic_address,"
+                  "consultation_fee,qualification,bio,availability,profile_picture,is_verified,is_active,"
+                  "created_at,updated_at"
+    }, False),
+    ("medicines (summary)", "/api/medicine-store/", {"limit": 100}, False),
+    ("medicines (full)", "/api/medicine-store/", {
+        "limit": 100,
+        "fields": "name,description,price,category,brand,manufacturer,composition,dosage_form,strength,"
+                  "package_size,prescription_required,in_stock,stock_quantity,image_url,side_effects,"
+                  "contraindications,storage_conditions,expiry_date,is_active,created_at,updated_at"
+    }, False),
+    ("restaurants (summary)", "/api/food-delivery/restaurants", {"limit": 100}, False),
+    ("chat sessions (summary)", "/api/chat/sessions", {}, True),
+]
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run_case(session, path, params, headers):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+    sizes = []
+    statuses = []
+
+    async def request():
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.get(f"{BASE_URL}{path}", params=params, headers=headers) as resp:
+                body = await resp.read()
+            latencies.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(body))
+            statuses.append(resp.status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[request() for _ in range(REQUESTS_PER_CASE)])
+    elapsed = time.perf_counter() - started
+    return latencies, sizes, statuses, elapsed
+
+async def main():
+    login_data = {
+        'username': 'test@test.com',
+        'password': 'testuser123'
+    }
+
+    async with aiohttp.ClientSession() as session:
+        # Login
+        print("🔐 Logging in...")
+        async with session.post(f"{BASE_URL}/api/auth/login", data=login_data) as resp:
+            if resp.status != 200:
+                print(f"❌ Login failed: {resp.status}")
+                return False
+            login_result = await resp.json()
+            token = login_result['token']['access_token']
+
+        auth_headers = {'Authorization': f'Bearer {token}'}
+
+        print(f"🚀 {REQUESTS_PER_CASE} requests per endpoint, {CONCURRENCY} in flight\n")
+        print(f"{'endpoint':<26}{'p50 ms':>9}{'p95 ms':>9}{'req/s':>8}{'KB/resp':>10}  status")
+
+        passed = True
+        for label, path, params, needs_auth in CASES:
+            headers = auth_headers if needs_auth else {}
+            latencies, sizes, statuses, elapsed = await run_case(session, path, params, headers)
+
+            failures = [status for status in statuses if status != 200]
+            if 429 in failures:
+                print(f"{label:<26}⚠️  rate limited; wait a minute or lower REQUESTS_PER_CASE")
+                passed = False
+                continue
+            passed = passed and not failures
+
+            print(
+                f"{label:<26}"
+                f"{statistics.median(latencies):>9.1f}"
+                f"{percentile(latencies, 0.95):>9.1f}"
+                f"{len(latencies) / elapsed:>8.1f}"
+                f"{statistics.mean(sizes) / 1024:>10.1f}"
+                f"  {'✅' if not failures else '❌ ' + str(sorted(set(failures)))}"
+            )
+
+        print("\n🎉 Benchmark complete" if passed else "\n💥 Some requests failed")
+        return passed
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
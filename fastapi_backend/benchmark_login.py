@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Benchmark: login throughput, and whether concurrent logins stall other requests"""
+
+import asyncio
+import aiohttp
+import statistics
+import sys
+import time
+
+BASE_URL = "http://localhost:8000"
+
+# The app rate-limits to 100 requests per minute per client; stay under it
+LOGINS = 40
+CONCURRENCY = 8
+HEALTH_PROBES = 40
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def login(session, semaphore, login_data, latencies, statuses):
+    async with semaphore:
+        started = time.perf_counter()
+        async with session.post(f"{BASE_URL}/api/auth/login", data=login_data) as resp:
+            await resp.read()
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses.append(resp.status)
+
+async def probe_health(session, done, latencies):
+    """Hit a cheap endpoint while logins run; a blocked event loop shows up here"""
+    while not done.is_set() and len(latencies) < HEALTH_PROBES:
+        started = time.perf_counter()
+        async with session.get(f"{BASE_URL}/api/health") as resp:
+            await resp.read()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.05)
+
+async def main():
+    login_data = {
+        'username': 'test@test.com',
+        'password': 'testuser123'
+    }
+
+    async with aiohttp.ClientSession() as session:
+        # Idle baseline for the cheap endpoint
+        baseline = []
+        for _ in range(5):
+            started = time.perf_counter()
+            async with session.get(f"{BASE_URL}/api/health") as resp:
+                await resp.read()
+            baseline.append((time.perf_counter() - started) * 1000)
+
+        print(f"🚀 {LOGINS} logins, {CONCURRENCY} in flight, health probes alongside\n")
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        login_latencies, statuses, health_latencies = [], [], []
+        done = asyncio.Event()
+
+        probes = asyncio.create_task(probe_health(session, done, health_latencies))
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            login(session, semaphore, login_data, login_latencies, statuses)
+            for _ in range(LOGINS)
+        ])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probes
+
+        if 429 in statuses:
+            print("⚠️  Rate limited; wait a minute or lower LOGINS")
+            return False
+        failures = [status for status in statuses if status != 200]
+
+        print(f"🔐 Logins:  {len(statuses) / elapsed:.1f}/s, "
+              f"p50 {statistics.median(login_latencies):.0f} ms, "
+              f"p95 {percentile(login_latencies, 0.95):.0f} ms")
+        print(f"💓 Health:  idle p50 {statistics.median(baseline):.1f} ms, "
+              f"under load p50 {statistics.median(health_latencies):.1f} ms, "
+              f"p95 {percentile(health_latencies, 0.95):.1f} ms")
+
+        if failures:
+            print(f"\n💥 {len(failures)} logins failed: {sorted(set(failures))}")
+            return False
+        print("\n🎉 Benchmark complete")
+        return True
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Script to bring stored documents up to the current schema version
+The server runs the same migrations at startup; this runs them on demand
+"""
+
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add the app directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.services.migration_service import migration_service, CURRENT_SCHEMA_VERSIONS
+
+async def migrate_schema():
+    """Run pending migrations on every versioned collection"""
+    print("🔧 Migrating WeCare documents to the current schema...")
+
+    # Connect to database
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    db = client[settings.database_name]
+
+    try:
+        results = await migration_service.migrate(db)
+        for collection, migrated in results.items():
+            print(f"  ✅ {collection}: {migrated} migrated (schema version {CURRENT_SCHEMA_VERSIONS[collection]})")
+
+        # Anything left behind failed to migrate
+        for collection, version in CURRENT_SCHEMA_VERSIONS.items():
+            remaining = await db[collection].count_documents({"schema_version": {"$not": {"$gte": version}}})
+            if remaining:
+                print(f"  ⚠️ {collection}: {remaining} documents still below version {version}")
+
+    except Exception as e:
+        print(f"❌ Error migrating documents: {e}")
+
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_schema())
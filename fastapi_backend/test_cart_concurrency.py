@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Stress test: parallel cart adds must not lose quantity updates"""
+
+import asyncio
+import aiohttp
+import sys
+import time
+
+BASE_URL = "http://localhost:8000"
+CART_URL = f"{BASE_URL}/api/medicine-store/cart"
+
+# Concurrent "add" taps per medicine. The app allows 100 requests per minute per
+# client by default; 30 x 3 adds plus 5 setup and check calls stay under it.
+# Raise these only with RATE_LIMIT_ENABLED=false on the server.
+CONCURRENT_ADDS = 30
+MEDICINES_TO_USE = 3
+
+async def main():
+    login_data = {
+        'username': 'test@test.com',
+        'password': 'testuser123'
+    }
+
+    async with aiohttp.ClientSession() as session:
+        # Login
+        print("🔐 Logging in...")
+        async with session.post(f"{BASE_URL}/api/auth/login", data=login_data) as resp:
+            if resp.status != 200:
+                print(f"❌ Login failed: {resp.status}")
+                return False
+            login_result = await resp.json()
+            token = login_result['token']['access_token']
+
+        headers = {'Authorization': f'Bearer {token}'}
+
+        # Pick some in-stock medicines
+        async with session.get(f"{BASE_URL}/api/medicine-store/", params={'limit': 50}) as resp:
+            medicines = [m for m in await resp.json() if m.get('in_stock')][:MEDICINES_TO_USE]
+        if not medicines:
+            print("❌ No in-stock medicines to test with")
+            return False
+        medicine_ids = [m.get('_id') or m.get('id') for m in medicines]
+
+        # Start from an empty cart
+        async with session.delete(f"{CART_URL}/clear", headers=headers) as resp:
+            print(f"🧹 Cart cleared ({resp.status})")
+
+        async def add(medicine_id):
+            payload = {'medicine_id': medicine_id, 'quantity': 1}
+            async with session.post(f"{CART_URL}/add", json=payload, headers=headers) as resp:
+                return resp.status
+
+        print(f"🚀 Sending {CONCURRENT_ADDS} parallel adds for each of {len(medicine_ids)} medicines...")
+        start_time = time.time()
+        statuses = await asyncio.gather(*[
+            add(medicine_id)
+            for _ in range(CONCURRENT_ADDS)
+            for medicine_id in medicine_ids
+        ])
+        elapsed = time.time() - start_time
+
+        succeeded = {}
+        for index, status in enumerate(statuses):
+            if status == 200:
+                medicine_id = medicine_ids[index % len(medicine_ids)]
+                succeeded[medicine_id] = succeeded.get(medicine_id, 0) + 1
+        conflicts = statuses.count(409)
+        rate_limited = statuses.count(429)
+        errors = len(statuses) - sum(succeeded.values()) - conflicts - rate_limited
+        print(f"⏱️  {len(statuses)} requests in {elapsed:.2f}s "
+              f"({sum(succeeded.values())} ok, {conflicts} conflicts, "
+              f"{rate_limited} rate limited, {errors} errors)")
+        if rate_limited:
+            print("⚠️  Rate limited; wait a minute, lower CONCURRENT_ADDS or run the server with RATE_LIMIT_ENABLED=false")
+
+        # Every accepted add must be reflected exactly once
+        async with session.get(f"{CART_URL}/", headers=headers) as resp:
+            cart = await resp.json()
+
+        quantities = {}
+        for item in cart.get('items', []):
+            quantities[item['medicine_id']] = quantities.get(item['medicine_id'], 0) + item['quantity']
+
+        line_counts = {}
+        for item in cart.get('items', []):
+            line_counts[item['medicine_id']] = line_counts.get(item['medicine_id'], 0) + 1
+
+        passed = errors == 0 and rate_limited == 0
+        for medicine_id in medicine_ids:
+            expected = succeeded.get(medicine_id, 0)
+            actual = quantities.get(medicine_id, 0)
+            lines = line_counts.get(medicine_id, 0)
+            ok = actual == expected and lines <= 1
+            passed = passed and ok
+            print(f"  {'✅' if ok else '❌'} {medicine_id}: expected {expected}, got {actual} in {lines} line(s)")
+
+        expected_total = round(sum(
+            m['price'] * quantities.get(m.get('_id') or m.get('id'), 0) for m in medicines
+        ), 2)
+        total_ok = abs(cart.get('total_amount', 0.0) - expected_total) < 0.01
+        passed = passed and total_ok
+        print(f"  {'✅' if total_ok else '❌'} total: expected {expected_total}, got {cart.get('total_amount')}")
+
+        # Leave the cart empty again
+        async with session.delete(f"{CART_URL}/clear", headers=headers):
+            pass
+
+        print("\n🎉 No lost updates" if passed else "\n💥 Lost or duplicated cart updates detected")
+        return passed
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Regression test: re-completing or re-cancelling a finished emergency must not free
+an ambulance that has since been dispatched to another request"""
+
+import asyncio
+import aiohttp
+import os
+import sys
+import uuid
+
+BASE_URL = "http://localhost:8000"
+EMERGENCY_URL = f"{BASE_URL}/api/emergency"
+
+# Must be an admin account (see make_admin.py)
+ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "test@test.com")
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "testuser123")
+
+# Remote test location so the dedicated ambulance is the nearest free unit
+TEST_LOCATION = {"lat": -54.4296, "lng": 3.3464}
+
+async def main():
+    login_data = {
+        'username': ADMIN_EMAIL,
+        'password': ADMIN_PASSWORD
+    }
+
+    async with aiohttp.ClientSession() as session:
+        # Login
+        print("🔐 Logging in...")
+        async with session.post(f"{BASE_URL}/api/auth/login", data=login_data) as resp:
+            if resp.status != 200:
+                print(f"❌ Login failed: {resp.status}")
+                return False
+            login_result = await resp.json()
+            token = login_result['token']['access_token']
+            user_id = login_result['user'].get('_id') or login_result['user'].get('id')
+
+        headers = {'Authorization': f'Bearer {token}'}
+
+        async def create_request(label):
+            payload = {
+                'user_id': user_id,
+                'emergency_type': 'medical',
+                'description': f'Release regression test {label}',
+                'location': TEST_LOCATION,
+                'address': 'Test location',
+                'contact_phone': '0000000000',
+                'severity': 'low'
+            }
+            async with session.post(f"{EMERGENCY_URL}/request", json=payload, headers=headers) as resp:
+                return await resp.json()
+
+        async def set_status(request_id, status):
+            async with session.put(
+                f"{EMERGENCY_URL}/requests/{request_id}/status",
+                params={'status': status}, headers=headers
+            ) as resp:
+                return resp.status
+
+        async def ambulance_available(ambulance_id):
+            async with session.get(f"{EMERGENCY_URL}/ambulances", headers=headers) as resp:
+                for ambulance in await resp.json():
+                    if (ambulance.get('_id') or ambulance.get('id')) == ambulance_id:
+                        return ambulance['is_available']
+            return None
+
+        # A dedicated ambulance at the test location
+        ambulance_payload = {
+            'driver_name': 'Release Test',
+            'driver_phone': '0000000000',
+            'vehicle_number': f'TEST-{uuid.uuid4().hex[:6].upper()}',
+            'current_location': TEST_LOCATION
+        }
+        async with session.post(f"{EMERGENCY_URL}/ambulances", json=ambulance_payload, headers=headers) as resp:
+            if resp.status != 200:
+                print(f"❌ Could not create test ambulance: {resp.status} (is the account an admin?)")
+                return False
+            ambulance = await resp.json()
+            ambulance_id = ambulance.get('_id') or ambulance.get('id')
+        print(f"🚑 Test ambulance {ambulance_payload['vehicle_number']}")
+
+        passed = True
+        for terminal_status in ('completed', 'cancelled'):
+            # Request A takes the ambulance, then finishes
+            request_a = await create_request('A')
+            if request_a.get('ambulance_id') != ambulance_id:
+                print(f"❌ Request A was not given the test ambulance ({request_a.get('ambulance_id')})")
+                return False
+            await set_status(request_a['_id'], 'completed')
+
+            # Request B gets the same ambulance
+            request_b = await create_request('B')
+            if request_b.get('ambulance_id') != ambulance_id:
+                print(f"❌ Request B was not given the test ambulance ({request_b.get('ambulance_id')})")
+                return False
+
+            # Re-setting A to a terminal status must leave the ambulance with B
+            status_code = await set_status(request_a['_id'], terminal_status)
+            available = await ambulance_available(ambulance_id)
+            if status_code == 200 and available is False:
+                print(f"✅ Re-setting request A to {terminal_status} kept the ambulance with request B")
+            else:
+                print(f"❌ Re-setting A to {terminal_status} freed the ambulance serving B "
+                      f"(status {status_code}, available={available})")
+                passed = False
+
+            # Finishing B frees the ambulance for the next round
+            await set_status(request_b['_id'], 'completed')
+            if await ambulance_available(ambulance_id) is not True:
+                print("❌ Completing request B did not free the ambulance")
+                passed = False
+
+        # Take the test ambulance out of service
+        async with session.put(
+            f"{EMERGENCY_URL}/ambulances/{ambulance_id}",
+            json={'is_available': False}, headers=headers
+        ) as resp:
+            print(f"🧹 Test ambulance taken out of service ({resp.status})")
+
+        print("\n🎉 Release test passed" if passed else "\n💥 Release test failed")
+        return passed
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)